@@ -34,6 +34,19 @@ CORS(app, resources={
 
 print("✅ CORS configured")
 
+# Request metrics and /api/metrics (aggregated across gunicorn workers)
+from utils import metrics
+metrics.init_app(app)
+print(f"✅ Metrics {'enabled' if metrics.METRICS_ENABLED else 'disabled (prometheus_client not installed)'}")
+
+# Request deadlines also bound every database query made for the request
+from utils import deadline
+deadline.init_app(app)
+
+# Per-user GET response cache, invalidated by that user's writes
+from utils.response_cache import response_cache
+response_cache.init_app(app)
+
 # Validate configuration
 try:
     Config.validate()
@@ -103,6 +116,14 @@ except Exception as e:
 
 print(f"📦 Loaded blueprints: {', '.join(blueprints_loaded)}")
 
+# Load the Ollama model now so the first upload doesn't pay for it
+try:
+    from services.ollama_service import ollama_service
+    ollama_service.start_keepalive()
+    print("✅ Ollama keep-alive started")
+except Exception as e:
+    print(f"⚠️ Ollama keep-alive skipped: {e}")
+
 # Health check endpoint
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -0,0 +1,89 @@
+"""
+Benchmark the planning engine on synthetic syllabi.
+
+Times the packing itself and each output view for 10 to 10,000
+topics over one semester, then the multi-subject planner for 2 to 50
+subjects sharing one daily budget.
+
+Run from backend/:
+    python benchmarks/bench_plan.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.plan_generator import PlanGenerator
+
+SIZES = [10, 100, 1000, 10000]
+SUBJECT_COUNTS = [2, 10, 50]
+TOPICS_PER_SUBJECT = 40
+REPEATS = 5
+
+# One semester, 6 hours a day
+START, END, HOURS_PER_DAY = '2026-01-05', '2026-05-29', 6
+
+
+def make_topics(n, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            'id': f'topic-{i}',
+            'topic_name': f'Topic {i}',
+            'description': '',
+            'estimated_hours': rng.choice([1, 2, 3, 5, 8, 12]),
+            'difficulty_level': rng.choice(['easy', 'medium', 'medium', 'hard'])
+        }
+        for i in range(n)
+    ]
+
+
+def best_ms(func):
+    best = float('inf')
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, result
+
+
+def check(topics, packing, plan):
+    """Every topic scheduled, hours conserved, no day over capacity + slivers"""
+    assert set(packing.topic.tolist()) == set(range(len(topics))), 'every topic must be scheduled'
+    assert abs(packing.hours.sum() - sum(w['total_hours'] for w in plan['weeks']['weeks'].values())) < 0.1 * len(plan['weeks']['weeks']) + 1e-6
+    days = plan['days']
+    assert all(d['hours'] <= HOURS_PER_DAY + 0.55 for d in days[:-1]), 'day over capacity'
+
+
+def main():
+    print(f"{'topics':>8} {'pieces':>7} {'pack ms':>9} {'daily ms':>9} {'weekly ms':>10} {'both ms':>9}")
+    for n in SIZES:
+        topics = make_topics(n)
+        pack_ms, packing = best_ms(lambda: PlanGenerator.pack(topics, START, END, HOURS_PER_DAY))
+        daily_ms, _ = best_ms(lambda: PlanGenerator.daily_view(packing))
+        weekly_ms, _ = best_ms(lambda: PlanGenerator.weekly_view(packing))
+        both_ms, plan = best_ms(lambda: PlanGenerator.build_plan(topics, START, END, HOURS_PER_DAY))
+        check(topics, packing, plan)
+        print(f"{n:>8} {len(packing.day):>7} {pack_ms:>9.2f} {daily_ms:>9.2f} {weekly_ms:>10.2f} {both_ms:>9.2f}")
+
+
+    print()
+    print(f"{'subjects':>8} {'topics':>7} {'pack ms':>9} {'both ms':>9} {'scale':>6}")
+    for count in SUBJECT_COUNTS:
+        subjects = [
+            {
+                'subject': f'Subject {s}',
+                'exam_date': f'2026-0{3 + s % 3}-1{s % 10}',
+                'topics': make_topics(TOPICS_PER_SUBJECT, seed=s)
+            }
+            for s in range(count)
+        ]
+        pack_ms, packing = best_ms(lambda: PlanGenerator.pack_subjects(subjects, START, END, HOURS_PER_DAY))
+        both_ms, plan = best_ms(lambda: PlanGenerator.build_global_plan(subjects, START, END, HOURS_PER_DAY))
+        print(f"{count:>8} {len(packing.topics):>7} {pack_ms:>9.2f} {both_ms:>9.2f} {plan['scale']:>6}")
+
+
+if __name__ == '__main__':
+    main()
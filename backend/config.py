@@ -18,6 +18,48 @@ class Config:
     # OpenAI
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
     
+    # Async AI fan-out (max in-flight model calls per worker)
+    AI_MAX_CONCURRENCY = int(os.getenv('AI_MAX_CONCURRENCY', '8'))
+    
+    # Hedged generation: race cloud and Ollama instead of falling back in turn
+    AI_HEDGE_ENABLED = os.getenv('AI_HEDGE_ENABLED', 'False') == 'True'
+    AI_HEDGE_DELAY = float(os.getenv('AI_HEDGE_DELAY', '2.0'))  # seconds before the second backend starts
+    AI_HEDGE_TIMEOUT = float(os.getenv('AI_HEDGE_TIMEOUT', '45'))  # then answer from free mode
+    
+    # Long syllabi: extract topics from up to this many prompt-sized chunks (1 = first chunk only)
+    AI_EXTRACT_CHUNKS = int(os.getenv('AI_EXTRACT_CHUNKS', '1'))
+    
+    # Ollama model residency: keep the model loaded between calls and
+    # optionally re-warm it during busy hours (e.g. "8-23" or "7-12,17-23")
+    OLLAMA_KEEP_ALIVE = os.getenv('OLLAMA_KEEP_ALIVE', '30m')
+    OLLAMA_WARMUP_ON_START = os.getenv('OLLAMA_WARMUP_ON_START', 'True') == 'True'
+    OLLAMA_WARM_HOURS = os.getenv('OLLAMA_WARM_HOURS', '')
+    OLLAMA_WARM_INTERVAL = float(os.getenv('OLLAMA_WARM_INTERVAL', '240'))  # seconds between warm pings
+    
+    # Per-request deadline (below gunicorn's 120s worker timeout). Model calls
+    # are skipped for free mode when less than AI_MIN_SECONDS is left, and
+    # DEADLINE_DB_RESERVE seconds are kept back for the final database writes.
+    REQUEST_DEADLINE = float(os.getenv('REQUEST_DEADLINE', '100'))
+    DEADLINE_DB_RESERVE = float(os.getenv('DEADLINE_DB_RESERVE', '10'))
+    AI_MIN_SECONDS = float(os.getenv('AI_MIN_SECONDS', '5'))
+    SUPABASE_TIMEOUT = float(os.getenv('SUPABASE_TIMEOUT', '10'))  # per query, less if the request deadline is sooner
+    
+    # Threads per worker for running independent queries concurrently (dashboard)
+    DB_FANOUT_WORKERS = int(os.getenv('DB_FANOUT_WORKERS', '8'))
+    
+    # Read-route response cache: fresh for SOFT_TTL seconds, then served
+    # stale while refreshing, and past HARD_TTL only if the backend fails
+    RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'True') == 'True'
+    RESPONSE_CACHE_SOFT_TTL = float(os.getenv('RESPONSE_CACHE_SOFT_TTL', '30'))
+    RESPONSE_CACHE_HARD_TTL = float(os.getenv('RESPONSE_CACHE_HARD_TTL', '600'))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '2000'))
+    
+    # Timetable-aware planning: the daily window study fits into, and the
+    # shortest free gap worth counting as study time (minutes)
+    STUDY_DAY_START = os.getenv('STUDY_DAY_START', '08:00')
+    STUDY_DAY_END = os.getenv('STUDY_DAY_END', '22:00')
+    MIN_FREE_SLOT = int(os.getenv('MIN_FREE_SLOT', '30'))
+    
     # Upload settings
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
     MAX_CONTENT_LENGTH = 30 * 1024 * 1024  # 30MB
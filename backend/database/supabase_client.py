@@ -1,17 +1,48 @@
-from supabase import create_client, Client
+from datetime import datetime, timezone
+
+import httpx
+from supabase import create_client, Client, ClientOptions
 from config import Config
+from utils.deadline import current as current_deadline, out_of_time
+from utils.metrics import instrument_methods, DB_LATENCY, DB_EXCEPTIONS
+
+
+def _today():
+    """UTC date, the day rollups are kept by"""
+    return datetime.now(timezone.utc).date().isoformat()
+
 
+def _cap_timeout(request):
+    """Shorten a query's timeout to what is left of the request deadline"""
+    deadline = current_deadline()
+    if deadline is not None:
+        request.extensions['timeout'] = httpx.Timeout(deadline.timeout(Config.SUPABASE_TIMEOUT)).as_dict()
+
+
+@instrument_methods(DB_LATENCY, DB_EXCEPTIONS)
 class SupabaseDB:
     """Singleton Supabase client wrapper"""
     
     _instance = None
     _client: Client = None
     
+    # Set once the dashboard_stats / bump_daily_rollup / bump_item_stats functions turn out not to exist
+    _stats_rpc_missing = False
+    _rollup_rpc_missing = False
+    _item_stats_rpc_missing = False
+    
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
             try:
-                cls._client = create_client(Config.SUPABASE_URL, Config.SUPABASE_KEY)
+                cls._client = create_client(
+                    Config.SUPABASE_URL,
+                    Config.SUPABASE_KEY,
+                    options=ClientOptions(postgrest_client_timeout=Config.SUPABASE_TIMEOUT)
+                )
+                # SUPABASE_TIMEOUT per query, but never past the request deadline
+                session = cls._client.postgrest.session
+                session.event_hooks = {**session.event_hooks, 'request': session.event_hooks['request'] + [_cap_timeout]}
                 # Test connection
                 cls._client.table('users').select('id').limit(1).execute()
             except Exception as e:
@@ -35,6 +66,7 @@ class SupabaseDB:
             }).execute()
             return response.data[0] if response.data else None
         except Exception as e:
+            DB_EXCEPTIONS.labels('create_user').inc()
             print(f"Error creating user: {str(e)}")
             return None
     
@@ -44,6 +76,7 @@ class SupabaseDB:
             response = self._client.table('users').select('*').eq('email', email).execute()
             return response.data[0] if response.data else None
         except Exception as e:
+            DB_EXCEPTIONS.labels('get_user_by_email').inc()
             print(f"Error fetching user: {str(e)}")
             return None
     
@@ -59,25 +92,51 @@ class SupabaseDB:
             }).execute()
             return response.data[0] if response.data else None
         except Exception as e:
+            DB_EXCEPTIONS.labels('create_upload').inc()
             print(f"Error creating upload: {str(e)}")
             return None
     
+    def get_recent_uploads(self, user_id, limit=5):
+        """Latest uploads of a user, without their extracted text"""
+        try:
+            response = self._client.table('uploads').select('id, user_id, filename, file_path, subject, uploaded_at').eq('user_id', user_id).order('uploaded_at', desc=True).limit(limit).execute()
+            return response.data
+        except Exception as e:
+            DB_EXCEPTIONS.labels('get_recent_uploads').inc()
+            print(f"Error fetching uploads: {str(e)}")
+            return []
+    
     def get_uploads_by_user(self, user_id):
         """Get all uploads for a user"""
         try:
             response = self._client.table('uploads').select('*').eq('user_id', user_id).execute()
             return response.data
         except Exception as e:
+            DB_EXCEPTIONS.labels('get_uploads_by_user').inc()
             print(f"Error fetching uploads: {str(e)}")
             return []
     
+    def get_upload_texts(self, upload_ids):
+        """Map upload id -> extracted_text for several uploads in one query"""
+        try:
+            response = self._client.table('uploads').select('id, extracted_text').in_('id', upload_ids).execute()
+            return {row['id']: row.get('extracted_text') or '' for row in response.data}
+        except Exception as e:
+            DB_EXCEPTIONS.labels('get_upload_texts').inc()
+            print(f"Error fetching upload text: {str(e)}")
+            return {}
+    
     # Topic operations
-    def create_topics_bulk(self, topics_data):
-        """Create multiple topics at once"""
+    def create_topics_bulk(self, topics_data, deadline=None):
+        """Create multiple topics at once (skipped if the request deadline passed)"""
+        if out_of_time(deadline):
+            print("Skipping topic insert: request deadline passed")
+            return []
         try:
             response = self._client.table('topics').insert(topics_data).execute()
             return response.data
         except Exception as e:
+            DB_EXCEPTIONS.labels('create_topics_bulk').inc()
             print(f"Error creating topics: {str(e)}")
             return []
     
@@ -87,9 +146,54 @@ class SupabaseDB:
             response = self._client.table('topics').select('*').eq('upload_id', upload_id).order('sequence_order').execute()
             return response.data
         except Exception as e:
+            DB_EXCEPTIONS.labels('get_topics_by_upload').inc()
+            print(f"Error fetching topics: {str(e)}")
+            return []
+    
+    def get_topics_by_uploads(self, upload_ids):
+        """Topics of several uploads in one query, in syllabus order per upload"""
+        try:
+            response = self._client.table('topics').select('*').in_('upload_id', upload_ids).order('upload_id').order('sequence_order').execute()
+            return response.data
+        except Exception as e:
+            DB_EXCEPTIONS.labels('get_topics_by_uploads').inc()
+            print(f"Error fetching topics: {str(e)}")
+            return []
+    
+    def count_user_topics(self, user_id):
+        """Number of topics across all of a user's uploads"""
+        try:
+            response = self._client.table('topics').select('id, uploads!inner(user_id)', count='exact').eq('uploads.user_id', user_id).limit(1).execute()
+            return response.count or 0
+        except Exception as e:
+            DB_EXCEPTIONS.labels('count_user_topics').inc()
+            print(f"Error counting topics: {str(e)}")
+            return 0
+    
+    def get_topics_by_ids(self, topic_ids):
+        """Get several topics in one query"""
+        try:
+            response = self._client.table('topics').select('*').in_('id', topic_ids).execute()
+            return response.data
+        except Exception as e:
+            DB_EXCEPTIONS.labels('get_topics_by_ids').inc()
             print(f"Error fetching topics: {str(e)}")
             return []
     
+    def get_user_topics_by_subject(self, user_id, subject, exclude_upload_id=None):
+        """Topic names from a user's earlier uploads of the same subject"""
+        try:
+            uploads = self._client.table('uploads').select('id').eq('user_id', user_id).eq('subject', subject).execute()
+            upload_ids = [u['id'] for u in uploads.data if u['id'] != exclude_upload_id]
+            if not upload_ids:
+                return []
+            response = self._client.table('topics').select('id, topic_name, upload_id').in_('upload_id', upload_ids).order('sequence_order').execute()
+            return response.data
+        except Exception as e:
+            DB_EXCEPTIONS.labels('get_user_topics_by_subject').inc()
+            print(f"Error fetching subject topics: {str(e)}")
+            return []
+    
     # PYQ operations
     def create_pyqs_bulk(self, pyqs_data):
         """Create multiple PYQs"""
@@ -97,6 +201,7 @@ class SupabaseDB:
             response = self._client.table('pyqs').insert(pyqs_data).execute()
             return response.data
         except Exception as e:
+            DB_EXCEPTIONS.labels('create_pyqs_bulk').inc()
             print(f"Error creating PYQs: {str(e)}")
             return []
     
@@ -106,25 +211,185 @@ class SupabaseDB:
             response = self._client.table('pyqs').select('*').eq('topic_id', topic_id).execute()
             return response.data
         except Exception as e:
+            DB_EXCEPTIONS.labels('get_pyqs_by_topic').inc()
             print(f"Error fetching PYQs: {str(e)}")
             return []
     
     # Quiz operations
-    def create_quiz(self, user_id, topic_id, title, questions):
-        """Create a quiz"""
+    def create_quiz(self, user_id, topic_id, title, questions, answer_key=None, question_ids=None, deadline=None):
+        """
+        Create a quiz (skipped if the request deadline passed)
+        
+        With question_ids the questions live in question_bank and are
+        not stored inline.
+        """
+        if out_of_time(deadline):
+            print("Skipping quiz insert: request deadline passed")
+            return None
         try:
             response = self._client.table('quizzes').insert({
                 'user_id': user_id,
                 'topic_id': topic_id,
                 'title': title,
-                'questions': questions,
+                'questions': None if question_ids else questions,
+                'question_ids': question_ids,
+                'answer_key': answer_key,
                 'total_questions': len(questions)
             }).execute()
             return response.data[0] if response.data else None
         except Exception as e:
+            DB_EXCEPTIONS.labels('create_quiz').inc()
             print(f"Error creating quiz: {str(e)}")
             return None
     
+    def create_quizzes_bulk(self, quizzes_data, deadline=None):
+        """Create multiple quizzes in one insert (skipped if the request deadline passed)"""
+        if out_of_time(deadline):
+            print("Skipping quiz insert: request deadline passed")
+            return []
+        try:
+            response = self._client.table('quizzes').insert(quizzes_data).execute()
+            return response.data
+        except Exception as e:
+            DB_EXCEPTIONS.labels('create_quizzes_bulk').inc()
+            print(f"Error creating quizzes: {str(e)}")
+            return []
+    
+    def get_answer_key(self, quiz_id):
+        """
+        A quiz's topic and correct option indices, without question text
+        
+        Quizzes created before quizzes.answer_key existed have it
+        derived from their questions once.
+        """
+        try:
+            response = self._client.table('quizzes').select('id, topic_id, answer_key, question_ids').eq('id', quiz_id).limit(1).execute()
+            if not response.data:
+                return None
+            row = response.data[0]
+            if row.get('answer_key') is None:
+                questions = self.get_quiz_questions(quiz_id)
+                row['answer_key'] = [
+                    int(q['correct']) if isinstance(q.get('correct'), (int, float)) else -1
+                    for q in questions
+                ]
+            return row
+        except Exception as e:
+            DB_EXCEPTIONS.labels('get_answer_key').inc()
+            print(f"Error fetching answer key: {str(e)}")
+            return None
+    
+    def get_quiz_questions(self, quiz_id):
+        """Full questions (text, options, explanations) of a quiz"""
+        try:
+            response = self._client.table('quizzes').select('questions, question_ids').eq('id', quiz_id).limit(1).execute()
+            if not response.data:
+                return []
+            quiz = response.data[0]
+            if quiz.get('questions') is not None:
+                return quiz['questions']
+            ids = quiz.get('question_ids') or []
+            bank = self._client.table('question_bank').select('id, question').in_('id', ids).execute()
+            by_id = {row['id']: row['question'] for row in bank.data}
+            return [dict(by_id[i], id=i) for i in ids if i in by_id]
+        except Exception as e:
+            DB_EXCEPTIONS.labels('get_quiz_questions').inc()
+            print(f"Error fetching quiz questions: {str(e)}")
+            return []
+    
+    # Question bank operations
+    def get_bank_questions(self, topic_ids):
+        """Every bank question of the given topics"""
+        try:
+            response = self._client.table('question_bank').select('id, topic_id, question').in_('topic_id', list(topic_ids)).execute()
+            return response.data
+        except Exception as e:
+            DB_EXCEPTIONS.labels('get_bank_questions').inc()
+            print(f"Error fetching question bank: {str(e)}")
+            return []
+    
+    def save_bank_questions(self, rows):
+        """Insert one topic's bank questions; ones already banked are returned as they are"""
+        try:
+            response = self._client.table('question_bank').upsert(
+                rows, on_conflict='topic_id,content_hash', ignore_duplicates=True
+            ).execute()
+            saved = {row['content_hash']: row for row in response.data}
+            missing = [row['content_hash'] for row in rows if row['content_hash'] not in saved]
+            if missing:
+                existing = self._client.table('question_bank').select('id, topic_id, content_hash, question').eq('topic_id', rows[0]['topic_id']).in_('content_hash', missing).execute()
+                saved.update({row['content_hash']: row for row in existing.data})
+            return list(saved.values())
+        except Exception as e:
+            DB_EXCEPTIONS.labels('save_bank_questions').inc()
+            print(f"Error saving bank questions: {str(e)}")
+            return []
+    
+    # Item statistics operations
+    def get_item_stats(self, topic_id):
+        """Running answer statistics of a topic's bank questions"""
+        try:
+            response = self._client.table('item_stats').select('*').eq('topic_id', topic_id).execute()
+            return response.data
+        except Exception as e:
+            DB_EXCEPTIONS.labels('get_item_stats').inc()
+            print(f"Error fetching item stats: {str(e)}")
+            return []
+    
+    def bump_item_stats(self, topic_id, items):
+        """
+        Add one quiz submit to its questions' statistics
+        
+        items: [{ question_id, correct (0/1), rest (share of the other
+        questions right) }]. Uses the bump_item_stats database function
+        (an atomic upsert, see README); without it, reads and rewrites
+        the rows.
+        """
+        try:
+            if not SupabaseDB._item_stats_rpc_missing:
+                try:
+                    self._client.rpc('bump_item_stats', {'p_topic_id': topic_id, 'p_items': items}).execute()
+                    return True
+                except Exception as e:
+                    if 'PGRST202' not in str(e) and 'Could not find the function' not in str(e):
+                        raise
+                    SupabaseDB._item_stats_rpc_missing = True
+            
+            existing = self._client.table('item_stats').select('*').in_('question_id', [i['question_id'] for i in items]).execute()
+            rows = {row['question_id']: row for row in existing.data}
+            updated = []
+            for item in items:
+                row = rows.get(item['question_id'], {})
+                x, y = item['correct'], item['rest']
+                updated.append({
+                    'question_id': item['question_id'],
+                    'topic_id': topic_id,
+                    'attempts': int(row.get('attempts') or 0) + 1,
+                    'correct': int(row.get('correct') or 0) + x,
+                    'rest_sum': float(row.get('rest_sum') or 0) + y,
+                    'rest_sq_sum': float(row.get('rest_sq_sum') or 0) + y * y,
+                    'correct_rest_sum': float(row.get('correct_rest_sum') or 0) + x * y
+                })
+            self._client.table('item_stats').upsert(updated, on_conflict='question_id').execute()
+            return True
+        except Exception as e:
+            DB_EXCEPTIONS.labels('bump_item_stats').inc()
+            print(f"Error updating item stats: {str(e)}")
+            return False
+    
+    def get_seen_question_ids(self, user_id, topic_ids):
+        """Bank question ids already given to a user, by topic"""
+        try:
+            response = self._client.table('quizzes').select('topic_id, question_ids').eq('user_id', user_id).in_('topic_id', list(topic_ids)).execute()
+            seen = {}
+            for quiz in response.data:
+                seen.setdefault(str(quiz['topic_id']), set()).update(quiz.get('question_ids') or [])
+            return seen
+        except Exception as e:
+            DB_EXCEPTIONS.labels('get_seen_question_ids').inc()
+            print(f"Error fetching seen questions: {str(e)}")
+            return {}
+    
     def save_quiz_attempt(self, quiz_id, user_id, score, total, answers):
         """Save quiz attempt"""
         try:
@@ -135,11 +400,121 @@ class SupabaseDB:
                 'total_questions': total,
                 'answers': answers
             }).execute()
-            return response.data[0] if response.data else None
+            attempt = response.data[0] if response.data else None
+            if attempt and total:
+                self.bump_daily_rollup(
+                    user_id,
+                    str(attempt.get('completed_at') or _today())[:10],
+                    quizzes=1,
+                    score=round(score * 100 / total, 2)
+                )
+            return attempt
         except Exception as e:
+            DB_EXCEPTIONS.labels('save_quiz_attempt').inc()
             print(f"Error saving quiz attempt: {str(e)}")
             return None
     
+    def get_recent_attempts(self, user_id, limit=5):
+        """Latest attempts of a user with their quiz titles"""
+        try:
+            response = self._client.table('quiz_attempts').select('*, quizzes(title)').eq('user_id', user_id).order('completed_at', desc=True).limit(limit).execute()
+            return response.data
+        except Exception as e:
+            DB_EXCEPTIONS.labels('get_recent_attempts').inc()
+            print(f"Error fetching recent attempts: {str(e)}")
+            return []
+    
+    def get_dashboard_stats(self, user_id):
+        """
+        Dashboard counts and averages for a user in one call
+        
+        Computed by the dashboard_stats database function (see README);
+        if it is not installed, computed here from the rows instead.
+        
+        Returns:
+            { total_uploads, total_topics, total_quizzes, avg_quiz_score,
+            total_progress, completed, in_progress, not_started, study_hours }
+        """
+        if not SupabaseDB._stats_rpc_missing:
+            try:
+                response = self._client.rpc('dashboard_stats', {'p_user_id': user_id}).execute()
+                row = response.data[0] if isinstance(response.data, list) else response.data
+                return {key: float(value) if key in ('avg_quiz_score', 'study_hours') else int(value) for key, value in row.items()}
+            except Exception as e:
+                DB_EXCEPTIONS.labels('get_dashboard_stats').inc()
+                print(f"dashboard_stats RPC unavailable, aggregating rows instead: {str(e)}")
+                if 'PGRST202' in str(e) or 'Could not find the function' in str(e):
+                    SupabaseDB._stats_rpc_missing = True
+        return self._dashboard_stats_from_rows(user_id)
+    
+    def _dashboard_stats_from_rows(self, user_id):
+        """Python version of the dashboard_stats function"""
+        from services.plan_generator import PlanGenerator
+        
+        try:
+            attempts = self._client.table('quiz_attempts').select('score, total_questions').eq('user_id', user_id).execute().data
+            scored = [a for a in attempts if a.get('total_questions')]
+            progress = PlanGenerator.get_progress_stats(
+                self._client.table('progress').select('status, hours_spent').eq('user_id', user_id).execute().data
+            )
+            uploads = self._client.table('uploads').select('id', count='exact').eq('user_id', user_id).limit(1).execute()
+            return {
+                'total_uploads': uploads.count or 0,
+                'total_topics': self.count_user_topics(user_id),
+                'total_quizzes': len(attempts),
+                'avg_quiz_score': round(sum(a['score'] * 100 / a['total_questions'] for a in scored) / len(scored), 1) if scored else 0,
+                'total_progress': progress['total_topics'],
+                'completed': progress['completed'],
+                'in_progress': progress['in_progress'],
+                'not_started': progress['not_started'],
+                'study_hours': progress['total_hours']
+            }
+        except Exception as e:
+            DB_EXCEPTIONS.labels('_dashboard_stats_from_rows').inc()
+            print(f"Error aggregating dashboard stats: {str(e)}")
+            return None
+    
+    def get_attempt_history(self, user_id):
+        """All quiz attempts of a user with their topic, oldest first"""
+        try:
+            response = self._client.table('quiz_attempts').select('score, total_questions, completed_at, quizzes(topic_id)').eq('user_id', user_id).order('completed_at').execute()
+            return response.data
+        except Exception as e:
+            DB_EXCEPTIONS.labels('get_attempt_history').inc()
+            print(f"Error fetching attempt history: {str(e)}")
+            return []
+    
+    # Review (spaced repetition) operations
+    def get_review_states(self, user_id):
+        """Every review_state row of a user"""
+        try:
+            response = self._client.table('review_state').select('*').eq('user_id', user_id).execute()
+            return response.data
+        except Exception as e:
+            DB_EXCEPTIONS.labels('get_review_states').inc()
+            print(f"Error fetching review states: {str(e)}")
+            return []
+    
+    def get_review_state(self, user_id, topic_id):
+        """Review state of one topic, None if never reviewed"""
+        try:
+            response = self._client.table('review_state').select('*').eq('user_id', user_id).eq('topic_id', topic_id).limit(1).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            DB_EXCEPTIONS.labels('get_review_state').inc()
+            print(f"Error fetching review state: {str(e)}")
+            return None
+    
+    def upsert_review_states(self, rows):
+        """Insert or update review states keyed by (user_id, topic_id)"""
+        try:
+            response = self._client.table('review_state').upsert(rows, on_conflict='user_id,topic_id').execute()
+            return response.data
+        except Exception as e:
+            DB_EXCEPTIONS.labels('upsert_review_states').inc()
+            print(f"Error saving review states: {str(e)}")
+            return []
+    
     # Study plan operations
     def create_study_plan(self, user_id, upload_id, schedule, start_date, end_date, hours_per_day=2):
         """
@@ -220,9 +595,220 @@ class SupabaseDB:
             response = self._client.table('study_plans').select('*').eq('upload_id', upload_id).order('created_at', desc=True).limit(1).execute()
             return response.data[0] if response.data else None
         except Exception as e:
+            DB_EXCEPTIONS.labels('get_study_plan_by_upload').inc()
             print(f"Error fetching study plan: {str(e)}")
             return None
     
+    def get_study_plan(self, plan_id):
+        """Get a study plan by id"""
+        try:
+            response = self._client.table('study_plans').select('*').eq('id', plan_id).limit(1).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            DB_EXCEPTIONS.labels('get_study_plan').inc()
+            print(f"Error fetching study plan: {str(e)}")
+            return None
+    
+    def get_plan_revisions(self, plan_id):
+        """Revision deltas of a plan, oldest first"""
+        try:
+            response = self._client.table('study_plan_revisions').select('*').eq('plan_id', plan_id).order('revision').execute()
+            return response.data
+        except Exception as e:
+            DB_EXCEPTIONS.labels('get_plan_revisions').inc()
+            print(f"Error fetching plan revisions: {str(e)}")
+            return []
+    
+    def get_latest_plan_revision(self, plan_id):
+        """Number and end date of a plan's latest revision, None if never replanned"""
+        try:
+            response = self._client.table('study_plan_revisions').select('revision, end_date').eq('plan_id', plan_id).order('revision', desc=True).limit(1).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            DB_EXCEPTIONS.labels('get_latest_plan_revision').inc()
+            print(f"Error fetching plan revision: {str(e)}")
+            return None
+    
+    def create_plan_revision(self, plan_id, revision, from_date, days, removed_dates, end_date, hours_per_day):
+        """Store one replan as a delta (changed days only)"""
+        try:
+            response = self._client.table('study_plan_revisions').insert({
+                'plan_id': plan_id,
+                'revision': revision,
+                'from_date': from_date,
+                'days': days,
+                'removed_dates': removed_dates,
+                'end_date': end_date,
+                'hours_per_day': hours_per_day
+            }).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            DB_EXCEPTIONS.labels('create_plan_revision').inc()
+            print(f"Error creating plan revision: {str(e)}")
+            return None
+    
+    # Timetable operations
+    def get_timetable(self, user_id):
+        """Timetable entries of a user"""
+        try:
+            response = self._client.table('timetable').select('id, day_of_week, start_time, end_time, title').eq('user_id', user_id).execute()
+            return response.data
+        except Exception as e:
+            DB_EXCEPTIONS.labels('get_timetable').inc()
+            print(f"Error fetching timetable: {str(e)}")
+            return []
+    
+    # Per-day plan rows (range reads without loading the whole schedule)
+    def get_latest_plan_summary(self, user_id):
+        """Latest plan of a user without its schedule"""
+        try:
+            response = self._client.table('study_plans').select('id, upload_id, start_date, end_date, hours_per_day, created_at').eq('user_id', user_id).order('created_at', desc=True).limit(1).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            DB_EXCEPTIONS.labels('get_latest_plan_summary').inc()
+            print(f"Error fetching plan summary: {str(e)}")
+            return None
+    
+    def save_plan_days(self, plan_id, days, revision=0):
+        """Insert or replace day rows of a plan, keyed by (plan_id, day_date)"""
+        if not days:
+            return []
+        rows = [
+            {
+                'plan_id': plan_id,
+                'day_date': day['date'],
+                'day_number': day.get('day'),
+                'hours': day.get('hours', 0),
+                'topics': day.get('topics', []),
+                'revision': revision
+            }
+            for day in days
+        ]
+        try:
+            response = self._client.table('study_plan_days').upsert(rows, on_conflict='plan_id,day_date').execute()
+            return response.data
+        except Exception as e:
+            DB_EXCEPTIONS.labels('save_plan_days').inc()
+            print(f"Error saving plan days: {str(e)}")
+            return []
+    
+    def delete_plan_days(self, plan_id, dates):
+        """Drop day rows a replan removed"""
+        if not dates:
+            return True
+        try:
+            self._client.table('study_plan_days').delete().eq('plan_id', plan_id).in_('day_date', list(dates)).execute()
+            return True
+        except Exception as e:
+            DB_EXCEPTIONS.labels('delete_plan_days').inc()
+            print(f"Error deleting plan days: {str(e)}")
+            return False
+    
+    def get_plan_days(self, plan_id, from_date, to_date):
+        """Day rows of a plan between two dates (inclusive), by date"""
+        try:
+            response = self._client.table('study_plan_days').select('day_date, day_number, hours, topics, revision').eq('plan_id', plan_id).gte('day_date', from_date).lte('day_date', to_date).order('day_date').execute()
+            return response.data
+        except Exception as e:
+            DB_EXCEPTIONS.labels('get_plan_days').inc()
+            print(f"Error fetching plan days: {str(e)}")
+            return []
+    
+    def has_plan_days(self, plan_id):
+        """True once a plan's day rows have been written"""
+        try:
+            response = self._client.table('study_plan_days').select('day_date').eq('plan_id', plan_id).limit(1).execute()
+            return bool(response.data)
+        except Exception as e:
+            DB_EXCEPTIONS.labels('has_plan_days').inc()
+            print(f"Error checking plan days: {str(e)}")
+            return False
+    
+    # Daily rollups (per user and day)
+    def bump_daily_rollup(self, user_id, day, quizzes=0, score=0.0, hours=0.0, completed=0):
+        """
+        Add to a user's rollup for one day
+        
+        Uses the bump_daily_rollup database function (an atomic upsert,
+        see README); without it, reads and rewrites the row.
+        """
+        try:
+            if not SupabaseDB._rollup_rpc_missing:
+                try:
+                    self._client.rpc('bump_daily_rollup', {
+                        'p_user_id': user_id,
+                        'p_day': day,
+                        'p_quizzes': quizzes,
+                        'p_score': score,
+                        'p_hours': hours,
+                        'p_completed': completed
+                    }).execute()
+                    return True
+                except Exception as e:
+                    if 'PGRST202' not in str(e) and 'Could not find the function' not in str(e):
+                        raise
+                    SupabaseDB._rollup_rpc_missing = True
+            
+            existing = self._client.table('daily_rollups').select('*').eq('user_id', user_id).eq('day', day).execute()
+            row = existing.data[0] if existing.data else {}
+            self._client.table('daily_rollups').upsert({
+                'user_id': user_id,
+                'day': day,
+                'quizzes_taken': int(row.get('quizzes_taken') or 0) + quizzes,
+                'score_sum': float(row.get('score_sum') or 0) + score,
+                'hours_logged': float(row.get('hours_logged') or 0) + hours,
+                'topics_completed': int(row.get('topics_completed') or 0) + completed
+            }, on_conflict='user_id,day').execute()
+            return True
+        except Exception as e:
+            DB_EXCEPTIONS.labels('bump_daily_rollup').inc()
+            print(f"Error updating daily rollup: {str(e)}")
+            return False
+    
+    def get_daily_rollups(self, user_id, from_date, to_date):
+        """Rollup rows of a user between two dates (inclusive), by day"""
+        try:
+            response = self._client.table('daily_rollups').select('day, quizzes_taken, score_sum, hours_logged, topics_completed').eq('user_id', user_id).gte('day', from_date).lte('day', to_date).order('day').execute()
+            return response.data
+        except Exception as e:
+            DB_EXCEPTIONS.labels('get_daily_rollups').inc()
+            print(f"Error fetching daily rollups: {str(e)}")
+            return []
+    
+    def save_daily_rollups(self, rows):
+        """Insert or overwrite rollup rows (backfill and compaction)"""
+        if not rows:
+            return []
+        try:
+            response = self._client.table('daily_rollups').upsert(rows, on_conflict='user_id,day').execute()
+            return response.data
+        except Exception as e:
+            DB_EXCEPTIONS.labels('save_daily_rollups').inc()
+            print(f"Error saving daily rollups: {str(e)}")
+            return []
+    
+    def delete_daily_rollups(self, user_id, days):
+        """Drop rollup rows of the given days"""
+        if not days:
+            return True
+        try:
+            self._client.table('daily_rollups').delete().eq('user_id', user_id).in_('day', list(days)).execute()
+            return True
+        except Exception as e:
+            DB_EXCEPTIONS.labels('delete_daily_rollups').inc()
+            print(f"Error deleting daily rollups: {str(e)}")
+            return False
+    
+    def get_user_ids(self):
+        """Ids of every user (rollup jobs)"""
+        try:
+            response = self._client.table('users').select('id').execute()
+            return [row['id'] for row in response.data]
+        except Exception as e:
+            DB_EXCEPTIONS.labels('get_user_ids').inc()
+            print(f"Error fetching users: {str(e)}")
+            return []
+    
     # Progress operations
     def update_progress(self, user_id, topic_id, status, hours_spent=0, notes=None):
         """Update or create progress for a topic"""
@@ -233,7 +819,9 @@ class SupabaseDB:
             data = {
                 'status': status,
                 'hours_spent': hours_spent,
-                'notes': notes
+                'notes': notes,
+                # UTC, like the rollup day; the column default only covers inserts
+                'last_updated': datetime.now(timezone.utc).isoformat()
             }
             
             if existing.data:
@@ -245,17 +833,36 @@ class SupabaseDB:
                 data['topic_id'] = topic_id
                 response = self._client.table('progress').insert(data).execute()
             
+            # Today's rollup gets the change in hours and completions
+            before = existing.data[0] if existing.data else {}
+            hours = float(hours_spent or 0) - float(before.get('hours_spent') or 0)
+            completed = int(status == 'completed') - int(before.get('status') == 'completed')
+            if response.data and (hours or completed):
+                self.bump_daily_rollup(user_id, _today(), hours=hours, completed=completed)
+            
             return response.data[0] if response.data else None
         except Exception as e:
+            DB_EXCEPTIONS.labels('update_progress').inc()
             print(f"Error updating progress: {str(e)}")
             return None
     
+    def get_open_progress(self, user_id, limit=5):
+        """Not-started and in-progress topics of a user, with their topic rows"""
+        try:
+            response = self._client.table('progress').select('*, topics(topic_name, estimated_hours)').eq('user_id', user_id).in_('status', ['not_started', 'in_progress']).limit(limit).execute()
+            return response.data
+        except Exception as e:
+            DB_EXCEPTIONS.labels('get_open_progress').inc()
+            print(f"Error fetching progress: {str(e)}")
+            return []
+    
     def get_progress_by_user(self, user_id):
         """Get all progress for a user"""
         try:
             response = self._client.table('progress').select('*, topics(*)').eq('user_id', user_id).execute()
             return response.data
         except Exception as e:
+            DB_EXCEPTIONS.labels('get_progress_by_user').inc()
             print(f"Error fetching progress: {str(e)}")
             return []
    
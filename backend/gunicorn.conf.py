@@ -0,0 +1,26 @@
+import os
+import shutil
+import tempfile
+
+# prometheus_client multiprocess mode: every worker writes its metrics to
+# files here and /api/metrics sums them. Must be set before the app (and
+# so prometheus_client) is imported in the workers.
+metrics_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR',
+    os.path.join(tempfile.gettempdir(), 'studywise-metrics')
+)
+
+
+def on_starting(server):
+    """Start from empty metric files on every deploy"""
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Drop a dead worker's live-only metrics"""
+    try:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+    except ImportError:
+        pass
@@ -0,0 +1,50 @@
+"""
+Maintenance for the daily analytics rollups.
+
+    backfill  rebuild rollups from quiz_attempts and progress (run once
+              after creating the daily_rollups table, or to repair)
+    compact   re-derive recent quiz columns and drop empty rows
+              (safe to run nightly, e.g. from cron)
+
+Run from backend/:
+    python jobs/rollups.py backfill [--email EMAIL] [--since YYYY-MM-DD]
+    python jobs/rollups.py compact [--email EMAIL] [--days 35]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db
+from services.rollups import rollups
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Daily rollup maintenance')
+    parser.add_argument('command', choices=['backfill', 'compact'])
+    parser.add_argument('--email', help='Only this user (default: every user)')
+    parser.add_argument('--since', help='backfill: first day to rebuild (default: all history)')
+    parser.add_argument('--days', type=int, default=35, help='compact: how many recent days to check')
+    args = parser.parse_args()
+
+    if args.email:
+        user = db.get_user_by_email(args.email)
+        if not user:
+            sys.exit(f"User not found: {args.email}")
+        user_ids = [user['id']]
+    else:
+        user_ids = db.get_user_ids()
+
+    total = 0
+    for user_id in user_ids:
+        if args.command == 'backfill':
+            total += rollups.backfill(user_id, args.since)
+        else:
+            total += rollups.compact(user_id, args.days)
+
+    print(f"{args.command}: {len(user_ids)} users, {total} days written")
+
+
+if __name__ == '__main__':
+    main()
@@ -68,6 +68,57 @@ def check_cloud_status():
         }), 200
 
 
+@ai_bp.route('/hedge-stats', methods=['GET'])
+def get_hedge_stats():
+    """Which backend won hedged generations and how much latency it saved"""
+    try:
+        from services.async_ai_service import async_ai_service
+        stats = async_ai_service.hedge_stats
+        calls = stats['calls']
+        
+        return jsonify({
+            'enabled_by_default': Config.AI_HEDGE_ENABLED,
+            'delay_seconds': Config.AI_HEDGE_DELAY,
+            'calls': calls,
+            'wins': dict(stats['wins']),
+            'latency_saved_total': round(stats['latency_saved'], 3),
+            'latency_saved_avg': round(stats['latency_saved'] / calls, 3) if calls else 0
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@ai_bp.route('/parse-stats', methods=['GET'])
+def get_parse_stats():
+    """Per-backend model output parse outcomes (wasted vs salvaged calls)"""
+    try:
+        from utils.json_stream import parse_stats
+        
+        return jsonify({'backends': parse_stats.snapshot()}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@ai_bp.route('/ollama-stats', methods=['GET'])
+def get_ollama_stats():
+    """Cold vs warm Ollama latency and keep-alive settings"""
+    try:
+        from services.ollama_service import ollama_service
+        
+        return jsonify({
+            'model': OLLAMA_MODEL,
+            'keep_alive': Config.OLLAMA_KEEP_ALIVE,
+            'warm_hours': Config.OLLAMA_WARM_HOURS or None,
+            'in_warm_hours': ollama_service.in_warm_hours(),
+            'latency': ollama_service.latency.snapshot()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @ai_bp.route('/mode', methods=['POST'])
 def set_ai_mode():
     """Set AI mode for a user"""
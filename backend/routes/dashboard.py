@@ -1,71 +1,141 @@
 from flask import Blueprint, request, jsonify
 from database import db
-from services import plan_generator
+from database.supabase_client import _today
+from services.rollups import rollups
+from utils.fanout import query_pool
+from datetime import date, timedelta
+from utils.response_cache import response_cache
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
-@dashboard_bp.route('/stats/<user_email>', methods=['GET'])
-def get_dashboard_stats(user_email):
-    """Get comprehensive dashboard statistics"""
+EMPTY_STATS = {
+    'total_uploads': 0,
+    'total_topics': 0,
+    'total_quizzes': 0,
+    'avg_quiz_score': 0,
+    'study_hours': 0,
+    'progress': {
+        'completed': 0,
+        'in_progress': 0,
+        'not_started': 0,
+        'completion_percentage': 0
+    }
+}
+
+
+def _fetch(user_id, parts):
+    """
+    Datasets for the requested dashboard parts, each fetched once
+    
+    The queries are independent, so they run concurrently and the
+    wait is about as long as the slowest one.
+    """
+    calls = {}
+    if 'stats' in parts:
+        # Counts and averages are aggregated in the database
+        calls['stats'] = lambda: db.get_dashboard_stats(user_id)
+    if 'overview' in parts:
+        calls['recent_uploads'] = lambda: db.get_recent_uploads(user_id, 5)
+        calls['recent_attempts'] = lambda: db.get_recent_attempts(user_id, 5)
+        calls['open_progress'] = lambda: db.get_open_progress(user_id, 5)
+    return query_pool.fan_out(calls)
+
+
+def _build_stats(data):
+    """Dashboard statistics from the aggregated counts"""
+    counts = data['stats']
+    if not counts:
+        return EMPTY_STATS
+    
+    tracked = counts['total_progress']
+    return {
+        'total_uploads': counts['total_uploads'],
+        'total_topics': counts['total_topics'],
+        'total_quizzes': counts['total_quizzes'],
+        'avg_quiz_score': counts['avg_quiz_score'],
+        'study_hours': counts['study_hours'],
+        'progress': {
+            'completed': counts['completed'],
+            'in_progress': counts['in_progress'],
+            'not_started': counts['not_started'],
+            'completion_percentage': round((counts['completed'] / tracked) * 100, 1) if tracked > 0 else 0
+        }
+    }
+
+
+def _build_overview(data):
+    """Dashboard overview from fetched datasets"""
+    recent_uploads = data['recent_uploads']
+    
+    quiz_history = []
+    for attempt in data['recent_attempts']:
+        quiz_history.append({
+            'title': attempt['quizzes']['title'] if attempt.get('quizzes') else 'Unknown',
+            'score': attempt['score'],
+            'total': attempt['total_questions'],
+            'percentage': round((attempt['score'] / attempt['total_questions']) * 100, 1) if attempt['total_questions'] else 0,
+            'date': attempt['completed_at']
+        })
+    
+    # In-progress and not-started topics
+    upcoming_topics = []
+    for progress in data['open_progress']:
+        if progress['status'] in ['not_started', 'in_progress']:
+            topic_data = progress.get('topics')
+            if topic_data:
+                upcoming_topics.append({
+                    'name': topic_data.get('topic_name'),
+                    'status': progress['status'],
+                    'hours_spent': progress['hours_spent'],
+                    'estimated_hours': topic_data.get('estimated_hours', 0)
+                })
+    
+    return {
+        'recent_uploads': recent_uploads,
+        'recent_quizzes': quiz_history,
+        'upcoming_topics': upcoming_topics[:5]
+    }
+
+
+@dashboard_bp.route('/<user_email>', methods=['GET'])
+@response_cache.cached
+def get_dashboard(user_email):
+    """
+    Stats and overview in one request
+    
+    Resolves the user once and runs the aggregate stats query and the
+    overview's recent-items queries concurrently.
+    
+    Returns:
+        { stats: {...}, overview: {...} } as from /stats and /overview
+    """
     try:
         user = db.get_user_by_email(user_email)
         if not user:
-            return jsonify({
-                'stats': {
-                    'total_uploads': 0,
-                    'total_topics': 0,
-                    'total_quizzes': 0,
-                    'avg_quiz_score': 0,
-                    'study_hours': 0,
-                    'progress': {
-                        'completed': 0,
-                        'in_progress': 0,
-                        'not_started': 0,
-                        'completion_percentage': 0
-                    }
-                }
-            }), 200
-        
-        # Get uploads
-        uploads = db.get_uploads_by_user(user['id'])
-        
-        # Get all topics
-        all_topics = []
-        for upload in uploads:
-            topics = db.get_topics_by_upload(upload['id'])
-            all_topics.extend(topics)
+            return jsonify({'stats': EMPTY_STATS, 'overview': {}}), 200
         
-        # Get quiz attempts
-        quiz_attempts = db.client.table('quiz_attempts').select('*').eq('user_id', user['id']).execute()
+        data = _fetch(user['id'], ('stats', 'overview'))
         
-        # Calculate average score
-        avg_score = 0
-        if quiz_attempts.data:
-            total_percentage = sum(
-                (attempt['score'] / attempt['total_questions']) * 100
-                for attempt in quiz_attempts.data
-            )
-            avg_score = round(total_percentage / len(quiz_attempts.data), 1)
-        
-        # Get progress
-        progress_records = db.get_progress_by_user(user['id'])
-        progress_stats = plan_generator.get_progress_stats(progress_records)
+        return jsonify({
+            'stats': _build_stats(data),
+            'overview': _build_overview(data)
+        }), 200
         
-        stats = {
-            'total_uploads': len(uploads),
-            'total_topics': len(all_topics),
-            'total_quizzes': len(quiz_attempts.data),
-            'avg_quiz_score': avg_score,
-            'study_hours': progress_stats['total_hours'],
-            'progress': {
-                'completed': progress_stats['completed'],
-                'in_progress': progress_stats['in_progress'],
-                'not_started': progress_stats['not_started'],
-                'completion_percentage': progress_stats['completion_percentage']
-            }
-        }
+    except Exception as e:
+        print(f"Dashboard error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@dashboard_bp.route('/stats/<user_email>', methods=['GET'])
+@response_cache.cached
+def get_dashboard_stats(user_email):
+    """Get comprehensive dashboard statistics"""
+    try:
+        user = db.get_user_by_email(user_email)
+        if not user:
+            return jsonify({'stats': EMPTY_STATS}), 200
         
-        return jsonify({'stats': stats}), 200
+        return jsonify({'stats': _build_stats(_fetch(user['id'], ('stats',)))}), 200
         
     except Exception as e:
         print(f"Dashboard stats error: {str(e)}")
@@ -73,6 +143,7 @@ def get_dashboard_stats(user_email):
 
 
 @dashboard_bp.route('/overview/<user_email>', methods=['GET'])
+@response_cache.cached
 def get_dashboard_overview(user_email):
     """Get detailed dashboard overview"""
     try:
@@ -80,49 +151,44 @@ def get_dashboard_overview(user_email):
         if not user:
             return jsonify({'overview': {}}), 200
         
-        # Recent uploads
-        uploads = db.get_uploads_by_user(user['id'])
-        recent_uploads = sorted(uploads, key=lambda x: x['uploaded_at'], reverse=True)[:5]
-        
-        # Recent quiz attempts
-        recent_quizzes = db.client.table('quiz_attempts').select('*, quizzes(title)').eq('user_id', user['id']).order('completed_at', desc=True).limit(5).execute()
+        return jsonify({'overview': _build_overview(_fetch(user['id'], ('overview',)))}), 200
         
-        quiz_history = []
-        for attempt in recent_quizzes.data:
-            quiz_history.append({
-                'title': attempt['quizzes']['title'] if attempt.get('quizzes') else 'Unknown',
-                'score': attempt['score'],
-                'total': attempt['total_questions'],
-                'percentage': round((attempt['score'] / attempt['total_questions']) * 100, 1),
-                'date': attempt['completed_at']
-            })
-        
-        # Upcoming topics (based on study plan)
-        upcoming_topics = []
-        progress_records = db.get_progress_by_user(user['id'])
+    except Exception as e:
+        print(f"Dashboard overview error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@dashboard_bp.route('/trends/<user_email>', methods=['GET'])
+@response_cache.cached
+def get_trends(user_email):
+    """
+    Daily study trends from the rollups
+    
+    Query: from, to (ISO dates, inclusive; default the last 30 days)
+    
+    Returns:
+        { days: [{ date, quizzes, avg_score, hours, topics_completed }],
+        totals: {...} } with every day of the range present
+    """
+    try:
+        try:
+            to_date = date.fromisoformat(request.args.get('to') or _today())
+            from_date = date.fromisoformat(request.args.get('from') or (to_date - timedelta(days=29)).isoformat())
+        except ValueError:
+            return jsonify({'error': 'from and to must be YYYY-MM-DD dates'}), 400
         
-        # Get in-progress and not-started topics
-        for progress in progress_records:
-            if progress['status'] in ['not_started', 'in_progress']:
-                topic_data = progress.get('topics')
-                if topic_data:
-                    upcoming_topics.append({
-                        'name': topic_data.get('topic_name'),
-                        'status': progress['status'],
-                        'hours_spent': progress['hours_spent'],
-                        'estimated_hours': topic_data.get('estimated_hours', 0)
-                    })
+        if to_date < from_date:
+            return jsonify({'error': 'to must not be before from'}), 400
+        if to_date - from_date > timedelta(days=731):
+            return jsonify({'error': 'Range is limited to two years'}), 400
         
-        overview = {
-            'recent_uploads': recent_uploads,
-            'recent_quizzes': quiz_history,
-            'upcoming_topics': upcoming_topics[:5]
-        }
+        user = db.get_user_by_email(user_email)
+        rows = db.get_daily_rollups(user['id'], from_date.isoformat(), to_date.isoformat()) if user else []
         
-        return jsonify({'overview': overview}), 200
+        return jsonify(rollups.series(rows, from_date, to_date)), 200
         
     except Exception as e:
-        print(f"Dashboard overview error: {str(e)}")
+        print(f"Trends error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
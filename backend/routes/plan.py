@@ -1,15 +1,48 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from config import Config
 from database import db
-from datetime import datetime, timedelta
+from services import plan_generator
+from services.free_time import free_time_index, to_clock, to_minutes
+from services.plan_export import plan_exporter
+from datetime import date, timedelta
+from utils.response_cache import response_cache
 
 plan_bp = Blueprint('plan', __name__)
 
 
-from flask import Blueprint, request, jsonify
-from database import db
-from datetime import datetime, timedelta
+def _capacities(user, data, start_date, end_date, hours_per_day):
+    """Per-day study hours from the user's timetable (None: no timetable or opted out)"""
+    if data.get('use_timetable') is False:
+        return None
+    return free_time_index.capacities(user['id'], start_date, end_date, hours_per_day)
 
-plan_bp = Blueprint('plan', __name__)
+
+# Plan days are read for export this many at a time
+EXPORT_PAGE_DAYS = 31
+
+
+def _iter_plan_days(plan, end_date):
+    """Plan days from the day rows, one page of dates at a time"""
+    cursor = date.fromisoformat(plan['start_date'])
+    end = date.fromisoformat(end_date)
+    while cursor <= end:
+        page_end = min(cursor + timedelta(days=EXPORT_PAGE_DAYS - 1), end)
+        for row in db.get_plan_days(plan['id'], cursor.isoformat(), page_end.isoformat()):
+            yield {'day': row['day_number'], 'date': row['day_date'], 'hours': row['hours'], 'topics': row['topics']}
+        cursor = page_end + timedelta(days=1)
+
+
+def _materialize_days(plan):
+    """
+    Write the day rows of a plan stored before study_plan_days existed
+    
+    Returns the current schedule (revisions applied).
+    """
+    full = db.get_study_plan(plan['id'])
+    revisions = db.get_plan_revisions(plan['id'])
+    schedule = plan_generator.apply_revisions((full or {}).get('schedule', []), revisions)
+    db.save_plan_days(plan['id'], schedule, revisions[-1]['revision'] if revisions else 0)
+    return schedule
 
 
 @plan_bp.route('/generate', methods=['POST'])
@@ -51,8 +84,13 @@ def generate_plan():
         
         print(f"📚 Found {len(topics)} topics")
         
-        # Generate schedule
-        schedule = generate_schedule(topics, start_date, end_date, hours_per_day)
+        # Generate schedule (daily view; the weekly view comes from the same packing)
+        try:
+            capacities = _capacities(user, data, start_date, end_date, hours_per_day)
+            plan_views = plan_generator.build_plan(topics, start_date, end_date, hours_per_day, capacities)
+        except ValueError as e:
+            return jsonify({'error': str(e), 'success': False}), 400
+        schedule = plan_views['days']
         
         print(f"✅ Generated {len(schedule)} days")
         
@@ -79,11 +117,16 @@ def generate_plan():
         
         print(f"💾 Plan saved: {plan['id']}")
         
+        # Day rows for range reads; /range backfills them if this fails
+        db.save_plan_days(plan['id'], schedule)
+        
         # ✅ Return schedule immediately
         return jsonify({
             'success': True,
             'plan_id': plan['id'],
             'schedule': schedule,  # ✅ Frontend can render immediately
+            'weeks': plan_views['weeks'],
+            'scale': plan_views['scale'],
             'start_date': start_date,
             'end_date': end_date,
             'total_days': len(schedule)
@@ -100,50 +143,120 @@ def generate_plan():
         }), 500
 
 
-def generate_schedule(topics, start_date, end_date, hours_per_day):
-    """Generate day-by-day schedule"""
-    start = datetime.strptime(start_date, '%Y-%m-%d')
-    end = datetime.strptime(end_date, '%Y-%m-%d')
-    total_days = (end - start).days + 1
-    
-    if total_days <= 0:
-        raise ValueError('End date must be after start date')
+@plan_bp.route('/generate-global', methods=['POST'])
+def generate_global_plan():
+    """
+    One study plan across all of a user's subjects
     
-    schedule = []
-    topics_per_day = max(1, len(topics) // total_days)
+    Body: { email, start_date, hours_per_day, end_date?, upload_ids?,
+    exams?: { upload_id: exam_date }, use_timetable? }
     
-    current_date = start
-    topic_index = 0
+    Every upload (default: all uploads with topics) becomes a subject
+    studied until its exam date; the daily hours are shared between
+    subjects rather than given to each. end_date defaults to the
+    latest exam.
     
-    for day in range(total_days):
-        if topic_index >= len(topics):
-            break
+    Returns:
+        { success, plan_id, schedule, weeks, scale, subjects, ... }
+    """
+    try:
+        data = request.get_json()
         
-        day_topics = []
-        for _ in range(min(topics_per_day, len(topics) - topic_index)):
-            if topic_index < len(topics):
-                topic = topics[topic_index]
-                day_topics.append({
-                    'id': topic['id'],
-                    'name': topic['topic_name'],
-                    'description': topic.get('description', ''),
-                    'hours': topic.get('estimated_hours', hours_per_day)
-                })
-                topic_index += 1
+        email = data.get('email')
+        start_date = data.get('start_date')
+        hours_per_day = float(data.get('hours_per_day', 2))
+        exams = data.get('exams') or {}
         
-        if day_topics:
-            schedule.append({
-                'day': day + 1,
-                'date': current_date.strftime('%Y-%m-%d'),
-                'topics': day_topics
-            })
+        if not email or not start_date:
+            return jsonify({'error': 'email and start_date required', 'success': False}), 400
         
-        current_date += timedelta(days=1)
-    
-    return schedule
+        user = db.get_user_by_email(email)
+        if not user:
+            return jsonify({'error': 'User not found', 'success': False}), 404
+        
+        uploads = {u['id']: u for u in db.get_uploads_by_user(user['id'])}
+        upload_ids = [u for u in (data.get('upload_ids') or list(uploads)) if u in uploads]
+        if not upload_ids:
+            return jsonify({'error': 'No uploads found', 'success': False}), 404
+        
+        # All subjects' topics in one query
+        by_upload = {}
+        for topic in db.get_topics_by_uploads(upload_ids):
+            by_upload.setdefault(topic['upload_id'], []).append(topic)
+        
+        end_date = data.get('end_date') or max(
+            [exams[u] for u in upload_ids if exams.get(u)], default=None
+        )
+        if not end_date:
+            return jsonify({'error': 'end_date or exam dates required', 'success': False}), 400
+        
+        subjects = [
+            {
+                'upload_id': upload_id,
+                'subject': uploads[upload_id].get('subject') or uploads[upload_id].get('filename'),
+                'exam_date': exams.get(upload_id),
+                'topics': by_upload[upload_id]
+            }
+            for upload_id in upload_ids
+            if by_upload.get(upload_id)
+        ]
+        if not subjects:
+            return jsonify({'error': 'No topics found', 'success': False}), 404
+        
+        print(f"📅 Global plan: {len(subjects)} subjects, {sum(len(s['topics']) for s in subjects)} topics")
+        
+        try:
+            capacities = _capacities(user, data, start_date, end_date, hours_per_day)
+            plan_views = plan_generator.build_global_plan(subjects, start_date, end_date, hours_per_day, capacities)
+        except ValueError as e:
+            return jsonify({'error': str(e), 'success': False}), 400
+        schedule = plan_views['days']
+        
+        try:
+            plan = db.create_study_plan(
+                user_id=user['id'],
+                upload_id=None,
+                schedule=schedule,
+                start_date=start_date,
+                end_date=end_date,
+                hours_per_day=hours_per_day
+            )
+        except Exception as e:
+            print(f"❌ DB error: {str(e)}")
+            return jsonify({
+                'error': 'Failed to save plan',
+                'details': str(e),
+                'success': False
+            }), 500
+        
+        if not plan:
+            return jsonify({'error': 'Failed to save plan', 'success': False}), 500
+        
+        db.save_plan_days(plan['id'], schedule)
+        
+        return jsonify({
+            'success': True,
+            'plan_id': plan['id'],
+            'schedule': schedule,
+            'weeks': plan_views['weeks'],
+            'scale': plan_views['scale'],
+            'subjects': plan_views['subjects'],
+            'start_date': start_date,
+            'end_date': end_date,
+            'total_days': len(schedule)
+        }), 200
+        
+    except Exception as e:
+        print(f"❌ Global plan error: {str(e)}")
+        return jsonify({
+            'error': 'Failed to generate plan',
+            'details': str(e),
+            'success': False
+        }), 500
 
 
 @plan_bp.route('/<user_email>', methods=['GET'])
+@response_cache.cached
 def get_user_plan(user_email):
     """Get latest study plan"""
     try:
@@ -158,12 +271,17 @@ def get_user_plan(user_email):
         if not plan:
             return jsonify({'error': 'No study plan found', 'success': False}), 404
         
+        # Apply replan deltas on top of the stored schedule
+        revisions = db.get_plan_revisions(plan['id'])
+        schedule = plan_generator.apply_revisions(plan.get('schedule', []), revisions)
+        
         return jsonify({
             'success': True,
             'plan_id': plan['id'],
-            'schedule': plan.get('schedule', []),  # ✅ Return schedule
+            'schedule': schedule,  # ✅ Return schedule
+            'revision': revisions[-1]['revision'] if revisions else 0,
             'start_date': plan.get('start_date'),
-            'end_date': plan.get('end_date')
+            'end_date': revisions[-1]['end_date'] if revisions else plan.get('end_date')
         }), 200
         
     except Exception as e:
@@ -174,7 +292,242 @@ def get_user_plan(user_email):
             'success': False
         }), 500
 
+@plan_bp.route('/replan', methods=['POST'])
+def replan():
+    """
+    Reschedule the unfinished part of a plan from today onward
+    
+    Body: { email, plan_id?, today?, end_date?, hours_per_day?, use_timetable? }
+    (defaults: latest plan, today's date, the plan's end date and hours)
+    
+    Only the days that change are stored, as a new revision.
+    
+    Returns:
+        { success, plan_id, revision, changed_days, removed_days, schedule }
+    """
+    try:
+        data = request.get_json()
+        
+        email = data.get('email')
+        if not email:
+            return jsonify({'error': 'email required', 'success': False}), 400
+        
+        user = db.get_user_by_email(email)
+        if not user:
+            return jsonify({'error': 'User not found', 'success': False}), 404
+        
+        plan = db.get_study_plan(data['plan_id']) if data.get('plan_id') else db.get_latest_study_plan(user['id'])
+        if not plan or plan.get('user_id') != user['id']:
+            return jsonify({'error': 'No study plan found', 'success': False}), 404
+        
+        revisions = db.get_plan_revisions(plan['id'])
+        latest = revisions[-1] if revisions else {}
+        schedule = plan_generator.apply_revisions(plan.get('schedule', []), revisions)
+        
+        today = data.get('today') or date.today().isoformat()
+        end_date = data.get('end_date') or latest.get('end_date') or plan['end_date']
+        hours_per_day = float(data.get('hours_per_day') or latest.get('hours_per_day') or plan.get('hours_per_day') or 2)
+        
+        try:
+            capacities = _capacities(user, data, max(today, plan['start_date']), end_date, hours_per_day)
+            result = plan_generator.replan(
+                schedule,
+                plan.get('schedule', []),
+                plan['start_date'],
+                max(today, plan['start_date']),
+                end_date,
+                hours_per_day,
+                db.get_progress_by_user(user['id']),
+                capacities
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e), 'success': False}), 400
+        
+        revision = latest.get('revision', 0)
+        if result['days'] or result['removed_dates']:
+            revision += 1
+            saved = db.create_plan_revision(
+                plan['id'],
+                revision,
+                max(today, plan['start_date']),
+                result['days'],
+                result['removed_dates'],
+                end_date,
+                hours_per_day
+            )
+            if not saved:
+                return jsonify({'error': 'Failed to save plan revision', 'success': False}), 500
+            
+            # Keep the day rows in step: only changed days are rewritten
+            if db.has_plan_days(plan['id']):
+                db.save_plan_days(plan['id'], result['days'], revision)
+                db.delete_plan_days(plan['id'], result['removed_dates'])
+            else:
+                db.save_plan_days(plan['id'], result['schedule'], revision)
+        
+        return jsonify({
+            'success': True,
+            'plan_id': plan['id'],
+            'revision': revision,
+            'changed_days': len(result['days']),
+            'removed_days': len(result['removed_dates']),
+            'remaining_hours': result['remaining_hours'],
+            'schedule': result['schedule'],
+            'end_date': end_date
+        }), 200
+        
+    except Exception as e:
+        print(f"❌ Replan error: {str(e)}")
+        return jsonify({
+            'error': 'Failed to replan',
+            'details': str(e),
+            'success': False
+        }), 500
+
+
+@plan_bp.route('/<user_email>/range', methods=['GET'])
+@response_cache.cached
+def get_plan_range(user_email):
+    """
+    Days of the latest plan within a date range
+    
+    Query: from, to (ISO dates, inclusive; default today, and `from`
+    for a single day)
+    
+    Reads only the day rows in range instead of the whole schedule.
+    
+    Returns:
+        { success, plan_id, from, to, days: [{ day, date, hours, topics }] }
+    """
+    try:
+        user = db.get_user_by_email(user_email)
+        if not user:
+            return jsonify({'error': 'User not found', 'success': False}), 404
+        
+        try:
+            from_date = date.fromisoformat(request.args.get('from') or date.today().isoformat())
+            to_date = date.fromisoformat(request.args.get('to') or from_date.isoformat())
+        except ValueError:
+            return jsonify({'error': 'from and to must be YYYY-MM-DD dates', 'success': False}), 400
+        
+        if to_date < from_date:
+            return jsonify({'error': 'to must not be before from', 'success': False}), 400
+        if to_date - from_date > timedelta(days=366):
+            return jsonify({'error': 'Range is limited to one year', 'success': False}), 400
+        
+        plan = db.get_latest_plan_summary(user['id'])
+        if not plan:
+            return jsonify({'error': 'No study plan found', 'success': False}), 404
+        
+        rows = db.get_plan_days(plan['id'], from_date.isoformat(), to_date.isoformat())
+        if rows:
+            days = [
+                {'day': row['day_number'], 'date': row['day_date'], 'hours': row['hours'], 'topics': row['topics']}
+                for row in rows
+            ]
+        elif db.has_plan_days(plan['id']):
+            days = []
+        else:
+            # Plan from before day rows: write them once, then answer from the schedule
+            schedule = _materialize_days(plan)
+            days = [day for day in schedule if from_date.isoformat() <= day['date'] <= to_date.isoformat()]
+        
+        return jsonify({
+            'success': True,
+            'plan_id': plan['id'],
+            'from': from_date.isoformat(),
+            'to': to_date.isoformat(),
+            'days': days,
+            'total_hours': round(sum(float(day.get('hours') or 0) for day in days), 2)
+        }), 200
+        
+    except Exception as e:
+        print(f"❌ Plan range error: {str(e)}")
+        return jsonify({
+            'error': 'Failed to fetch plan days',
+            'details': str(e),
+            'success': False
+        }), 500
+
+
+def _export_plan(user_email, fmt):
+    """Stream the latest plan as iCalendar or CSV, answering 304 to a matching ETag"""
+    user = db.get_user_by_email(user_email)
+    if not user:
+        return jsonify({'error': 'User not found', 'success': False}), 404
+    
+    plan = db.get_latest_plan_summary(user['id'])
+    if not plan:
+        return jsonify({'error': 'No study plan found', 'success': False}), 404
+    
+    latest = db.get_latest_plan_revision(plan['id']) or {}
+    timetable = db.get_timetable(user['id'])
+    etag = plan_exporter.etag(plan, latest.get('revision', 0), timetable, fmt)
+    if etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    
+    if not db.has_plan_days(plan['id']):
+        _materialize_days(plan)
+    
+    end_date = latest.get('end_date') or plan['end_date']
+    days = _iter_plan_days(plan, end_date)
+    
+    # Placed from the same timetable rows the ETag hashes; the cached
+    # per-worker index may not have seen an edit from another worker yet
+    week = free_time_index.build(timetable)
+    
+    def slots_for(day):
+        if week.empty:
+            return None
+        return [
+            {'start': to_clock(s), 'end': to_clock(e)}
+            for s, e in week.slots[date.fromisoformat(day).weekday()]
+        ]
+    
+    day_start, day_end = to_minutes(Config.STUDY_DAY_START), to_minutes(Config.STUDY_DAY_END)
+    if fmt == 'ics':
+        body = plan_exporter.ics(plan, days, timetable, end_date, slots_for, day_start, day_end)
+        mimetype, filename = 'text/calendar', 'study-plan.ics'
+    else:
+        body = plan_exporter.csv(days, slots_for, day_start, day_end)
+        mimetype, filename = 'text/csv', 'study-plan.csv'
+    
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, max-age=900'
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@plan_bp.route('/<user_email>/export.ics', methods=['GET'])
+def export_plan_ics(user_email):
+    """
+    Latest plan as an iCalendar feed (study sessions and weekly classes)
+    
+    Streams the stored plan days; repeated polls with If-None-Match get
+    a 304 until the plan, a replan or the timetable changes.
+    """
+    try:
+        return _export_plan(user_email, 'ics')
+    except Exception as e:
+        print(f"❌ ICS export error: {str(e)}")
+        return jsonify({'error': 'Failed to export plan', 'details': str(e), 'success': False}), 500
+
+
+@plan_bp.route('/<user_email>/export.csv', methods=['GET'])
+def export_plan_csv(user_email):
+    """Latest plan as CSV, one row per study session (see export.ics)"""
+    try:
+        return _export_plan(user_email, 'csv')
+    except Exception as e:
+        print(f"❌ CSV export error: {str(e)}")
+        return jsonify({'error': 'Failed to export plan', 'details': str(e), 'success': False}), 500
+
+
 @plan_bp.route('/all/<user_email>', methods=['GET'])
+@response_cache.cached
 def get_all_user_plans(user_email):
     """
     Get all study plans for a user (optional endpoint for history)
@@ -1,13 +1,30 @@
 from flask import Blueprint, request, jsonify
 from database import db
-from services import ai_service
+from services import ai_service, async_ai_service
+from services.answer_keys import answer_array, answer_keys, key_of
+from services.item_stats import item_stats
+from services.question_bank import bank_ids, question_bank
+from services.review_scheduler import review_scheduler
+from utils import validators
+from utils.deadline import Deadline, bind as bind_deadline
+from config import Config
+from utils.response_cache import response_cache
 
 quiz_bp = Blueprint('quiz', __name__)
 
+# Upper bound on topics per batch request
+MAX_BATCH_TOPICS = 50
+
 @quiz_bp.route('/generate', methods=['POST'])
 def generate_quiz():
-    """Generate a quiz for a specific topic"""
+    """
+    Generate a quiz for a specific topic
+    
+    Questions are sampled from the topic's question bank; the model is
+    only called when the user has seen too much of it.
+    """
     try:
+        deadline = bind_deadline(Deadline(Config.REQUEST_DEADLINE))
         data = request.get_json()
         
         topic_id = data.get('topic_id')
@@ -30,13 +47,21 @@ def generate_quiz():
         
         topic = topics.data[0]
         
-        # Generate questions using AI with mode support
-        questions, mode_used = ai_service.generate_quiz_questions(
-            topic['topic_name'],
-            topic.get('description', ''),
-            num_questions,
-            mode=ai_mode
-        )
+        draw = question_bank.draw(user['id'], [topic_id], num_questions)[str(topic_id)]
+        generated, mode_used = [], 'bank'
+        if draw.short:
+            # Generate questions using AI with mode support
+            generated, mode_used = ai_service.generate_quiz_questions(
+                topic['topic_name'],
+                topic.get('description', ''),
+                num_questions,
+                mode=ai_mode,
+                hedge=validators.parse_flag(data.get('hedge')),
+                # Syllabus text for free mode, only read if it runs
+                source_text=lambda: db.get_upload_texts([topic['upload_id']]).get(topic['upload_id'], ''),
+                deadline=deadline.reserve(Config.DEADLINE_DB_RESERVE)
+            )
+        questions = question_bank.assemble(draw, generated)
         
         if not questions:
             return jsonify({'error': 'Failed to generate quiz questions'}), 500
@@ -47,11 +72,17 @@ def generate_quiz():
             user_id=user['id'],
             topic_id=topic_id,
             title=quiz_title,
-            questions=questions
+            questions=questions,
+            answer_key=key_of(questions),
+            question_ids=bank_ids(questions),
+            deadline=deadline
         )
         
         if not quiz:
             return jsonify({'error': 'Failed to save quiz'}), 500
+        answer_keys.remember(quiz)
+        # email may have defaulted, which the write hook cannot see
+        response_cache.invalidate(user_email)
         
         return jsonify({
             'success': True,
@@ -67,15 +98,205 @@ def generate_quiz():
         return jsonify({'error': f'Failed to generate quiz: {str(e)}'}), 500
 
 
+@quiz_bp.route('/generate-batch', methods=['POST'])
+def generate_quiz_batch():
+    """
+    Generate one quiz per topic for a set of topics
+    
+    Body accepts exactly one topic source:
+        topic_ids: list of topic ids
+        upload_id: every topic of an upload
+        plan_week: week number (1-based) of the user's latest study plan
+    
+    Returns:
+        { success, results: [{ topic_id, success, quiz_id | error, ... }] }
+    """
+    try:
+        deadline = bind_deadline(Deadline(Config.REQUEST_DEADLINE))
+        data = request.get_json()
+        
+        user_email = data.get('email', 'demo@studywise.com')
+        topic_ids = data.get('topic_ids') or []
+        upload_id = data.get('upload_id')
+        plan_week = data.get('plan_week')
+        num_questions = int(data.get('num_questions', 5))
+        ai_mode = data.get('ai_mode', 'free')
+        
+        if not isinstance(topic_ids, list) or not all(isinstance(t, (str, int)) for t in topic_ids):
+            return jsonify({'error': 'topic_ids must be a list of topic ids'}), 400
+        topic_ids = list(dict.fromkeys(topic_ids))
+        
+        if plan_week is not None:
+            try:
+                plan_week = int(plan_week)
+            except (TypeError, ValueError):
+                return jsonify({'error': 'plan_week must be a week number'}), 400
+        
+        if not (topic_ids or upload_id or plan_week):
+            return jsonify({'error': 'topic_ids, upload_id or plan_week required'}), 400
+        
+        # Reject oversized explicit lists before querying anything
+        if len(topic_ids) > MAX_BATCH_TOPICS:
+            return jsonify({'error': f'At most {MAX_BATCH_TOPICS} topics per batch'}), 400
+        
+        # Get user once for the whole batch
+        user = db.get_user_by_email(user_email)
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        # Resolve topics with a single query
+        if topic_ids:
+            topics = db.get_topics_by_ids(topic_ids)
+        elif upload_id:
+            topics = db.get_topics_by_upload(upload_id)
+            topic_ids = [t['id'] for t in topics]
+        else:
+            plan = db.get_latest_study_plan(user['id'])
+            if not plan:
+                return jsonify({'error': 'No study plan found'}), 404
+            topic_ids = _plan_week_topic_ids(plan.get('schedule') or [], plan_week)
+            topics = db.get_topics_by_ids(topic_ids) if 0 < len(topic_ids) <= MAX_BATCH_TOPICS else []
+        
+        if len(topic_ids) > MAX_BATCH_TOPICS:
+            return jsonify({'error': f'At most {MAX_BATCH_TOPICS} topics per batch'}), 400
+        
+        if not topics:
+            return jsonify({'error': 'No topics found'}), 404
+        
+        topics_by_id = {t['id']: t for t in topics}
+        found = [topics_by_id[tid] for tid in topic_ids if tid in topics_by_id]
+        results = {
+            tid: {'topic_id': tid, 'success': False, 'error': 'Topic not found'}
+            for tid in topic_ids if tid not in topics_by_id
+        }
+        
+        # Only topics whose bank is short of unseen questions need the model
+        draws = question_bank.draw(user['id'], [t['id'] for t in found], num_questions)
+        short = [t for t in found if draws[str(t['id'])].short]
+        generated = {}
+        if short:
+            # Generate the missing quizzes concurrently
+            generated = dict(zip([t['id'] for t in short], async_ai_service.generate_quizzes_sync(
+                short,
+                num_questions,
+                ai_mode,
+                hedge=bool(validators.parse_flag(data.get('hedge'))),
+                source_texts=_UploadTexts({t['upload_id'] for t in short}).get,
+                deadline=deadline.reserve(Config.DEADLINE_DB_RESERVE)
+            )))
+        
+        to_save = []
+        for topic in found:
+            fresh, mode_used = generated.get(topic['id'], ([], 'bank'))
+            questions = question_bank.assemble(draws[str(topic['id'])], fresh)
+            if not questions:
+                results[topic['id']] = {
+                    'topic_id': topic['id'],
+                    'topic_name': topic['topic_name'],
+                    'success': False,
+                    'error': 'Failed to generate quiz questions'
+                }
+                continue
+            to_save.append((topic, questions, mode_used))
+        
+        # Save every generated quiz in one insert
+        created = []
+        if to_save:
+            created = db.create_quizzes_bulk([
+                {
+                    'user_id': user['id'],
+                    'topic_id': topic['id'],
+                    'title': f"{topic['topic_name']} - Quiz",
+                    'questions': None if bank_ids(questions) else questions,
+                    'question_ids': bank_ids(questions),
+                    'answer_key': key_of(questions),
+                    'total_questions': len(questions)
+                }
+                for topic, questions, _ in to_save
+            ], deadline=deadline)
+            if created:
+                response_cache.invalidate(user_email)
+        
+        for i, (topic, questions, mode_used) in enumerate(to_save):
+            quiz = created[i] if i < len(created) else None
+            if not quiz:
+                results[topic['id']] = {
+                    'topic_id': topic['id'],
+                    'topic_name': topic['topic_name'],
+                    'success': False,
+                    'error': 'Failed to save quiz'
+                }
+                continue
+            answer_keys.remember(quiz)
+            results[topic['id']] = {
+                'topic_id': topic['id'],
+                'topic_name': topic['topic_name'],
+                'success': True,
+                'quiz_id': quiz['id'],
+                'title': quiz['title'],
+                'questions': questions,
+                'total_questions': len(questions),
+                'ai_used': mode_used
+            }
+        
+        ordered = [results[tid] for tid in topic_ids if tid in results]
+        succeeded = sum(1 for r in ordered if r['success'])
+        
+        return jsonify({
+            'success': succeeded > 0,
+            'generated': succeeded,
+            'failed': len(ordered) - succeeded,
+            'results': ordered
+        }), 200
+        
+    except Exception as e:
+        print(f"Batch quiz generation error: {str(e)}")
+        return jsonify({'error': f'Failed to generate quizzes: {str(e)}'}), 500
+
+
+class _UploadTexts:
+    """
+    Syllabus text of some uploads, which free mode builds questions
+    from. Loaded on the first get, in one query for all of them, so
+    requests answered by a model backend never read it.
+    """
+
+    def __init__(self, upload_ids):
+        self._upload_ids = list(upload_ids)
+        self._texts = None
+
+    def get(self, upload_id) -> str:
+        if self._texts is None:
+            self._texts = db.get_upload_texts(self._upload_ids)
+        return self._texts.get(upload_id, '')
+
+
+def _plan_week_topic_ids(schedule, week):
+    """Topic ids scheduled in a 1-based plan week, in schedule order"""
+    topic_ids = []
+    for day in schedule:
+        if (int(day.get('day', 1)) - 1) // 7 + 1 != week:
+            continue
+        for topic in day.get('topics', []):
+            if topic.get('id') and topic['id'] not in topic_ids:
+                topic_ids.append(topic['id'])
+    return topic_ids
+
+
 @quiz_bp.route('/submit', methods=['POST'])
 def submit_quiz():
-    """Submit quiz answers and get score"""
+    """
+    Submit quiz answers and get score
+    
+    Scored against the cached answer key; question text and
+    explanations are loaded only when the body sets explanations: true.
+    """
     try:
         data = request.get_json()
         
         quiz_id = data.get('quiz_id')
         user_email = data.get('email', 'demo@studywise.com')
-        answers = data.get('answers', [])  # List of selected answer indices
+        answers = data.get('answers', [])  # Selected answer indices, list or {index: answer}
         
         if not quiz_id:
             return jsonify({'error': 'quiz_id required'}), 400
@@ -85,36 +306,29 @@ def submit_quiz():
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        # Get quiz
-        quizzes = db.client.table('quizzes').select('*').eq('id', quiz_id).execute()
-        if not quizzes.data:
+        key = answer_keys.get(quiz_id)
+        if key is None:
             return jsonify({'error': 'Quiz not found'}), 404
         
-        quiz = quizzes.data[0]
-        questions = quiz['questions']
-        
         # Calculate score
-        correct = 0
-        results = []
-        
-        for i, question in enumerate(questions):
-            user_answer = answers[i] if i < len(answers) else -1
-            correct_answer = question['correct']
-            is_correct = user_answer == correct_answer
-            
-            if is_correct:
-                correct += 1
-            
-            results.append({
+        total = len(key.correct)
+        given = answer_array(answers, total)
+        is_correct = key.score(given)
+        correct = int(is_correct.sum())
+        results = [
+            {
                 'question_number': i + 1,
-                'question': question['question'],
-                'user_answer': user_answer,
-                'correct_answer': correct_answer,
-                'is_correct': is_correct,
-                'explanation': question.get('explanation', '')
-            })
+                'user_answer': int(given[i]),
+                'correct_answer': int(key.correct[i]),
+                'is_correct': bool(is_correct[i])
+            }
+            for i in range(total)
+        ]
+        if data.get('explanations'):
+            for result, question in zip(results, db.get_quiz_questions(quiz_id)):
+                result['question'] = question.get('question', '')
+                result['explanation'] = question.get('explanation', '')
         
-        total = len(questions)
         score_percentage = round((correct / total) * 100, 1) if total > 0 else 0
         
         # Save attempt
@@ -123,16 +337,36 @@ def submit_quiz():
             user_id=user['id'],
             score=correct,
             total=total,
-            answers=answers
+            answers=given.tolist()
         )
         
+        # Per-question statistics for adaptive selection; best effort like reviews
+        if attempt and key.question_ids:
+            try:
+                item_stats.record(key.topic_id, key.question_ids, is_correct)
+            except Exception as e:
+                print(f"Item statistics update failed: {str(e)}")
+        
+        # Schedule the topic's next review; the submit still succeeds without it
+        next_review = None
+        if key.topic_id:
+            try:
+                review = review_scheduler.record_result(user['id'], key.topic_id, correct, total)
+                next_review = review['due_at'] if review else None
+            except Exception as e:
+                print(f"Review scheduling failed: {str(e)}")
+        
+        # email may have defaulted, which the write hook cannot see
+        response_cache.invalidate(user_email)
+        
         return jsonify({
             'success': True,
             'score': correct,
             'total': total,
             'percentage': score_percentage,
             'results': results,
-            'attempt_id': attempt['id'] if attempt else None
+            'attempt_id': attempt['id'] if attempt else None,
+            'next_review_at': next_review
         }), 200
         
     except Exception as e:
@@ -141,6 +375,7 @@ def submit_quiz():
 
 
 @quiz_bp.route('/history/<user_email>', methods=['GET'])
+@response_cache.cached
 def get_quiz_history(user_email):
     """Get quiz history for a user"""
     try:
@@ -167,3 +402,65 @@ def get_quiz_history(user_email):
     except Exception as e:
         print(f"History fetch error: {str(e)}")
         return jsonify({'error': str(e)}), 500
+
+
+@quiz_bp.route('/review/<user_email>', methods=['GET'])
+def get_due_reviews(user_email):
+    """
+    Topics due for spaced-repetition review, most overdue first
+    
+    Query: limit (default 10)
+    
+    Returns:
+        { success, due: [{ topic_id, topic_name, due_at, interval_days,
+        ease, last_score }], next_due_at, tracked_topics }
+    """
+    try:
+        user = db.get_user_by_email(user_email)
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        limit = min(int(request.args.get('limit', 10)), 100)
+        reviews = review_scheduler.due_reviews(user['id'], limit)
+        
+        # Names for the due topics only
+        names = {t['id']: t['topic_name'] for t in db.get_topics_by_ids([r['topic_id'] for r in reviews['due']])} if reviews['due'] else {}
+        
+        return jsonify({
+            'success': True,
+            'due': [
+                {
+                    'topic_id': r['topic_id'],
+                    'topic_name': names.get(r['topic_id']),
+                    'due_at': r['due_at'],
+                    'interval_days': r['interval_days'],
+                    'ease': r['ease'],
+                    'last_score': r.get('last_score')
+                }
+                for r in reviews['due']
+            ],
+            'next_due_at': reviews['next_due_at'],
+            'tracked_topics': reviews['tracked_topics']
+        }), 200
+        
+    except Exception as e:
+        print(f"Review queue error: {str(e)}")
+        return jsonify({'error': f'Failed to fetch reviews: {str(e)}'}), 500
+
+
+@quiz_bp.route('/items/<topic_id>', methods=['GET'])
+def get_item_stats(topic_id):
+    """
+    Difficulty (share correct) and discrimination of a topic's bank
+    questions, hardest first
+    
+    Returns:
+        { success, items: [{ question_id, attempts, difficulty,
+        discrimination }] }
+    """
+    try:
+        return jsonify({'success': True, 'items': item_stats.summary(topic_id)}), 200
+        
+    except Exception as e:
+        print(f"Item stats error: {str(e)}")
+        return jsonify({'error': f'Failed to fetch item stats: {str(e)}'}), 500
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from database import db
-from datetime import datetime
+from services.free_time import free_time_index
+from datetime import date, datetime
 
 timetable_bp = Blueprint('timetable', __name__)
 
@@ -62,9 +63,13 @@ def add_timetable_entry():
             'title': title
         }).execute()
         
+        entry = response.data[0] if response.data else None
+        if entry:
+            free_time_index.entry_added(user['id'], entry)
+        
         return jsonify({
             'success': True,
-            'entry': response.data[0] if response.data else None
+            'entry': entry
         }), 200
         
     except Exception as e:
@@ -87,6 +92,8 @@ def delete_timetable_entry(entry_id):
         
         # Delete only if belongs to user
         response = db.client.table('timetable').delete().eq('id', entry_id).eq('user_id', user['id']).execute()
+        if response.data:
+            free_time_index.entry_deleted(user['id'], entry_id)
         
         return jsonify({
             'success': True,
@@ -95,4 +102,42 @@ def delete_timetable_entry(entry_id):
         
     except Exception as e:
         print(f"Timetable delete error: {str(e)}")
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+
+@timetable_bp.route('/free', methods=['GET'])
+def get_free_time():
+    """
+    Free study slots around the user's classes
+    
+    Query: email, date (YYYY-MM-DD, default today), days (default 7, max 31)
+    
+    Returns:
+        { days: [{ date, weekday, free_minutes, slots: [{ start, end,
+        minutes }] }], total_free_minutes }
+    """
+    try:
+        user_email = request.args.get('email')
+        if not user_email:
+            return jsonify({'error': 'Email parameter required'}), 400
+        
+        user = db.get_user_by_email(user_email)
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        try:
+            start = date.fromisoformat(request.args.get('date') or date.today().isoformat())
+            days = min(max(int(request.args.get('days', 7)), 1), 31)
+        except ValueError:
+            return jsonify({'error': 'date must be YYYY-MM-DD and days a number'}), 400
+        
+        free_days = free_time_index.free_slots(user['id'], start, days)
+        
+        return jsonify({
+            'days': free_days,
+            'total_free_minutes': sum(d['free_minutes'] for d in free_days)
+        }), 200
+        
+    except Exception as e:
+        print(f"Free time error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
@@ -3,8 +3,11 @@ from werkzeug.utils import secure_filename
 import os
 from database import db
 from services import pdf_processor, ai_service
+from services.topic_dedup import topic_dedup
 from utils import validators
+from utils.deadline import Deadline, bind as bind_deadline
 from config import Config
+from utils.response_cache import response_cache
 
 upload_bp = Blueprint('upload', __name__)
 
@@ -59,6 +62,9 @@ def upload_syllabus_get():
 def upload_syllabus():
     """Upload and process syllabus PDF"""
     try:
+        # One time budget for PDF, AI and database stages
+        deadline = bind_deadline(Deadline(Config.REQUEST_DEADLINE))
+        
         # Validate request
         if 'file' not in request.files:
             return jsonify({'error': 'No file provided. Include PDF file in request.'}), 400
@@ -85,6 +91,11 @@ def upload_syllabus():
         
         ai_mode = request.form.get('ai_mode', 'free')
         
+        # Load the model while the PDF is parsed, in case it went idle
+        if ai_mode == 'ollama':
+            from services.ollama_service import ollama_service
+            ollama_service.warm_up_async()
+        
         # Create or get user
         user = db.get_user_by_email(user_email)
         if not user:
@@ -100,7 +111,10 @@ def upload_syllabus():
         
         # Extract text
         try:
-            extracted_text = pdf_processor.extract_text(filepath)
+            extracted_text = pdf_processor.extract_text(
+                filepath,
+                deadline=deadline.reserve(Config.AI_MIN_SECONDS + Config.DEADLINE_DB_RESERVE)
+            )
             cleaned_text = pdf_processor.clean_text(extracted_text)
             
             # Safety check: ensure we extracted meaningful text
@@ -128,7 +142,13 @@ def upload_syllabus():
             return jsonify({'error': 'Failed to save upload'}), 500
         
         # Extract topics using AI with mode support
-        ai_topics, mode_used = ai_service.extract_topics_with_ai(cleaned_text, mode=ai_mode)
+        hedge = request.form.get('hedge')
+        ai_topics, mode_used = ai_service.extract_topics_with_ai(
+            cleaned_text,
+            mode=ai_mode,
+            hedge=(hedge == 'true') if hedge is not None else None,
+            deadline=deadline.reserve(Config.DEADLINE_DB_RESERVE)
+        )
         
         # Fallback to rule-based if AI fails
         if not ai_topics:
@@ -144,6 +164,32 @@ def upload_syllabus():
             ]
             mode_used = 'free'
         
+        # Merge near-duplicates within this extraction
+        ai_topics = topic_dedup.dedupe_topics(ai_topics)
+        
+        # Re-uploads: skip topics the user already has for this subject,
+        # only when asked to (merge_existing=true)
+        merged_topics = []
+        if request.form.get('merge_existing', 'false').lower() == 'true':
+            existing = db.get_user_topics_by_subject(user['id'], subject, exclude_upload_id=upload_record['id'])
+            if existing:
+                matches = topic_dedup.match_existing(
+                    [t['name'] for t in ai_topics],
+                    [t['topic_name'] for t in existing]
+                )
+                kept = []
+                for i, topic in enumerate(ai_topics):
+                    match = matches[i]
+                    if match is None:
+                        kept.append(topic)
+                        continue
+                    merged_topics.append({
+                        'name': topic['name'],
+                        'existing_topic_id': existing[match]['id'],
+                        'existing_upload_id': existing[match]['upload_id']
+                    })
+                ai_topics = kept
+        
         # Save topics to database
         topics_data = [
             {
@@ -157,7 +203,7 @@ def upload_syllabus():
             for i, topic in enumerate(ai_topics)
         ]
         
-        created_topics = db.create_topics_bulk(topics_data)
+        created_topics = db.create_topics_bulk(topics_data, deadline=deadline) if topics_data else []
         
         # Cleanup
         os.remove(filepath)
@@ -170,11 +216,14 @@ def upload_syllabus():
             'topics_count': len(created_topics),
             'topics': created_topics,
             'ai_used': mode_used,
+            'merged_topics': merged_topics,
             'message': f'Syllabus processed successfully using {mode_used} mode'
         }
         
         # Add warning if very few topics extracted
-        if len(created_topics) == 0:
+        if len(created_topics) == 0 and merged_topics:
+            response_data['warning'] = f'All {len(merged_topics)} topics already exist in your earlier {subject} uploads.'
+        elif len(created_topics) == 0:
             response_data['warning'] = 'No topics extracted. The PDF may not contain a clear syllabus structure.'
         elif len(created_topics) < 3:
             response_data['warning'] = f'Only {len(created_topics)} topic(s) extracted. Consider checking the PDF format.'
@@ -252,6 +301,7 @@ def upload_pyq():
 
 
 @upload_bp.route('/uploads/<user_email>', methods=['GET'])
+@response_cache.cached
 def get_user_uploads(user_email):
     """Get all uploads for a user"""
     try:
@@ -1,5 +1,6 @@
 from .pdf_processor import pdf_processor
 from .ai_service import ai_service
+from .async_ai_service import async_ai_service
 from .plan_generator import plan_generator
 
-__all__ = ['pdf_processor', 'ai_service', 'plan_generator']
\ No newline at end of file
+__all__ = ['pdf_processor', 'ai_service', 'async_ai_service', 'plan_generator']
\ No newline at end of file
@@ -1,7 +1,118 @@
 from openai import OpenAI
 from config import Config
-from typing import List, Dict
-import json
+from typing import Callable, List, Dict, Optional, Union
+import random
+from utils.json_stream import parse_model_output
+from utils import metrics
+from utils.deadline import Deadline, budget, out_of_time
+
+TOPIC_SYSTEM_PROMPT = "You are an academic curriculum analyzer. Return only valid JSON."
+QUIZ_SYSTEM_PROMPT = "You are a quiz generator. Return only valid JSON arrays."
+
+# Syllabus characters sent to the model per extraction call
+PROMPT_TEXT_LIMIT = 3000
+
+
+def build_topic_prompt(syllabus_text: str) -> str:
+    """Prompt asking the model for a JSON array of topics"""
+    return f"""
+Extract academic topics from this syllabus. For each topic, provide:
+1. Topic name (concise)
+2. Brief description (1-2 sentences)  
+3. Difficulty level (easy/medium/hard)
+4. Estimated study hours (realistic number)
+
+Return ONLY a valid JSON array of objects with keys: name, description, difficulty, hours
+
+Syllabus text:
+{syllabus_text[:PROMPT_TEXT_LIMIT]}
+
+Return JSON array only, no other text.
+"""
+
+
+def split_syllabus(syllabus_text: str, max_chunks: int) -> List[str]:
+    """Split text into prompt-sized chunks at whitespace, at most max_chunks"""
+    chunks = []
+    start = 0
+    while start < len(syllabus_text) and len(chunks) < max_chunks:
+        end = start + PROMPT_TEXT_LIMIT
+        if end < len(syllabus_text):
+            space = syllabus_text.rfind(' ', start, end)
+            end = space if space > start else end
+        chunks.append(syllabus_text[start:end].strip())
+        start = end
+    return [c for c in chunks if c]
+
+
+def build_quiz_prompt(topic_name: str, topic_description: str, num_questions: int) -> str:
+    """Prompt asking the model for a JSON array of MCQs"""
+    return f"""
+Generate {num_questions} multiple-choice quiz questions for this topic:
+
+Topic: {topic_name}
+Description: {topic_description}
+
+For each question, provide:
+- question (clear and specific)
+- options (array of 4 choices)
+- correct (index 0-3 of correct answer)
+- explanation (why the answer is correct)
+
+Return ONLY valid JSON array. Example format:
+[{{"question": "...", "options": ["A", "B", "C", "D"], "correct": 0, "explanation": "..."}}]
+"""
+
+
+def validate_topic(topic: Dict) -> Optional[Dict]:
+    """Check one model topic against the schema; None if unusable"""
+    if not isinstance(topic, dict):
+        return None
+    name = topic.get('name')
+    if not isinstance(name, str) or not name.strip():
+        return None
+    
+    difficulty = str(topic.get('difficulty') or 'medium').lower()
+    if difficulty not in ('easy', 'medium', 'hard'):
+        difficulty = 'medium'
+    try:
+        hours = float(topic.get('hours', 5))
+    except (TypeError, ValueError):
+        hours = 5.0
+    
+    return {
+        'name': name.strip(),
+        'description': str(topic.get('description') or ''),
+        'difficulty': difficulty,
+        'hours': hours
+    }
+
+
+def validate_question(question: Dict) -> Optional[Dict]:
+    """Check one model MCQ against the schema; None if unusable"""
+    if not isinstance(question, dict):
+        return None
+    if not all(k in question for k in ['question', 'options', 'correct']):
+        return None
+    
+    options = question['options']
+    if not isinstance(options, list) or len(options) < 2:
+        return None
+    options = [str(o) for o in options[:4]]
+    try:
+        correct = int(question['correct'])
+    except (TypeError, ValueError):
+        return None
+    if not 0 <= correct < len(options):
+        return None
+    
+    return {
+        'question': str(question['question']),
+        'options': options,
+        'correct': correct,
+        'explanation': str(question.get('explanation') or '')
+    }
+
 
 class AIService:
     """Multi-mode AI integration: Free (rule-based), Ollama (local), Cloud (OpenAI)"""
@@ -12,7 +123,7 @@ class AIService:
         except:
             self.client = None
     
-    def extract_topics_with_ai(self, syllabus_text: str, max_topics: int = 15, mode: str = 'cloud') -> tuple[List[Dict], str]:
+    def extract_topics_with_ai(self, syllabus_text: str, max_topics: int = 15, mode: str = 'cloud', hedge: bool = None, deadline: Deadline = None) -> tuple[List[Dict], str]:
         """
         Use AI to extract structured topics from syllabus
         Returns: (topics_list, ai_mode_used)
@@ -21,176 +132,186 @@ class AIService:
         - 'cloud': Use OpenAI GPT (if configured)
         - 'ollama': Use local Ollama (if available)
         - 'free': Use rule-based (fallback)
+        
+        With hedge (default: Config.AI_HEDGE_ENABLED) cloud and Ollama are
+        raced instead of tried one after another. Syllabi longer than one
+        prompt are extracted chunk by chunk when Config.AI_EXTRACT_CHUNKS > 1.
+        
+        With a deadline, model calls are timed to the time left and
+        skipped for free mode when less than Config.AI_MIN_SECONDS remain.
         """
+        if mode != 'free' and out_of_time(deadline, Config.AI_MIN_SECONDS):
+            print(f"Skipping {mode} topic extraction: {deadline.remaining():.1f}s left")
+            mode = 'free'
+        
+        if mode != 'free' and (Config.AI_HEDGE_ENABLED if hedge is None else hedge):
+            from services.async_ai_service import async_ai_service
+            topics, winner, _ = async_ai_service.hedged_extract_topics_sync(syllabus_text, max_topics, mode, deadline=deadline)
+            return topics, winner
+        
+        if mode != 'free' and Config.AI_EXTRACT_CHUNKS > 1 and len(syllabus_text) > PROMPT_TEXT_LIMIT:
+            from services.async_ai_service import async_ai_service
+            return async_ai_service.extract_topics_chunked_sync(syllabus_text, max_topics, mode, deadline=deadline)
+        
         # Cloud mode (OpenAI)
         if mode == 'cloud' and self.client:
             try:
-                return self._extract_with_openai(syllabus_text, max_topics), 'cloud'
+                return self._extract_with_openai(syllabus_text, max_topics, deadline), 'cloud'
             except Exception as e:
+                metrics.AI_FALLBACKS.labels('cloud', 'topics').inc()
                 print(f"OpenAI failed: {str(e)}, falling back...")
         
         # Ollama mode
         if mode == 'ollama':
             try:
                 from services.ollama_service import ollama_service
-                if ollama_service.is_available():
-                    topics = ollama_service.extract_topics_with_ollama(syllabus_text, max_topics)
+                if ollama_service.is_available(timeout=budget(deadline, 2)):
+                    topics = ollama_service.extract_topics_with_ollama(syllabus_text, max_topics, deadline)
                     if topics:
                         return topics, 'ollama'
                 print("Ollama not available, falling back...")
             except Exception as e:
                 print(f"Ollama failed: {str(e)}, falling back...")
+            metrics.AI_FALLBACKS.labels('ollama', 'topics').inc()
         
         # Free mode (rule-based) - always works as fallback
         return self._extract_rule_based(syllabus_text, max_topics), 'free'
     
-    def _extract_with_openai(self, syllabus_text: str, max_topics: int) -> List[Dict]:
+    def _openai(self, deadline: Deadline = None) -> OpenAI:
+        """Client whose timeout fits the request deadline (no retries past it)"""
+        if deadline is None:
+            return self.client
+        return self.client.with_options(timeout=deadline.timeout(60), max_retries=0)
+    
+    def _extract_with_openai(self, syllabus_text: str, max_topics: int, deadline: Deadline = None) -> List[Dict]:
         """Extract topics using OpenAI"""
-        prompt = f"""
-Extract academic topics from this syllabus. For each topic, provide:
-1. Topic name (concise)
-2. Brief description (1-2 sentences)  
-3. Difficulty level (easy/medium/hard)
-4. Estimated study hours (realistic number)
-
-Return ONLY a valid JSON array of objects with keys: name, description, difficulty, hours
-
-Syllabus text:
-{syllabus_text[:3000]}
-
-Return JSON array only, no other text.
-"""
-        
-        response = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are an academic curriculum analyzer. Return only valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=1500
-        )
-        
-        content = response.choices[0].message.content.strip()
-        
-        # Parse JSON response
-        topics = json.loads(content)
-        
-        # Validate and clean
-        validated = []
-        for i, topic in enumerate(topics[:max_topics]):
-            validated.append({
-                'name': topic.get('name', f'Topic {i+1}'),
-                'description': topic.get('description', ''),
-                'difficulty': topic.get('difficulty', 'medium').lower(),
-                'hours': float(topic.get('hours', 5))
-            })
-        
-        return validated
+        with metrics.ai_call('cloud', 'topics'):
+            response = self._openai(deadline).chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[
+                    {"role": "system", "content": TOPIC_SYSTEM_PROMPT},
+                    {"role": "user", "content": build_topic_prompt(syllabus_text)}
+                ],
+                temperature=0.3,
+                max_tokens=1500
+            )
+            if response.usage:
+                metrics.record_tokens('cloud', response.usage.prompt_tokens, response.usage.completion_tokens)
+            
+            content = response.choices[0].message.content.strip()
+            
+            # Keep every valid topic even if the tail of the output is broken
+            topics = parse_model_output(content, validate_topic, 'cloud', limit=max_topics)
+            if not topics:
+                raise ValueError("No valid topics in OpenAI response")
+            return topics
     
     def _extract_rule_based(self, syllabus_text: str, max_topics: int) -> List[Dict]:
         """Extract topics using simple rules (free mode)"""
         from services.pdf_processor import pdf_processor
+        from services.topic_estimator import topic_estimator
         
-        # Use existing rule-based extraction
-        topic_names = pdf_processor.extract_topics_simple(syllabus_text)
-        
-        # Convert to structured format
-        topics = []
-        for i, name in enumerate(topic_names[:max_topics]):
-            # Simple difficulty heuristic
-            difficulty = 'easy'
-            if any(word in name.lower() for word in ['advanced', 'complex', 'deep']):
-                difficulty = 'hard'
-            elif any(word in name.lower() for word in ['intermediate', 'application']):
-                difficulty = 'medium'
+        with metrics.ai_call('free', 'topics'):
+            # Use existing rule-based extraction
+            topic_names = pdf_processor.extract_topics_simple(syllabus_text)[:max_topics]
             
-            topics.append({
+            # Difficulty and hours from each topic's span of the syllabus
+            estimates = topic_estimator.estimate(syllabus_text, topic_names)
+        
+        return [
+            {
                 'name': name,
                 'description': '',
-                'difficulty': difficulty,
-                'hours': 5
-            })
-        
-        return topics
+                'difficulty': estimate['difficulty'],
+                'hours': estimate['hours']
+            }
+            for name, estimate in zip(topic_names, estimates)
+        ]
     
-    def generate_quiz_questions(self, topic_name: str, topic_description: str, num_questions: int = 5, mode: str = 'cloud') -> tuple[List[Dict], str]:
+    def generate_quiz_questions(self, topic_name: str, topic_description: str, num_questions: int = 5, mode: str = 'cloud', hedge: bool = None, source_text: Union[str, Callable[[], str]] = '', deadline: Deadline = None) -> tuple[List[Dict], str]:
         """
         Generate quiz questions for a topic
         Returns: (questions_list, ai_mode_used)
         
         Modes: 'cloud', 'ollama', 'free'
+        hedge: race cloud and Ollama (default: Config.AI_HEDGE_ENABLED)
+        source_text: upload text the free mode builds questions from, or a
+            function loading it (only called if free mode runs)
+        deadline: request deadline; free mode when too little time is left
         """
+        if mode != 'free' and out_of_time(deadline, Config.AI_MIN_SECONDS):
+            print(f"Skipping {mode} quiz generation: {deadline.remaining():.1f}s left")
+            mode = 'free'
+        
+        if mode != 'free' and (Config.AI_HEDGE_ENABLED if hedge is None else hedge):
+            from services.async_ai_service import async_ai_service
+            questions, winner, _ = async_ai_service.hedged_generate_quiz_sync(
+                topic_name, topic_description, num_questions, mode, source_text=source_text, deadline=deadline
+            )
+            return questions, winner
+        
         # Cloud mode (OpenAI)
         if mode == 'cloud' and self.client:
             try:
-                return self._generate_with_openai(topic_name, topic_description, num_questions), 'cloud'
+                return self._generate_with_openai(topic_name, topic_description, num_questions, deadline), 'cloud'
             except Exception as e:
+                metrics.AI_FALLBACKS.labels('cloud', 'questions').inc()
                 print(f"OpenAI quiz generation failed: {str(e)}, falling back...")
         
         # Ollama mode
         if mode == 'ollama':
             try:
                 from services.ollama_service import ollama_service
-                if ollama_service.is_available():
-                    questions = ollama_service.generate_quiz_questions(topic_name, topic_description, num_questions)
+                if ollama_service.is_available(timeout=budget(deadline, 2)):
+                    questions = ollama_service.generate_quiz_questions(topic_name, topic_description, num_questions, deadline)
                     if questions:
                         return questions, 'ollama'
                 print("Ollama not available, falling back...")
             except Exception as e:
                 print(f"Ollama quiz generation failed: {str(e)}, falling back...")
+            metrics.AI_FALLBACKS.labels('ollama', 'questions').inc()
         
         # Free mode (rule-based) - simple fallback
-        return self._generate_rule_based(topic_name, num_questions), 'free'
+        return self._generate_rule_based(topic_name, num_questions, source_text), 'free'
     
-    def _generate_with_openai(self, topic_name: str, topic_description: str, num_questions: int) -> List[Dict]:
+    def _generate_with_openai(self, topic_name: str, topic_description: str, num_questions: int, deadline: Deadline = None) -> List[Dict]:
         """Generate quiz using OpenAI"""
-        prompt = f"""
-Generate {num_questions} multiple-choice quiz questions for this topic:
-
-Topic: {topic_name}
-Description: {topic_description}
-
-For each question, provide:
-- question (clear and specific)
-- options (array of 4 choices)
-- correct (index 0-3 of correct answer)
-- explanation (why the answer is correct)
-
-Return ONLY valid JSON array. Example format:
-[{{"question": "...", "options": ["A", "B", "C", "D"], "correct": 0, "explanation": "..."}}]
-"""
-        
-        response = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a quiz generator. Return only valid JSON arrays."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=1500
-        )
-        
-        content = response.choices[0].message.content.strip()
-        questions = json.loads(content)
+        with metrics.ai_call('cloud', 'questions'):
+            response = self._openai(deadline).chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[
+                    {"role": "system", "content": QUIZ_SYSTEM_PROMPT},
+                    {"role": "user", "content": build_quiz_prompt(topic_name, topic_description, num_questions)}
+                ],
+                temperature=0.7,
+                max_tokens=1500
+            )
+            if response.usage:
+                metrics.record_tokens('cloud', response.usage.prompt_tokens, response.usage.completion_tokens)
+            
+            content = response.choices[0].message.content.strip()
+            
+            # Keep every valid question even if the tail of the output is broken
+            questions = parse_model_output(content, validate_question, 'cloud', limit=num_questions)
+            if not questions:
+                raise ValueError("No valid questions in OpenAI response")
+            return questions
+    
+    def _generate_rule_based(self, topic_name: str, num_questions: int, source_text: Union[str, Callable[[], str]] = '') -> List[Dict]:
+        """
+        Generate rule-based quiz questions (free mode)
         
-        # Validate structure
-        validated = []
-        for q in questions:
-            if all(k in q for k in ['question', 'options', 'correct']):
-                validated.append({
-                    'question': q['question'],
-                    'options': q['options'][:4],
-                    'correct': int(q['correct']),
-                    'explanation': q.get('explanation', '')
-                })
+        Cloze and definition questions come from the upload text via the
+        offline quiz engine; fixed templates only top up a thin text.
+        """
+        from services.quiz_generator import quiz_generator
         
-        return validated[:num_questions]
-    
-    def _generate_rule_based(self, topic_name: str, num_questions: int) -> List[Dict]:
-        """Generate simple rule-based quiz questions (free mode)"""
-        # Very basic quiz generation - better than nothing
-        questions = []
+        if callable(source_text):
+            source_text = source_text()
+        with metrics.ai_call('free', 'questions'):
+            questions = quiz_generator.generate(source_text, topic_name, num_questions) if source_text else []
+        if len(questions) >= num_questions:
+            return questions
         
         # Template-based questions
         templates = [
@@ -229,8 +350,12 @@ Return ONLY valid JSON array. Example format:
             }
         ]
         
-        for i in range(min(num_questions, len(templates))):
-            questions.append(templates[i])
+        for template in templates[:num_questions - len(questions)]:
+            # Shuffle so the answer is not always the first option
+            answer = template['options'][template['correct']]
+            random.shuffle(template['options'])
+            template['correct'] = template['options'].index(answer)
+            questions.append(template)
         
         return questions
     
@@ -0,0 +1,99 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from utils import metrics
+
+
+def key_of(questions: List[Dict]) -> List[int]:
+    """Correct option index of every question (-1 when a question has none)"""
+    return [int(q['correct']) if isinstance(q.get('correct'), (int, float)) else -1 for q in questions]
+
+
+def answer_array(answers: Union[List, Dict, None], total: int) -> np.ndarray:
+    """
+    Submitted answers as one index per question, -1 when unanswered
+
+    Accepts a list (answers[i] is question i) or an object keyed by
+    question index, which is what the quiz page sends.
+    """
+    given = np.full(total, -1, dtype=np.int16)
+    if isinstance(answers, dict):
+        items = answers.items()
+    else:
+        items = enumerate(answers or [])
+    for index, answer in items:
+        try:
+            index, answer = int(index), int(answer)
+        except (TypeError, ValueError):
+            continue
+        if 0 <= index < total:
+            given[index] = answer
+    return given
+
+
+class AnswerKey:
+    __slots__ = ('topic_id', 'correct', 'question_ids')
+
+    def __init__(self, topic_id, correct: List[int], question_ids: Optional[List[str]] = None):
+        self.topic_id = topic_id
+        self.correct = np.asarray(correct, dtype=np.int16)
+        self.question_ids = question_ids or []
+
+    def score(self, answers: np.ndarray) -> np.ndarray:
+        """Boolean mask of correctly answered questions"""
+        return (answers == self.correct) & (self.correct >= 0)
+
+
+class AnswerKeyCache:
+    """
+    Correct answers of recent quizzes, by quiz id.
+
+    A quiz's key never changes once it is created, so entries need no
+    expiry: keys are stored when a quiz is generated and loaded on the
+    first submit otherwise (from quizzes.answer_key, which is only the
+    indices, not the question text). Each key is a small int16 array,
+    so a worker holds tens of thousands of them cheaply.
+    """
+
+    def __init__(self, max_quizzes: int = 20000):
+        self._keys: "OrderedDict[str, AnswerKey]" = OrderedDict()
+        self._max_quizzes = max_quizzes
+        self._lock = threading.Lock()
+
+    def _put(self, quiz_id, key: AnswerKey):
+        with self._lock:
+            self._keys[str(quiz_id)] = key
+            self._keys.move_to_end(str(quiz_id))
+            while len(self._keys) > self._max_quizzes:
+                self._keys.popitem(last=False)
+
+    def remember(self, quiz: Optional[Dict]):
+        """Cache the key of a freshly created quiz row"""
+        if quiz and quiz.get('id'):
+            correct = quiz.get('answer_key') or key_of(quiz.get('questions') or [])
+            self._put(quiz['id'], AnswerKey(quiz.get('topic_id'), correct, quiz.get('question_ids')))
+
+    def get(self, quiz_id) -> Optional[AnswerKey]:
+        """The quiz's answer key, None if the quiz does not exist"""
+        with self._lock:
+            key = self._keys.get(str(quiz_id))
+            if key:
+                self._keys.move_to_end(str(quiz_id))
+                metrics.CACHE_LOOKUPS.labels('answer_key', 'hit').inc()
+                return key
+
+        metrics.CACHE_LOOKUPS.labels('answer_key', 'miss').inc()
+        from database import db
+        row = db.get_answer_key(quiz_id)
+        if not row:
+            return None
+        key = AnswerKey(row.get('topic_id'), row['answer_key'], row.get('question_ids'))
+        self._put(quiz_id, key)
+        return key
+
+
+# Global instance
+answer_keys = AnswerKeyCache()
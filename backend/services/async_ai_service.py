@@ -0,0 +1,379 @@
+import asyncio
+import json
+import time
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, List, Dict, Optional, Union
+
+import httpx
+from openai import AsyncOpenAI
+
+from config import Config
+from services.ai_service import (
+    ai_service, TOPIC_SYSTEM_PROMPT, QUIZ_SYSTEM_PROMPT,
+    build_topic_prompt, build_quiz_prompt, validate_topic, validate_question,
+    split_syllabus
+)
+from services.ollama_service import OLLAMA_BASE_URL, OLLAMA_MODEL, ollama_service
+from services.topic_dedup import topic_dedup
+from utils.async_loop import background_loop
+from utils.json_stream import JSONArrayStream, parse_stats
+from utils import metrics
+from utils.deadline import Deadline, DeadlineExceeded, budget, out_of_time
+
+
+class AsyncAIService:
+    """
+    Asyncio counterpart of AIService for fan-out over many topics.
+
+    Uses AsyncOpenAI and an httpx.AsyncClient for Ollama. Calls are
+    bounded by Config.AI_MAX_CONCURRENCY so a large batch does not open
+    unbounded connections. Sync callers use the *_sync wrappers, which
+    run on the shared background loop.
+    """
+
+    def __init__(self):
+        self._openai: Optional[AsyncOpenAI] = None
+        self._http: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.hedge_stats = {
+            'calls': 0,
+            'wins': {'cloud': 0, 'ollama': 0, 'free': 0},
+            'latency_saved': 0.0
+        }
+
+    # Clients are created lazily so they bind to the background loop
+    def _openai_client(self) -> Optional[AsyncOpenAI]:
+        if self._openai is None and Config.OPENAI_API_KEY:
+            try:
+                self._openai = AsyncOpenAI(api_key=Config.OPENAI_API_KEY)
+            except Exception:
+                self._openai = None
+        return self._openai
+
+    def _http_client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(base_url=OLLAMA_BASE_URL)
+        return self._http
+
+    def _limiter(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(Config.AI_MAX_CONCURRENCY)
+        return self._semaphore
+
+    # Backends (streamed, so parsing starts with the first tokens)
+    async def _chat(self, system_prompt: str, prompt: str, temperature: float) -> AsyncIterator[str]:
+        """Stream one OpenAI chat completion as text chunks"""
+        async with self._limiter():
+            stream = await self._openai_client().chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=temperature,
+                max_tokens=1500,
+                stream=True
+            )
+            # Streamed chunks carry about one token each (no usage block in streams)
+            completion_tokens = 0
+            try:
+                async with stream:
+                    async for chunk in stream:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            completion_tokens += 1
+                            yield chunk.choices[0].delta.content
+            finally:
+                metrics.record_tokens('cloud', completion_tokens=completion_tokens)
+
+    async def _ollama_available(self, timeout: float = 2) -> bool:
+        try:
+            response = await self._http_client().get('/api/tags', timeout=timeout)
+            return response.status_code == 200
+        except Exception:
+            return False
+
+    async def _ollama(self, system_prompt: str, prompt: str, temperature: float) -> AsyncIterator[str]:
+        """Stream one Ollama generation as text chunks"""
+        payload = {
+            "model": OLLAMA_MODEL,
+            "prompt": prompt,
+            "system": system_prompt,
+            "stream": True,
+            "keep_alive": Config.OLLAMA_KEEP_ALIVE,
+            "options": {"temperature": temperature}
+        }
+        async with self._limiter():
+            started = time.perf_counter()
+            async with self._http_client().stream('POST', '/api/generate', json=payload, timeout=60) as response:
+                if response.status_code != 200:
+                    raise Exception(f"Ollama error: {response.status_code}")
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    if data.get('done'):
+                        # Final line carries load/total durations and token counts
+                        ollama_service.latency.record(data, time.perf_counter() - started)
+                        metrics.record_tokens('ollama', data.get('prompt_eval_count'), data.get('eval_count'))
+                    yield data.get('response', '')
+
+    async def _backend_result(self, backend: str, kind: str, args: tuple, deadline: Optional[Deadline] = None) -> List[Dict]:
+        """
+        Run one model backend and return its validated items.
+
+        Output is parsed while it streams; generation stops as soon as
+        enough valid items have arrived, and a broken tail only loses
+        the objects it contains.
+
+        Raises if the backend is unavailable, errors out or returns
+        nothing that passes validation, so callers can treat any
+        exception as "try something else". With a deadline the call is
+        not started when too little time is left, and is cut off when
+        the time runs out (keeping any items already parsed).
+        """
+        if kind == 'topics':
+            syllabus_text, limit = args
+            system_prompt, prompt, temperature = TOPIC_SYSTEM_PROMPT, build_topic_prompt(syllabus_text), 0.3
+            parser = JSONArrayStream(validate_topic)
+        else:
+            topic_name, topic_description, limit = args
+            system_prompt, prompt, temperature = QUIZ_SYSTEM_PROMPT, build_quiz_prompt(topic_name, topic_description, limit), 0.7
+            parser = JSONArrayStream(validate_question)
+
+        if out_of_time(deadline, Config.AI_MIN_SECONDS):
+            raise DeadlineExceeded(f"{deadline.remaining():.1f}s left, skipping {backend}")
+
+        with metrics.ai_call(backend, kind):
+            if backend == 'cloud':
+                if not self._openai_client():
+                    raise RuntimeError("OpenAI is not configured")
+                chunks = self._chat(system_prompt, prompt, temperature)
+            else:
+                if not await self._ollama_available(budget(deadline, 2)):
+                    raise RuntimeError("Ollama not available")
+                chunks = self._ollama(system_prompt, prompt, temperature)
+
+            async def consume():
+                async with aclosing(chunks):
+                    async for chunk in chunks:
+                        parser.feed(chunk)
+                        if len(parser.items) >= limit:
+                            # Enough valid items: stop paying for more tokens
+                            parser.close()
+                        if parser.closed:
+                            break
+
+            try:
+                await asyncio.wait_for(consume(), deadline.remaining() if deadline else None)
+            except Exception as e:
+                if not parser.items:
+                    raise
+                print(f"{backend} stream broke after {len(parser.items)} {kind}: {str(e) or type(e).__name__}")
+            finally:
+                parse_stats.record(backend, parser)
+
+            if not parser.items:
+                raise ValueError(f"{backend} returned no valid {kind}")
+            return parser.items[:limit]
+
+    @staticmethod
+    def _free_result(kind: str, args: tuple, source_text: Union[str, Callable[[], str]] = '') -> List[Dict]:
+        """Rule-based result, always available and instant"""
+        if kind == 'topics':
+            syllabus_text, max_topics = args
+            return ai_service._extract_rule_based(syllabus_text, max_topics)
+        topic_name, _, num_questions = args
+        return ai_service._generate_rule_based(topic_name, num_questions, source_text)
+
+    async def _sequential(self, kind: str, args: tuple, mode: str, source_text: Union[str, Callable[[], str]] = '', deadline: Optional[Deadline] = None) -> tuple[List[Dict], str]:
+        """Same fallback chain as AIService: requested backend, then free"""
+        if mode in ('cloud', 'ollama'):
+            try:
+                return await self._backend_result(mode, kind, args, deadline), mode
+            except Exception as e:
+                metrics.AI_FALLBACKS.labels(mode, kind).inc()
+                print(f"{mode} {kind} generation failed: {str(e)}, falling back...")
+
+        return self._free_result(kind, args, source_text), 'free'
+
+    async def _hedged(self, kind: str, args: tuple, mode: str, delay: Optional[float] = None, source_text: Union[str, Callable[[], str]] = '', deadline: Optional[Deadline] = None) -> tuple[List[Dict], str, Dict]:
+        """
+        Race the requested backend against the other one.
+
+        The secondary backend starts after `delay` seconds (0 = at once)
+        or as soon as the primary fails. The first valid result wins and
+        the other call is cancelled. The free-mode result is returned if
+        every backend fails or the hedge budget (Config.AI_HEDGE_TIMEOUT,
+        or less if the deadline is sooner) runs out.
+
+        Returns:
+            (items, winner, report) where report has the winner, the
+            elapsed latency and a lower bound on the latency saved
+            compared to trying the backends one after another.
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        delay = Config.AI_HEDGE_DELAY if delay is None else max(0.0, float(delay))
+        hedge_budget = budget(deadline, Config.AI_HEDGE_TIMEOUT)
+
+        primary = mode if mode in ('cloud', 'ollama') else 'cloud'
+        secondary = 'ollama' if primary == 'cloud' else 'cloud'
+        if secondary == 'cloud' and not self._openai_client():
+            secondary = None
+
+        tasks = {asyncio.ensure_future(self._backend_result(primary, kind, args, deadline)): primary}
+        ended = {}
+        secondary_start = None
+        winner, items = 'free', None
+
+        try:
+            while tasks and winner == 'free':
+                elapsed = loop.time() - started
+                remaining = hedge_budget - elapsed
+                if remaining <= 0:
+                    break
+
+                wait_for = remaining
+                if secondary and secondary_start is None:
+                    wait_for = min(remaining, max(0.0, delay - elapsed))
+
+                done, _ = await asyncio.wait(tasks, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    backend = tasks.pop(task)
+                    ended[backend] = loop.time() - started
+                    if task.exception() is None:
+                        winner, items = backend, task.result()
+                        break
+                    print(f"Hedged {backend} {kind} generation failed: {task.exception()}")
+
+                # Start the secondary once the delay passes or the primary is out
+                if winner == 'free' and secondary and secondary_start is None:
+                    if not tasks or loop.time() - started >= delay:
+                        secondary_start = loop.time() - started
+                        tasks[asyncio.ensure_future(self._backend_result(secondary, kind, args, deadline))] = secondary
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if winner == 'free':
+            items = self._free_result(kind, args, source_text)
+
+        elapsed = loop.time() - started
+        saved = 0.0
+        if secondary_start is not None and winner != primary:
+            # Sequentially, the secondary could only have started when the primary ended
+            saved = max(0.0, ended.get(primary, elapsed) - secondary_start)
+
+        report = {
+            'winner': winner,
+            'primary': primary,
+            'secondary': secondary,
+            'hedged': secondary_start is not None,
+            'latency': round(elapsed, 3),
+            'latency_saved': round(saved, 3)
+        }
+        self.hedge_stats['calls'] += 1
+        self.hedge_stats['wins'][winner] += 1
+        self.hedge_stats['latency_saved'] += saved
+        metrics.AI_HEDGE_WINS.labels(winner).inc()
+        print(f"Hedged {kind}: {winner} won in {report['latency']}s (saved {report['latency_saved']}s)")
+
+        return items, winner, report
+
+    # Topic extraction
+    async def extract_topics(self, syllabus_text: str, max_topics: int = 15, mode: str = 'cloud', deadline: Optional[Deadline] = None) -> tuple[List[Dict], str]:
+        """Async version of AIService.extract_topics_with_ai"""
+        return await self._sequential('topics', (syllabus_text, max_topics), mode, deadline=deadline)
+
+    async def hedged_extract_topics(self, syllabus_text: str, max_topics: int = 15, mode: str = 'cloud', delay: Optional[float] = None, deadline: Optional[Deadline] = None) -> tuple[List[Dict], str, Dict]:
+        """Topic extraction racing cloud and Ollama, see _hedged"""
+        return await self._hedged('topics', (syllabus_text, max_topics), mode, delay, deadline=deadline)
+
+    async def extract_topics_chunked(self, syllabus_text: str, max_topics: int = 15, mode: str = 'cloud', max_chunks: Optional[int] = None, deadline: Optional[Deadline] = None) -> tuple[List[Dict], str]:
+        """
+        Extract topics from every prompt-sized chunk of a long syllabus
+        concurrently, then merge near-duplicates found in several chunks.
+        """
+        chunks = split_syllabus(syllabus_text, max_chunks or Config.AI_EXTRACT_CHUNKS)
+        if len(chunks) <= 1 or mode not in ('cloud', 'ollama'):
+            return await self.extract_topics(syllabus_text, max_topics, mode, deadline)
+
+        # Each chunk gets a share of the topic budget, with slack for duplicates
+        per_chunk = max(3, -(-max_topics // len(chunks)) + 2)
+        results = await asyncio.gather(*[
+            self._backend_result(mode, 'topics', (chunk, per_chunk), deadline)
+            for chunk in chunks
+        ], return_exceptions=True)
+
+        topics = []
+        for i, result in enumerate(results):
+            if isinstance(result, BaseException):
+                print(f"{mode} topic extraction failed for chunk {i + 1}/{len(chunks)}: {str(result)}")
+                continue
+            topics.extend(result)
+
+        if not topics:
+            return self._free_result('topics', (syllabus_text, max_topics)), 'free'
+        return topic_dedup.dedupe_topics(topics)[:max_topics], mode
+
+    # Quiz generation
+    async def generate_quiz(self, topic_name: str, topic_description: str, num_questions: int = 5, mode: str = 'cloud', source_text: Union[str, Callable[[], str]] = '', deadline: Optional[Deadline] = None) -> tuple[List[Dict], str]:
+        """Async version of AIService.generate_quiz_questions"""
+        return await self._sequential('questions', (topic_name, topic_description, num_questions), mode, source_text, deadline)
+
+    async def hedged_generate_quiz(self, topic_name: str, topic_description: str, num_questions: int = 5, mode: str = 'cloud', delay: Optional[float] = None, source_text: Union[str, Callable[[], str]] = '', deadline: Optional[Deadline] = None) -> tuple[List[Dict], str, Dict]:
+        """Quiz generation racing cloud and Ollama, see _hedged"""
+        return await self._hedged('questions', (topic_name, topic_description, num_questions), mode, delay, source_text, deadline)
+
+    async def generate_quizzes(self, topics: List[Dict], num_questions: int = 5, mode: str = 'cloud', hedge: bool = False, source_texts: Optional[Callable[[str], str]] = None, deadline: Optional[Deadline] = None) -> List[tuple[List[Dict], str]]:
+        """
+        Generate quizzes for N topics concurrently.
+
+        Args:
+            topics: Topic rows with topic_name and description
+            num_questions: Questions per quiz
+            mode: AI mode, same as generate_quiz
+            hedge: Race backends per topic instead of falling back in turn
+            source_texts: function mapping upload_id -> extracted_text,
+                only called for topics that end up in free mode
+            deadline: request deadline; topics still generating when it
+                passes are answered from free mode
+
+        Returns:
+            One (questions, ai_mode_used) pair per topic, in input order.
+            A topic whose generation raised gets ([], 'error').
+        """
+        async def one(topic):
+            args = (topic['topic_name'], topic.get('description') or '', num_questions, mode)
+            source_text = (lambda: source_texts(topic.get('upload_id'))) if source_texts else ''
+            if hedge and mode != 'free':
+                questions, winner, _ = await self.hedged_generate_quiz(*args, source_text=source_text, deadline=deadline)
+                return questions, winner
+            return await self.generate_quiz(*args, source_text=source_text, deadline=deadline)
+
+        results = await asyncio.gather(*[one(t) for t in topics], return_exceptions=True)
+
+        return [
+            ([], 'error') if isinstance(result, BaseException) else result
+            for result in results
+        ]
+
+    # Sync entry points for Flask routes
+    def extract_topics_sync(self, syllabus_text: str, max_topics: int = 15, mode: str = 'cloud', deadline: Optional[Deadline] = None) -> tuple[List[Dict], str]:
+        return background_loop.run(self.extract_topics(syllabus_text, max_topics, mode, deadline))
+
+    def extract_topics_chunked_sync(self, syllabus_text: str, max_topics: int = 15, mode: str = 'cloud', max_chunks: Optional[int] = None, deadline: Optional[Deadline] = None) -> tuple[List[Dict], str]:
+        return background_loop.run(self.extract_topics_chunked(syllabus_text, max_topics, mode, max_chunks, deadline))
+
+    def hedged_extract_topics_sync(self, syllabus_text: str, max_topics: int = 15, mode: str = 'cloud', delay: Optional[float] = None, deadline: Optional[Deadline] = None) -> tuple[List[Dict], str, Dict]:
+        return background_loop.run(self.hedged_extract_topics(syllabus_text, max_topics, mode, delay, deadline))
+
+    def hedged_generate_quiz_sync(self, topic_name: str, topic_description: str, num_questions: int = 5, mode: str = 'cloud', delay: Optional[float] = None, source_text: Union[str, Callable[[], str]] = '', deadline: Optional[Deadline] = None) -> tuple[List[Dict], str, Dict]:
+        return background_loop.run(self.hedged_generate_quiz(topic_name, topic_description, num_questions, mode, delay, source_text, deadline))
+
+    def generate_quizzes_sync(self, topics: List[Dict], num_questions: int = 5, mode: str = 'cloud', hedge: bool = False, source_texts: Optional[Callable[[str], str]] = None, deadline: Optional[Deadline] = None) -> List[tuple[List[Dict], str]]:
+        return background_loop.run(self.generate_quizzes(topics, num_questions, mode, hedge, source_texts, deadline))
+
+
+# Global instance
+async_ai_service = AsyncAIService()
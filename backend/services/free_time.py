@@ -0,0 +1,200 @@
+import bisect
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import Config
+from utils import metrics
+
+# Cached indexes are reloaded after this many seconds, so edits made
+# through another gunicorn worker show up here too
+INDEX_TTL_SECONDS = 300
+
+
+def to_minutes(value: str) -> int:
+    """'HH:MM' or 'HH:MM:SS' as minutes after midnight"""
+    parts = str(value).split(':')
+    return int(parts[0]) * 60 + int(parts[1])
+
+
+def to_clock(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class WeekIndex:
+    """
+    Free study time of one user's week, by weekday (0 = Monday).
+
+    Each weekday keeps its timetable entries sorted by start time; the
+    merged busy intervals and the free slots inside the study window are
+    derived from them. Adding or removing an entry re-derives only that
+    weekday, so every lookup afterwards is a table read.
+    """
+
+    def __init__(self, entries: List[Dict], window_start: int, window_end: int, min_slot: int):
+        self.loaded_at = time.monotonic()
+        self.window_start = window_start
+        self.window_end = window_end
+        self.min_slot = min_slot
+        self.entries: List[list] = [[] for _ in range(7)]  # (start, end, id)
+        self.slots: List[list] = [[] for _ in range(7)]
+        self.free_minutes = [0] * 7
+        for entry in entries:
+            self._insert(entry)
+        for weekday in range(7):
+            self._derive(weekday)
+
+    def _insert(self, entry: Dict) -> Optional[int]:
+        weekday = int(entry['day_of_week'])
+        if not 0 <= weekday <= 6:
+            return None
+        start, end = to_minutes(entry['start_time']), to_minutes(entry['end_time'])
+        if end > start:
+            bisect.insort(self.entries[weekday], (start, end, str(entry.get('id'))))
+        return weekday
+
+    def _derive(self, weekday: int):
+        """Free slots of one weekday: the study window minus merged classes"""
+        slots = []
+        cursor = self.window_start
+        for start, end, _ in self.entries[weekday]:
+            if start > cursor:
+                slots.append((cursor, min(start, self.window_end)))
+            cursor = max(cursor, end)
+            if cursor >= self.window_end:
+                break
+        if cursor < self.window_end:
+            slots.append((cursor, self.window_end))
+        self.slots[weekday] = [(s, e) for s, e in slots if e - s >= self.min_slot]
+        self.free_minutes[weekday] = sum(e - s for s, e in self.slots[weekday])
+
+    def add(self, entry: Dict):
+        weekday = self._insert(entry)
+        if weekday is not None:
+            self._derive(weekday)
+
+    def remove(self, entry_id) -> bool:
+        entry_id = str(entry_id)
+        for weekday, entries in enumerate(self.entries):
+            for k, entry in enumerate(entries):
+                if entry[2] == entry_id:
+                    del entries[k]
+                    self._derive(weekday)
+                    return True
+        return False
+
+    @property
+    def empty(self) -> bool:
+        return not any(self.entries)
+
+
+class FreeTimeIndex:
+    """
+    Per-user free study time derived from the timetable.
+
+    Indexes are cached per worker (LRU) and kept current by the
+    timetable routes, which apply each added or deleted entry to the
+    cached index instead of dropping it.
+    """
+
+    def __init__(self, max_users: int = 1000):
+        self._indexes: "OrderedDict[str, WeekIndex]" = OrderedDict()
+        self._max_users = max_users
+        self._lock = threading.Lock()
+
+    def build(self, entries: List[Dict]) -> WeekIndex:
+        """An uncached index of the given timetable entries"""
+        return WeekIndex(
+            entries,
+            to_minutes(Config.STUDY_DAY_START),
+            to_minutes(Config.STUDY_DAY_END),
+            Config.MIN_FREE_SLOT
+        )
+
+    def index(self, user_id) -> WeekIndex:
+        with self._lock:
+            cached = self._indexes.get(user_id)
+            if cached and time.monotonic() - cached.loaded_at < INDEX_TTL_SECONDS:
+                self._indexes.move_to_end(user_id)
+                metrics.CACHE_LOOKUPS.labels('free_time', 'hit').inc()
+                return cached
+
+        metrics.CACHE_LOOKUPS.labels('free_time', 'miss').inc()
+        from database import db
+        week = self.build(db.get_timetable(user_id))
+
+        with self._lock:
+            self._indexes[user_id] = week
+            self._indexes.move_to_end(user_id)
+            while len(self._indexes) > self._max_users:
+                self._indexes.popitem(last=False)
+        return week
+
+    def entry_added(self, user_id, entry: Dict):
+        """Apply a new timetable entry to the cached index, if any"""
+        with self._lock:
+            cached = self._indexes.get(user_id)
+            if cached:
+                cached.add(entry)
+
+    def entry_deleted(self, user_id, entry_id):
+        """Drop a deleted timetable entry from the cached index, if any"""
+        with self._lock:
+            cached = self._indexes.get(user_id)
+            if cached:
+                cached.remove(entry_id)
+
+    def free_slots(self, user_id, day: date, days: int = 1) -> List[Dict]:
+        """
+        Free study slots for `days` dates from `day`
+
+        Returns:
+            [{ date, weekday, free_minutes, slots: [{ start, end, minutes }] }]
+        """
+        week = self.index(user_id)
+        result = []
+        for offset in range(days):
+            current = day + timedelta(days=offset)
+            weekday = current.weekday()
+            result.append({
+                'date': current.isoformat(),
+                'weekday': weekday,
+                'free_minutes': week.free_minutes[weekday],
+                'slots': [
+                    {'start': to_clock(s), 'end': to_clock(e), 'minutes': e - s}
+                    for s, e in week.slots[weekday]
+                ]
+            })
+        return result
+
+    def capacities(self, user_id, start_date: str, end_date: str, hours_per_day: float) -> Optional[np.ndarray]:
+        """
+        Study hours for each day of a plan window, reduced by class load
+
+        A weekday keeps hours_per_day in proportion to how much of the
+        study window is still free (and never more than its free time),
+        so a day half taken by classes gets half the hours. None when
+        the user has no timetable, meaning every day gets hours_per_day.
+        """
+        week = self.index(user_id)
+        if week.empty:
+            return None
+
+        window = max(week.window_end - week.window_start, 1)
+        free = np.array(week.free_minutes, dtype=float)
+        per_weekday = np.minimum(hours_per_day * free / window, free / 60)
+
+        start = date.fromisoformat(start_date)
+        total_days = (date.fromisoformat(end_date) - start).days + 1
+        if total_days <= 0:
+            return None
+        weekdays = (start.weekday() + np.arange(total_days)) % 7
+        return np.round(per_weekday[weekdays], 2)
+
+
+# Global instance
+free_time_index = FreeTimeIndex()
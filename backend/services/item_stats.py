@@ -0,0 +1,185 @@
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from utils import metrics
+
+# Cached topics are reloaded after this many seconds, so submits handled
+# by other gunicorn workers show up here too
+STATS_TTL_SECONDS = 300
+
+# Chance of answering correctly that quiz assembly aims for
+TARGET_SUCCESS = 0.7
+
+# Attempts before an item's discrimination is trusted
+MIN_ATTEMPTS = 10
+
+# How much a discriminating item is preferred over a closer-levelled one
+DISCRIMINATION_WEIGHT = 0.1
+
+# Random spread added to scores so equal items do not always win
+JITTER = 0.05
+
+
+def _logit(p):
+    return np.log(p / (1 - p))
+
+
+class TopicStats:
+    """
+    Running sums of every bank question of one topic, as parallel arrays.
+
+    Per question: attempts n, correct answers sx, and over its attempts
+    the rest-of-quiz score y (fraction of the other questions right):
+    sum y, sum y^2 and sum x*y. Difficulty (share correct) and
+    discrimination (point-biserial correlation of x with y) both follow
+    from these, and each submit only adds to them.
+    """
+
+    FIELDS = ('attempts', 'correct', 'rest_sum', 'rest_sq_sum', 'correct_rest_sum')
+
+    def __init__(self, rows: List[Dict]):
+        self.loaded_at = time.monotonic()
+        self.index = {str(row['question_id']): k for k, row in enumerate(rows)}
+        self.sums = np.array([[float(row.get(f) or 0) for f in self.FIELDS] for row in rows], dtype=float).reshape(-1, 5)
+
+    def add(self, question_ids: List[str], correct: np.ndarray, rest: np.ndarray):
+        new = [q for q in question_ids if q not in self.index]
+        if new:
+            for q in new:
+                self.index[q] = len(self.index)
+            self.sums = np.vstack([self.sums, np.zeros((len(new), 5))])
+        rows = np.fromiter((self.index[q] for q in question_ids), dtype=int, count=len(question_ids))
+        self.sums[rows] += np.column_stack([np.ones(len(rows)), correct, rest, rest * rest, correct * rest])
+
+    def lookup(self, question_ids: List[str]) -> np.ndarray:
+        """Sums of the given questions (zeros for ones never answered)"""
+        out = np.zeros((len(question_ids), 5))
+        for k, q in enumerate(question_ids):
+            row = self.index.get(q)
+            if row is not None:
+                out[k] = self.sums[row]
+        return out
+
+
+def difficulty(sums: np.ndarray) -> np.ndarray:
+    """Share answered correctly, shrunk towards 1/2 for rarely seen items"""
+    return (sums[:, 1] + 1) / (sums[:, 0] + 2)
+
+
+def discrimination(sums: np.ndarray) -> np.ndarray:
+    """Point-biserial correlation of correctness with the rest score (0 until MIN_ATTEMPTS)"""
+    n, sx, sy, syy, sxy = sums.T
+    cov = n * sxy - sx * sy
+    var = (n * sx - sx * sx) * (n * syy - sy * sy)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = np.where(var > 0, cov / np.sqrt(np.maximum(var, 1e-12)), 0.0)
+    return np.where(n >= MIN_ATTEMPTS, r, 0.0)
+
+
+class ItemStatsEngine:
+    """
+    Per-question difficulty and discrimination, updated on every submit.
+
+    item_stats rows hold the running sums (see TopicStats); submits add
+    to them atomically (SupabaseDB.bump_item_stats) and to this worker's
+    cached copy, so nothing ever rescans attempt history. Quiz assembly
+    uses the cached arrays to pick the questions a learner is most
+    likely to answer correctly about TARGET_SUCCESS of the time.
+    """
+
+    def __init__(self, max_topics: int = 2000):
+        self._topics: "OrderedDict[str, TopicStats]" = OrderedDict()
+        self._max_topics = max_topics
+        self._lock = threading.Lock()
+
+    def _topic(self, topic_id) -> TopicStats:
+        key = str(topic_id)
+        with self._lock:
+            cached = self._topics.get(key)
+            if cached and time.monotonic() - cached.loaded_at < STATS_TTL_SECONDS:
+                self._topics.move_to_end(key)
+                metrics.CACHE_LOOKUPS.labels('item_stats', 'hit').inc()
+                return cached
+
+        metrics.CACHE_LOOKUPS.labels('item_stats', 'miss').inc()
+        from database import db
+        stats = TopicStats(db.get_item_stats(topic_id))
+
+        with self._lock:
+            self._topics[key] = stats
+            self._topics.move_to_end(key)
+            while len(self._topics) > self._max_topics:
+                self._topics.popitem(last=False)
+        return stats
+
+    def record(self, topic_id, question_ids: List[str], correct: np.ndarray) -> bool:
+        """Add one submitted quiz to its questions' statistics"""
+        if not topic_id or len(question_ids) < 2 or len(question_ids) != len(correct):
+            return False
+        from database import db
+
+        x = np.asarray(correct, dtype=float)
+        rest = (x.sum() - x) / (len(x) - 1)
+        ids = [str(q) for q in question_ids]
+        saved = db.bump_item_stats(topic_id, [
+            {'question_id': q, 'correct': int(c), 'rest': round(float(r), 4)}
+            for q, c, r in zip(ids, x, rest)
+        ])
+        if saved:
+            with self._lock:
+                cached = self._topics.get(str(topic_id))
+                if cached:
+                    cached.add(ids, x, rest)
+        return saved
+
+    def choose(self, topic_id, candidates: List[Dict], count: int, ability: Optional[float] = None, rng: random.Random = None) -> List[Dict]:
+        """
+        The `count` candidate questions best matched to a learner
+
+        ability is the learner's recent score on the topic (0-1); with
+        none, the learner is taken to be as strong as the topic's
+        average answerer. Each question's chance of success is its
+        share correct shifted, on the logit scale, by how far the
+        learner is above or below that average; the questions closest
+        to TARGET_SUCCESS win, discriminating ones first among similar.
+        """
+        if count <= 0 or not candidates:
+            return []
+        if len(candidates) <= count:
+            return list(candidates)
+        rng = rng or random
+
+        stats = self._topic(topic_id)
+        sums = stats.lookup([str(c['id']) for c in candidates])
+        p = difficulty(sums)
+        shift = 0.0
+        if ability is not None:
+            answered = sums[:, 0] > 0
+            average = float(p[answered].mean()) if answered.any() else 0.5
+            shift = _logit(min(max(ability, 0.05), 0.95)) - _logit(average)
+        success = 1 / (1 + np.exp(-(_logit(p) + shift)))
+
+        jitter = np.array([rng.random() for _ in candidates]) * JITTER
+        score = np.abs(success - TARGET_SUCCESS) - DISCRIMINATION_WEIGHT * np.maximum(discrimination(sums), 0) + jitter
+        return [candidates[k] for k in np.argsort(score, kind='stable')[:count]]
+
+    def summary(self, topic_id) -> List[Dict]:
+        """Difficulty and discrimination of a topic's answered questions, hardest first"""
+        stats = self._topic(topic_id)
+        question_ids = sorted(stats.index, key=stats.index.get)
+        sums = stats.lookup(question_ids)
+        order = np.argsort(difficulty(sums), kind='stable')
+        question_ids, sums = [question_ids[k] for k in order], sums[order]
+        return [
+            {'question_id': q, 'attempts': int(s[0]), 'difficulty': round(float(p), 3), 'discrimination': round(float(r), 3)}
+            for q, s, p, r in zip(question_ids, sums, difficulty(sums), discrimination(sums))
+        ]
+
+
+# Global instance
+item_stats = ItemStatsEngine()
@@ -1,33 +1,116 @@
 import requests
-import json
 import os
-from typing import List, Dict
+import threading
+import time
+from datetime import datetime
+from typing import List, Dict, Optional
+from config import Config
+from utils.json_stream import parse_model_output
+from utils import metrics
+from utils.deadline import Deadline, budget
+from services.ai_service import validate_topic, validate_question
 
 OLLAMA_BASE_URL = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
 OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'phi3')
 
+# A call whose load_duration exceeds this had to load the model (cold)
+COLD_LOAD_SECONDS = 0.5
+
+
+def parse_warm_hours(spec: str) -> List[tuple]:
+    """Parse "8-12,17-23" into [(8, 12), (17, 23)]; bad ranges are ignored"""
+    ranges = []
+    for part in (spec or '').split(','):
+        try:
+            start, end = (int(h) for h in part.split('-'))
+        except ValueError:
+            continue
+        if 0 <= start <= 24 and 0 <= end <= 24:
+            ranges.append((start, end))
+    return ranges
+
+
+class LatencyStats:
+    """
+    Thread-safe cold vs warm Ollama call latency
+
+    Warm-up pings load the model without generating anything, so they
+    are kept apart from real calls and only show how long loads take.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {
+            kind: {'calls': 0, 'total_seconds': 0.0, 'load_seconds': 0.0}
+            for kind in ('cold', 'warm')
+        }
+        self._warmups = {'calls': 0, 'load_seconds': 0.0}
+        self.last_warmup = None
+    
+    def record(self, result: Dict, elapsed: float):
+        """Record one call from Ollama's final response (durations are in ns)"""
+        load = (result.get('load_duration') or 0) / 1e9
+        total = (result.get('total_duration') or 0) / 1e9 or elapsed
+        kind = 'cold' if load > COLD_LOAD_SECONDS else 'warm'
+        with self._lock:
+            stats = self._stats[kind]
+            stats['calls'] += 1
+            stats['total_seconds'] += total
+            stats['load_seconds'] += load
+    
+    def record_warmup(self, result: Dict):
+        """Record one warm-up ping (not counted as a cold or warm call)"""
+        with self._lock:
+            self._warmups['calls'] += 1
+            self._warmups['load_seconds'] += (result.get('load_duration') or 0) / 1e9
+            self.last_warmup = datetime.now().isoformat()
+    
+    def snapshot(self) -> Dict:
+        with self._lock:
+            result = {}
+            for kind, stats in self._stats.items():
+                calls = stats['calls']
+                result[kind] = {
+                    'calls': calls,
+                    'avg_seconds': round(stats['total_seconds'] / calls, 3) if calls else 0,
+                    'avg_load_seconds': round(stats['load_seconds'] / calls, 3) if calls else 0
+                }
+            calls = self._warmups['calls']
+            result['warmup'] = {
+                'calls': calls,
+                'avg_load_seconds': round(self._warmups['load_seconds'] / calls, 3) if calls else 0
+            }
+            result['last_warmup'] = self.last_warmup
+            return result
+
+
 class OllamaService:
     """Ollama integration for local AI"""
     
     def __init__(self):
         self.base_url = OLLAMA_BASE_URL
         self.model = OLLAMA_MODEL
+        self.keep_alive = Config.OLLAMA_KEEP_ALIVE
+        self.latency = LatencyStats()
+        self._warmer: Optional[threading.Thread] = None
+        self._warm_lock = threading.Lock()
     
-    def is_available(self) -> bool:
+    def is_available(self, timeout: float = 2) -> bool:
         """Check if Ollama is running"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=2)
+            response = requests.get(f"{self.base_url}/api/tags", timeout=timeout)
             return response.status_code == 200
         except:
             return False
     
-    def generate(self, prompt: str, system_prompt: str = "", temperature: float = 0.7) -> str:
+    def generate(self, prompt: str, system_prompt: str = "", temperature: float = 0.7, timeout: float = 60) -> str:
         """Generate text using Ollama"""
         try:
             payload = {
                 "model": self.model,
                 "prompt": prompt,
                 "stream": False,
+                "keep_alive": self.keep_alive,
                 "options": {
                     "temperature": temperature
                 }
@@ -36,21 +119,83 @@ class OllamaService:
             if system_prompt:
                 payload["system"] = system_prompt
             
+            started = time.perf_counter()
             response = requests.post(
                 f"{self.base_url}/api/generate",
                 json=payload,
-                timeout=60
+                timeout=timeout
             )
             
             if response.status_code == 200:
-                return response.json().get('response', '')
+                result = response.json()
+                self.latency.record(result, time.perf_counter() - started)
+                metrics.record_tokens('ollama', result.get('prompt_eval_count'), result.get('eval_count'))
+                return result.get('response', '')
             else:
                 raise Exception(f"Ollama error: {response.status_code}")
                 
         except Exception as e:
             raise Exception(f"Ollama generation failed: {str(e)}")
     
-    def extract_topics_with_ollama(self, syllabus_text: str, max_topics: int = 15) -> List[Dict]:
+    def warm_up(self) -> bool:
+        """
+        Load the model into memory without generating anything
+        
+        Ollama loads the model for a request with no prompt and keeps it
+        resident for keep_alive, so the next real call starts warm.
+        """
+        try:
+            response = requests.post(
+                f"{self.base_url}/api/generate",
+                json={"model": self.model, "keep_alive": self.keep_alive},
+                timeout=120
+            )
+            if response.status_code != 200:
+                print(f"Ollama warm-up failed: {response.status_code}")
+                return False
+            self.latency.record_warmup(response.json())
+            return True
+        except Exception as e:
+            print(f"Ollama warm-up failed: {str(e)}")
+            return False
+    
+    def warm_up_async(self):
+        """Start a warm-up in the background (e.g. while a PDF is parsed)"""
+        threading.Thread(target=self.warm_up, name='studywise-ollama-warmup', daemon=True).start()
+    
+    def in_warm_hours(self, now: Optional[datetime] = None) -> bool:
+        """True if the current hour falls in Config.OLLAMA_WARM_HOURS"""
+        hour = (now or datetime.now()).hour
+        for start, end in parse_warm_hours(Config.OLLAMA_WARM_HOURS):
+            # Ranges may wrap midnight, e.g. 22-2
+            if (start <= hour < end) if start <= end else (hour >= start or hour < end):
+                return True
+        return False
+    
+    def start_keepalive(self):
+        """
+        Warm the model once at startup, then ping it every
+        OLLAMA_WARM_INTERVAL seconds during busy hours
+        
+        Runs in a daemon thread per worker; safe to call more than once.
+        """
+        with self._warm_lock:
+            if self._warmer and self._warmer.is_alive():
+                return
+            self._warmer = threading.Thread(target=self._keepalive_loop, name='studywise-ollama-keepalive', daemon=True)
+            self._warmer.start()
+    
+    def _keepalive_loop(self):
+        if Config.OLLAMA_WARMUP_ON_START and self.is_available():
+            self.warm_up()
+        if not parse_warm_hours(Config.OLLAMA_WARM_HOURS):
+            return
+        while True:
+            time.sleep(Config.OLLAMA_WARM_INTERVAL)
+            if self.in_warm_hours() and self.is_available():
+                self.warm_up()
+    
+    def extract_topics_with_ollama(self, syllabus_text: str, max_topics: int = 15, deadline: Deadline = None) -> List[Dict]:
         """Extract topics using Ollama"""
         try:
             prompt = f"""Extract academic topics from this syllabus. For each topic, provide:
@@ -68,39 +213,18 @@ Return JSON array only, no other text."""
             
             system_prompt = "You are an academic curriculum analyzer. Return only valid JSON arrays."
             
-            response = self.generate(prompt, system_prompt, temperature=0.3)
+            with metrics.ai_call('ollama', 'topics'):
+                response = self.generate(prompt, system_prompt, temperature=0.3, timeout=budget(deadline, 60))
             
-            # Try to extract JSON from response
-            # Sometimes Ollama includes extra text
-            start_idx = response.find('[')
-            end_idx = response.rfind(']') + 1
+            # Ollama sometimes wraps the JSON in extra text or cuts it short;
+            # keep every complete, valid topic
+            return parse_model_output(response, validate_topic, 'ollama', limit=max_topics)
             
-            if start_idx != -1 and end_idx > start_idx:
-                json_str = response[start_idx:end_idx]
-                topics = json.loads(json_str)
-            else:
-                topics = json.loads(response)
-            
-            # Validate and clean
-            validated = []
-            for i, topic in enumerate(topics[:max_topics]):
-                validated.append({
-                    'name': topic.get('name', f'Topic {i+1}'),
-                    'description': topic.get('description', ''),
-                    'difficulty': topic.get('difficulty', 'medium').lower(),
-                    'hours': float(topic.get('hours', 5))
-                })
-            
-            return validated
-            
-        except json.JSONDecodeError:
-            print("Failed to parse Ollama response as JSON")
-            return []
         except Exception as e:
             print(f"Ollama topic extraction failed: {str(e)}")
             return []
     
-    def generate_quiz_questions(self, topic_name: str, topic_description: str, num_questions: int = 5) -> List[Dict]:
+    def generate_quiz_questions(self, topic_name: str, topic_description: str, num_questions: int = 5, deadline: Deadline = None) -> List[Dict]:
         """Generate quiz questions using Ollama"""
         try:
             prompt = f"""Generate {num_questions} multiple-choice quiz questions for this topic:
@@ -119,30 +243,10 @@ Return ONLY valid JSON array. Example format:
             
             system_prompt = "You are a quiz generator. Return only valid JSON arrays."
             
-            response = self.generate(prompt, system_prompt, temperature=0.7)
-            
-            # Extract JSON
-            start_idx = response.find('[')
-            end_idx = response.rfind(']') + 1
-            
-            if start_idx != -1 and end_idx > start_idx:
-                json_str = response[start_idx:end_idx]
-                questions = json.loads(json_str)
-            else:
-                questions = json.loads(response)
-            
-            # Validate structure
-            validated = []
-            for q in questions:
-                if all(k in q for k in ['question', 'options', 'correct']):
-                    validated.append({
-                        'question': q['question'],
-                        'options': q['options'][:4],
-                        'correct': int(q['correct']),
-                        'explanation': q.get('explanation', '')
-                    })
+            with metrics.ai_call('ollama', 'questions'):
+                response = self.generate(prompt, system_prompt, temperature=0.7, timeout=budget(deadline, 60))
             
-            return validated[:num_questions]
+            return parse_model_output(response, validate_question, 'ollama', limit=num_questions)
             
         except Exception as e:
             print(f"Ollama quiz generation failed: {str(e)}")
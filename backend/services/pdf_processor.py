@@ -1,24 +1,45 @@
 import PyPDF2
+import os
 import re
+import time
 from typing import List, Dict
+from services.topic_dedup import topic_dedup
+from utils import metrics
+from utils.deadline import Deadline, out_of_time
 
 class PDFProcessor:
     """Extract and process text from PDF files"""
     
     @staticmethod
-    def extract_text(pdf_path: str) -> str:
-        """Extract all text from PDF"""
+    def extract_text(pdf_path: str, deadline: Deadline = None) -> str:
+        """
+        Extract all text from PDF
+        
+        If the deadline passes mid-document, the pages read so far are
+        returned so the request can still answer.
+        """
+        started = time.perf_counter()
         try:
             with open(pdf_path, 'rb') as file:
                 reader = PyPDF2.PdfReader(file)
                 text = ""
+                pages_read = 0
                 
                 for page in reader.pages:
+                    if pages_read and out_of_time(deadline):
+                        print(f"PDF extraction stopped at page {pages_read}/{len(reader.pages)}: deadline reached")
+                        break
                     text += page.extract_text() + "\n"
+                    pages_read += 1
                 
+                metrics.PDF_PAGES.inc(pages_read)
+                metrics.PDF_BYTES.inc(os.path.getsize(pdf_path))
                 return text.strip()
         except Exception as e:
+            metrics.PDF_FAILURES.inc()
             raise Exception(f"Failed to extract text from PDF: {str(e)}")
+        finally:
+            metrics.PDF_SECONDS.observe(time.perf_counter() - started)
     
     @staticmethod
     def clean_text(text: str) -> str:
@@ -59,15 +80,15 @@ class PDFProcessor:
         # Clean and deduplicate
         topics = [t.strip() for t in topics]
         topics = [t for t in topics if 5 < len(t) < 100 and len(t.split()) <= 12]
-        topics = list(dict.fromkeys(topics))  # Remove duplicates preserving order
+        # Near-duplicates too: "Unit 3: Linear Algebra" and "LINEAR ALGEBRA" from different patterns
+        topics = topic_dedup.dedupe(topics)
         
         # Fallback: If very few topics found, extract meaningful sentences
         if len(topics) < 3:
             fallback = re.findall(r'([A-Z][a-z]{2,}(?:\s+[A-Za-z]{2,}){2,8})[:\n]', text)
             fallback = [f.strip() for f in fallback if 10 < len(f) < 80]
-            fallback = list(dict.fromkeys(fallback))
-            topics.extend(fallback[:10])
-            topics = list(dict.fromkeys(topics))  # Deduplicate again
+            fallback = topic_dedup.dedupe(fallback)
+            topics = topic_dedup.dedupe(topics + fallback[:10])  # Deduplicate again
         
         return topics[:20]  # Limit to top 20
     
@@ -0,0 +1,237 @@
+import csv
+import hashlib
+import io
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from services.free_time import to_clock, to_minutes
+
+# RFC 5545 content lines are folded at 75 octets
+ICS_LINE_OCTETS = 75
+
+CSV_COLUMNS = ['date', 'day', 'start', 'end', 'topic', 'subject', 'hours', 'part', 'parts', 'difficulty']
+
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+
+MIDNIGHT = 24 * 60
+
+
+def _escape(text) -> str:
+    return str(text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _fold(line: str) -> str:
+    """One content line, folded so no physical line exceeds 75 octets"""
+    data = line.encode('utf-8')
+    if len(data) <= ICS_LINE_OCTETS:
+        return line + '\r\n'
+    chunks = []
+    limit = ICS_LINE_OCTETS
+    while data:
+        cut = min(limit, len(data))
+        # Never split a UTF-8 sequence
+        while cut < len(data) and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        chunks.append(data[:cut].decode('utf-8'))
+        data = data[cut:]
+        limit = ICS_LINE_OCTETS - 1  # continuation lines start with a space
+    return '\r\n '.join(chunks) + '\r\n'
+
+
+def _stamp(day: str, minutes: int) -> str:
+    """Floating local date-time, e.g. 20260105T083000 (24:00 is the next day's 00:00)"""
+    if minutes >= MIDNIGHT:
+        day = (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+        minutes -= MIDNIGHT
+    return f"{day.replace('-', '')}T{minutes // 60:02d}{minutes % 60:02d}00"
+
+
+class PlanExporter:
+    """
+    Calendar (iCalendar) and CSV export of a study plan.
+
+    Both formats are generators over an iterable of plan days, one
+    event or row at a time, so a semester plan is never held as one
+    string. Study sessions are placed into the day's free slots when
+    the timetable gives them, otherwise back to back from the start of
+    the study day.
+    """
+
+    @staticmethod
+    def etag(plan: Dict, revision: int, timetable: List[Dict], fmt: str) -> str:
+        """Changes whenever the plan, its revisions or the timetable change"""
+        classes = sorted(
+            f"{t.get('id')}|{t.get('day_of_week')}|{t.get('start_time')}|{t.get('end_time')}|{t.get('title')}"
+            for t in timetable
+        )
+        key = '\n'.join([fmt, str(plan['id']), str(plan.get('created_at')), str(revision)] + classes)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def sessions(day: Dict, slots: Optional[List[Dict]], day_start: int, day_end: int = MIDNIGHT) -> Iterator[Dict]:
+        """
+        Clock times for a day's topics
+
+        Yields { topic, start, end, minutes } with times in minutes; a
+        topic that does not fit the rest of a free slot continues in the
+        next one. Past the last slot, sessions run on from the end of
+        the study day to midnight; whatever still does not fit is
+        yielded with start and end None.
+        """
+        if slots is None:
+            free = [(day_start, day_end)]
+        else:
+            free = [(to_minutes(s['start']), to_minutes(s['end'])) for s in slots]
+        overflow = max(free[-1][1] if free else 0, day_end)
+        if overflow < MIDNIGHT:
+            free.append((overflow, MIDNIGHT))
+        k = 0
+        cursor = free[0][0] if free else MIDNIGHT
+        for topic in day.get('topics') or []:
+            # Topics with no time (0h) get no event
+            left = int(round(float(topic.get('hours') or 0) * 60))
+            while left > 0:
+                if k >= len(free):
+                    yield {'topic': topic, 'start': None, 'end': None, 'minutes': left}
+                    break
+                slot_end = free[k][1]
+                length = min(left, slot_end - cursor)
+                if length > 0:
+                    yield {'topic': topic, 'start': cursor, 'end': cursor + length, 'minutes': length}
+                    cursor += length
+                    left -= length
+                if cursor >= slot_end:
+                    k += 1
+                    if k < len(free):
+                        cursor = free[k][0]
+
+    def ics(
+        self,
+        plan: Dict,
+        days: Iterable[Dict],
+        timetable: List[Dict],
+        end_date: str,
+        slots_for,
+        day_start: int,
+        day_end: int = MIDNIGHT
+    ) -> Iterator[str]:
+        """
+        iCalendar (RFC 5545) lines for a plan
+
+        Args:
+            plan: Plan row (id, start_date, created_at)
+            days: Plan days in date order ({ day, date, topics })
+            timetable: Timetable entries, exported as weekly classes
+                until end_date
+            end_date: Last day of the plan
+            slots_for: date -> free slots of that date, or None
+            day_start: Minutes after midnight the study day starts
+            day_end: Minutes after midnight the study day ends; sessions
+                that do not fit go on to midnight, then into one all-day
+                "unscheduled" event
+        """
+        created = str(plan.get('created_at') or datetime.utcnow().isoformat())
+        dtstamp = created[:19].replace('-', '').replace(':', '') + 'Z'
+
+        for line in ('BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//StudyWise//Study Plan//EN',
+                     'CALSCALE:GREGORIAN', 'METHOD:PUBLISH', 'X-WR-CALNAME:Study plan'):
+            yield _fold(line)
+
+        start = date.fromisoformat(plan['start_date'])
+        until = end_date.replace('-', '') + 'T235959'
+        for entry in timetable:
+            weekday = int(entry['day_of_week'])
+            first = start + timedelta(days=(weekday - start.weekday()) % 7)
+            first_day = first.isoformat()
+            for line in (
+                'BEGIN:VEVENT',
+                f"UID:class-{entry.get('id')}@studywise",
+                f"DTSTAMP:{dtstamp}",
+                f"DTSTART:{_stamp(first_day, to_minutes(entry['start_time']))}",
+                f"DTEND:{_stamp(first_day, to_minutes(entry['end_time']))}",
+                f"RRULE:FREQ=WEEKLY;BYDAY={WEEKDAYS[weekday]};UNTIL={until}",
+                f"SUMMARY:{_escape(entry.get('title') or 'Class')}",
+                'CATEGORIES:Class',
+                'TRANSP:OPAQUE',
+                'END:VEVENT'
+            ):
+                yield _fold(line)
+
+        for day in days:
+            unscheduled = []
+            for k, session in enumerate(self.sessions(day, slots_for(day['date']), day_start, day_end)):
+                topic = session['topic']
+                if session['start'] is None:
+                    unscheduled.append(session)
+                    continue
+                summary = topic.get('name') or 'Study'
+                if topic.get('parts'):
+                    summary += f" ({topic['part']}/{topic['parts']})"
+                description = f"Day {day.get('day')} - {topic.get('hours')}h, {topic.get('difficulty', 'medium')}"
+                if topic.get('description'):
+                    description += f"\n{topic['description']}"
+                lines = [
+                    'BEGIN:VEVENT',
+                    f"UID:{plan['id']}-{day['date']}-{k}@studywise",
+                    f"DTSTAMP:{dtstamp}",
+                    f"DTSTART:{_stamp(day['date'], session['start'])}",
+                    f"DTEND:{_stamp(day['date'], session['end'])}",
+                    f"SUMMARY:{_escape(summary)}",
+                    f"DESCRIPTION:{_escape(description)}"
+                ]
+                if topic.get('subject'):
+                    lines.append(f"CATEGORIES:{_escape(topic['subject'])}")
+                lines.append('END:VEVENT')
+                yield ''.join(_fold(line) for line in lines)
+            if unscheduled:
+                names = ', '.join(s['topic'].get('name') or 'Study' for s in unscheduled)
+                hours = round(sum(s['minutes'] for s in unscheduled) / 60, 2)
+                next_day = (date.fromisoformat(day['date']) + timedelta(days=1)).isoformat()
+                yield ''.join(_fold(line) for line in (
+                    'BEGIN:VEVENT',
+                    f"UID:{plan['id']}-{day['date']}-unscheduled@studywise",
+                    f"DTSTAMP:{dtstamp}",
+                    f"DTSTART;VALUE=DATE:{day['date'].replace('-', '')}",
+                    f"DTEND;VALUE=DATE:{next_day.replace('-', '')}",
+                    f"SUMMARY:{_escape(f'Unscheduled study ({hours}h)')}",
+                    f"DESCRIPTION:{_escape(f'Did not fit the day: {names}')}",
+                    'TRANSP:TRANSPARENT',
+                    'END:VEVENT'
+                ))
+
+        yield _fold('END:VCALENDAR')
+
+    def csv(self, days: Iterable[Dict], slots_for, day_start: int, day_end: int = MIDNIGHT) -> Iterator[str]:
+        """CSV text, one row per study session (header first; no times for unscheduled ones)"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        def flush():
+            text = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            return text
+
+        writer.writerow(CSV_COLUMNS)
+        yield flush()
+        for day in days:
+            for session in self.sessions(day, slots_for(day['date']), day_start, day_end):
+                topic = session['topic']
+                timed = session['start'] is not None
+                writer.writerow([
+                    day['date'],
+                    day.get('day'),
+                    to_clock(session['start']) if timed else '',
+                    to_clock(session['end']) if timed else '',
+                    topic.get('name'),
+                    topic.get('subject', ''),
+                    round(session['minutes'] / 60, 2),
+                    topic.get('part', ''),
+                    topic.get('parts', ''),
+                    topic.get('difficulty', '')
+                ])
+            yield flush()
+
+
+# Global instance
+plan_exporter = PlanExporter()
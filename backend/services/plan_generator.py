@@ -1,6 +1,60 @@
+import heapq
+from collections import Counter
 from datetime import datetime, timedelta
 from typing import List, Dict
 
+import numpy as np
+
+# Difficulty codes used by the array-backed engine
+DIFFICULTIES = ('easy', 'medium', 'hard')
+DIFFICULTY_CODES = {name: code for code, name in enumerate(DIFFICULTIES)}
+MULTIPLIERS = np.array([0.8, 1.0, 1.3])
+
+# How far difficulty moves a topic, as a fraction of the whole plan
+# (hard topics earlier, easy ones later)
+DIFFICULTY_SHIFT = np.array([0.1, 0.0, -0.25])
+
+# Split-topic pieces shorter than this join the neighbouring day's piece
+SLIVER_HOURS = 0.25
+
+# Multi-subject plans hand out each day's hours in slices of this size
+ALLOCATION_BLOCK = 0.5
+
+
+class Packing:
+    """
+    One packing of topics into days, stored as parallel arrays.
+
+    Piece k studies topic `topic[k]` (index into `topics`) for `hours[k]`
+    on day `day[k]`; pieces are in study order, so days never decrease.
+    Daily and weekly views are both read from these arrays.
+    """
+    
+    def __init__(self, topics, difficulties, start, capacities, capacity, scale, topic, day, hours, part, parts):
+        self.topics = topics
+        self.difficulties = difficulties
+        self.start = start
+        self.total_days = len(capacities)
+        self.capacities = capacities
+        self.capacity = capacity
+        self.scale = scale
+        self.topic = topic
+        self.day = day
+        self.hours = hours
+        self.part = part
+        self.parts = parts
+    
+    def date(self, day: int) -> str:
+        return (self.start + timedelta(days=int(day))).strftime('%Y-%m-%d')
+
+
+def _run_offsets(seq: np.ndarray) -> np.ndarray:
+    """Position of each element within its run of equal values"""
+    idx = np.arange(len(seq))
+    run_start = np.concatenate([[True], seq[1:] != seq[:-1]]) if len(seq) else np.zeros(0, dtype=bool)
+    return idx - np.maximum.accumulate(np.where(run_start, idx, 0))
+
+
 class PlanGenerator:
     """Rule-based study plan generation"""
     
@@ -14,6 +68,440 @@ class PlanGenerator:
         }
         return multipliers.get(difficulty.lower(), 1.0)
     
+    @staticmethod
+    def _window(start_date: str, end_date: str):
+        """Start datetime and number of days (inclusive) of a date window"""
+        start = datetime.fromisoformat(start_date)
+        total_days = (datetime.fromisoformat(end_date) - start).days + 1
+        if total_days <= 0:
+            raise ValueError('End date must be after start date')
+        return start, total_days
+    
+    @staticmethod
+    def _needed_hours(topics: List[Dict], apply_difficulty: bool = True):
+        """Difficulty names, difficulty codes and study hours each topic needs"""
+        n = len(topics)
+        difficulties = [(t.get('difficulty_level') or 'medium').lower() for t in topics]
+        codes = np.fromiter((DIFFICULTY_CODES.get(d, 1) for d in difficulties), dtype=np.int64, count=n)
+        estimated = np.fromiter((float(t.get('estimated_hours') or 5) for t in topics), dtype=float, count=n)
+        needed = np.maximum(estimated, 0.1) * (MULTIPLIERS[codes] if apply_difficulty else 1.0)
+        return difficulties, codes, needed
+    
+    @staticmethod
+    def _study_order(codes: np.ndarray) -> np.ndarray:
+        """Syllabus order with hard topics pulled earlier, easy ones later"""
+        n = len(codes)
+        return np.argsort(np.arange(n) / max(n, 1) + DIFFICULTY_SHIFT[codes], kind='stable')
+    
+    @staticmethod
+    def pack(
+        topics: List[Dict],
+        start_date: str,
+        end_date: str,
+        hours_per_day: float = 2.0,
+        apply_difficulty: bool = True,
+        capacities=None
+    ) -> Packing:
+        """
+        Pack topics into days by hours capacity
+        
+        Each topic needs estimated_hours x difficulty multiplier. If that
+        adds up to more than the hours available in the window, every
+        topic is scaled down so all of them still fit. Topics keep
+        syllabus order except that hard topics are pulled earlier (easy
+        ones later).
+        
+        Laid end to end, topic i covers [c[i-1], c[i]) of the cumulative
+        hours c, and day d covers [e[d-1], e[d]) of the cumulative day
+        capacities e, so every topic's pieces come from one vectorized
+        interval split. A topic that overruns a day continues the next
+        day as numbered parts; slivers under SLIVER_HOURS join the
+        neighbouring piece.
+        
+        O(n log n) for the ordering, O(n + days + pieces) for the packing.
+        
+        Args:
+            topics: Topic rows (id, topic_name, description,
+                estimated_hours, difficulty_level) in syllabus order
+            start_date: ISO date string (first study day)
+            end_date: ISO date string (last study day, inclusive)
+            hours_per_day: Study hours available per day
+            apply_difficulty: False to take estimated_hours as final and
+                keep the given order (used when replanning a plan)
+            capacities: Optional hours available on each day of the
+                window (0 for no study); defaults to hours_per_day daily
+        
+        Raises:
+            ValueError: on an empty window, non-positive hours_per_day or
+                a window without any study time
+        """
+        start, total_days = PlanGenerator._window(start_date, end_date)
+        if hours_per_day <= 0:
+            raise ValueError('hours_per_day must be positive')
+        
+        if capacities is None:
+            capacities = np.full(total_days, float(hours_per_day))
+        else:
+            capacities = np.asarray(capacities, dtype=float)
+            if len(capacities) != total_days:
+                raise ValueError('capacities must give hours for every day of the window')
+        
+        difficulties, codes, needed = PlanGenerator._needed_hours(topics, apply_difficulty)
+        order = PlanGenerator._study_order(codes) if apply_difficulty else np.arange(len(topics))
+        return PlanGenerator._split(topics, difficulties, needed, order, start, capacities, float(hours_per_day))
+    
+    @staticmethod
+    def _split(topics, difficulties, needed, order, start, capacities, capacity) -> Packing:
+        """Interval split of `needed` hours (in `order`) over day capacities, see pack"""
+        n = len(topics)
+        total_days = len(capacities)
+        if n == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return Packing(topics, difficulties, start, capacities, capacity, 1.0, empty, empty, np.zeros(0), empty, empty)
+        
+        available = float(capacities.sum())
+        if available <= 0:
+            raise ValueError('No study time available between the start and end dates')
+        
+        # Scale down (never up) so the whole syllabus fits the window
+        scale = min(1.0, available / needed.sum())
+        
+        h = needed[order] * scale
+        ends = np.cumsum(h)
+        starts = ends - h
+        day_ends = np.cumsum(capacities)
+        day_starts = day_ends - capacities
+        
+        last_day = total_days - 1
+        first = np.minimum(np.searchsorted(day_ends, starts + 1e-9, side='right'), last_day)
+        last = np.minimum(np.searchsorted(day_ends, ends - 1e-9, side='right'), last_day)
+        last = np.maximum(last, first)
+        counts = last - first + 1
+        
+        # One piece per (topic, day) it touches; days without capacity
+        # inside a topic's span get nothing
+        seq = np.repeat(np.arange(n), counts)
+        day = first[seq] + _run_offsets(seq)
+        lo = np.maximum(starts[seq], day_starts[day])
+        hi = np.where(day == last_day, ends[seq], np.minimum(ends[seq], day_ends[day]))
+        hours = hi - lo
+        live = hours > 1e-9
+        seq, day, hours = seq[live], day[live], hours[live]
+        counts = np.bincount(seq, minlength=n)
+        offset = _run_offsets(seq)
+        
+        # Slivers: a topic's first piece moves to its next day, its last
+        # piece stays with the previous day
+        multi = counts[seq] > 1
+        move_first = multi & (offset == 0) & (hours < SLIVER_HOURS)
+        np.add.at(hours, np.flatnonzero(move_first) + 1, hours[move_first])
+        prev_moved = np.concatenate([[False], move_first[:-1]])
+        move_last = multi & (offset == counts[seq] - 1) & (hours < SLIVER_HOURS) & ~prev_moved & ~move_first
+        np.add.at(hours, np.flatnonzero(move_last) - 1, hours[move_last])
+        keep = ~(move_first | move_last)
+        
+        seq, day, hours = seq[keep], day[keep], hours[keep]
+        parts = np.bincount(seq, minlength=n)[seq]
+        part = _run_offsets(seq) + 1
+        
+        return Packing(topics, difficulties, start, capacities, capacity, scale, order[seq], day, hours, part, parts)
+    
+    @staticmethod
+    def daily_view(packing: Packing) -> List[Dict]:
+        """
+        Day-by-day schedule
+        
+        Returns:
+            Non-empty days: [{ day, date, hours, topics: [{ id, name,
+            description, hours, difficulty[, part, parts] }] }]
+        """
+        if len(packing.day) == 0:
+            return []
+        
+        bounds = np.flatnonzero(np.diff(packing.day)) + 1
+        starts = np.concatenate([[0], bounds])
+        stops = np.concatenate([bounds, [len(packing.day)]])
+        
+        schedule = []
+        for lo, hi in zip(starts.tolist(), stops.tolist()):
+            entries = []
+            for k in range(lo, hi):
+                i = int(packing.topic[k])
+                topic = packing.topics[i]
+                entry = {
+                    'id': topic.get('id'),
+                    'name': topic.get('topic_name'),
+                    'description': topic.get('description', ''),
+                    'hours': round(float(packing.hours[k]), 1),
+                    'difficulty': packing.difficulties[i]
+                }
+                if topic.get('subject'):
+                    entry['subject'] = topic['subject']
+                if packing.parts[k] > 1:
+                    entry['part'] = int(packing.part[k])
+                    entry['parts'] = int(packing.parts[k])
+                entries.append(entry)
+            
+            day = int(packing.day[lo])
+            schedule.append({
+                'day': day + 1,
+                'date': packing.date(day),
+                'hours': round(float(packing.hours[lo:hi].sum()), 1),
+                'topics': entries
+            })
+        return schedule
+    
+    @staticmethod
+    def weekly_view(packing: Packing) -> Dict:
+        """
+        Week-by-week plan (weeks run from the start date)
+        
+        Returns:
+            { total_weeks, total_hours, daily_hours, weeks: { week_N:
+            { start_date, end_date, total_hours, topics: [{ topic_id,
+            topic_name, hours, difficulty, tasks }] } } }
+        """
+        weeks = {}
+        total_weeks = 0
+        if len(packing.day):
+            week = packing.day // 7
+            total_weeks = int(week[-1]) + 1
+            
+            # One entry per (week, topic), in order of first appearance
+            # (subjects interleave, so a topic's pieces need not be adjacent)
+            keys = week * len(packing.topics) + packing.topic
+            _, first_seen, inverse = np.unique(keys, return_index=True, return_inverse=True)
+            key_hours = np.bincount(inverse.ravel(), weights=packing.hours)
+            by_appearance = np.argsort(first_seen)
+            starts = first_seen[by_appearance]
+            run_hours = key_hours[by_appearance]
+            
+            for w in range(total_weeks):
+                week_start = w * 7
+                weeks[f"week_{w + 1}"] = {
+                    'start_date': packing.date(week_start),
+                    'end_date': packing.date(min(week_start + 6, packing.total_days - 1)),
+                    'topics': [],
+                    'total_hours': 0.0
+                }
+            
+            for k, run_hours_k in zip(starts.tolist(), run_hours.tolist()):
+                i = int(packing.topic[k])
+                topic = packing.topics[i]
+                week_plan = weeks[f"week_{int(week[k]) + 1}"]
+                week_plan['topics'].append({
+                    'topic_id': topic.get('id'),
+                    'topic_name': topic.get('topic_name'),
+                    'hours': round(run_hours_k, 1),
+                    'difficulty': packing.difficulties[i],
+                    'tasks': PlanGenerator._generate_tasks(topic)
+                })
+                week_plan['total_hours'] += run_hours_k
+            
+            for week_plan in weeks.values():
+                week_plan['total_hours'] = round(week_plan['total_hours'], 1)
+        
+        return {
+            'total_weeks': total_weeks,
+            'total_hours': round(float(packing.hours.sum()), 1),
+            'daily_hours': packing.capacity,
+            'weeks': weeks
+        }
+    
+    @staticmethod
+    def build_plan(
+        topics: List[Dict],
+        start_date: str,
+        end_date: str,
+        hours_per_day: float = 2.0,
+        capacities=None
+    ) -> Dict:
+        """
+        Pack once and return both views (capacities as for pack)
+        
+        Returns:
+            { days: daily_view, weeks: weekly_view, scale } where scale < 1
+            means topics were shortened to fit the window
+        """
+        packing = PlanGenerator.pack(topics, start_date, end_date, hours_per_day, capacities=capacities)
+        return {
+            'days': PlanGenerator.daily_view(packing),
+            'weeks': PlanGenerator.weekly_view(packing),
+            'scale': round(packing.scale, 3)
+        }
+    
+    @staticmethod
+    def allocate_subjects(needed: np.ndarray, exam_days: np.ndarray, capacities: np.ndarray) -> np.ndarray:
+        """
+        Share every day's study hours between subjects
+        
+        Day by day, the hours go out in ALLOCATION_BLOCK slices, each to
+        the subject with the highest required rate (hours still needed /
+        days left until its exam), taken from a heap. Subjects get no
+        time after their exam day; when a budget cannot cover
+        everything, the nearest exams are served first.
+        
+        O(days x (S + slices per day x log S)) for S subjects.
+        
+        Args:
+            needed: Hours each subject needs
+            exam_days: Day index of each subject's exam (last study day)
+            capacities: Hours available on each day
+        
+        Returns:
+            subjects x days array of allocated hours
+        """
+        subjects, days = len(needed), len(capacities)
+        allocated = np.zeros((subjects, days))
+        remaining = [float(h) for h in needed]
+        exams = [int(d) for d in exam_days]
+        
+        for d in range(days):
+            left = float(capacities[d])
+            heap = [
+                (-remaining[s] / (exams[s] - d + 1), exams[s], s)
+                for s in range(subjects)
+                if remaining[s] > 1e-9 and exams[s] >= d
+            ]
+            heapq.heapify(heap)
+            while heap and left > 1e-9:
+                _, exam, s = heapq.heappop(heap)
+                give = min(ALLOCATION_BLOCK, left, remaining[s])
+                allocated[s, d] += give
+                remaining[s] -= give
+                left -= give
+                if remaining[s] > 1e-9:
+                    heapq.heappush(heap, (-remaining[s] / (exam - d + 1), exam, s))
+        return allocated
+    
+    @staticmethod
+    def pack_subjects(
+        subjects: List[Dict],
+        start_date: str,
+        end_date: str,
+        hours_per_day: float = 2.0,
+        capacities=None
+    ) -> Packing:
+        """
+        Pack several subjects into one plan under a shared daily budget
+        
+        allocate_subjects splits each day's hours between subjects by
+        exam pressure; each subject is then packed into its own share of
+        the days with the usual interval split (difficulty order,
+        scaling, parts) and the pieces are merged by day, nearest exam
+        first within a day.
+        
+        Args:
+            subjects: [{ subject, exam_date (optional, defaults to
+                end_date), topics }], topics as for pack
+            start_date: ISO first study day
+            end_date: ISO last study day (at least the latest exam)
+            hours_per_day: Study hours per day shared by all subjects
+            capacities: Optional hours available on each day (see pack)
+        
+        Returns:
+            A Packing over all subjects' topics; topic rows are copies
+            carrying their `subject`, and `subject_hours` gives each
+            subject's needed and planned hours
+        
+        Raises:
+            ValueError: on an invalid window or an exam outside it
+        """
+        start, total_days = PlanGenerator._window(start_date, end_date)
+        if hours_per_day <= 0:
+            raise ValueError('hours_per_day must be positive')
+        capacities = np.full(total_days, float(hours_per_day)) if capacities is None else np.asarray(capacities, dtype=float)
+        if len(capacities) != total_days:
+            raise ValueError('capacities must give hours for every day of the window')
+        
+        exam_days = []
+        for subject in subjects:
+            exam_day = (datetime.fromisoformat(subject.get('exam_date') or end_date) - start).days
+            if not 0 <= exam_day < total_days:
+                raise ValueError(f"Exam date of {subject.get('subject')} is outside the plan window")
+            exam_days.append(exam_day)
+        
+        # Nearest exam first, so same-day pieces come out in that order
+        ranked = sorted(range(len(subjects)), key=lambda s: (exam_days[s], s))
+        subjects = [subjects[s] for s in ranked]
+        exam_days = np.array([exam_days[s] for s in ranked], dtype=np.int64)
+        
+        prepared = []
+        for subject in subjects:
+            topics = [dict(t, subject=subject.get('subject')) for t in subject.get('topics') or []]
+            prepared.append((topics,) + PlanGenerator._needed_hours(topics))
+        needed = np.array([p[3].sum() for p in prepared])
+        allocated = PlanGenerator.allocate_subjects(needed, exam_days, capacities)
+        
+        all_topics, difficulties = [], []
+        pieces = []
+        for (topics, subject_difficulties, codes, topic_hours), share in zip(prepared, allocated):
+            if topics and share.sum() > 0:
+                packing = PlanGenerator._split(
+                    topics, subject_difficulties, topic_hours, PlanGenerator._study_order(codes),
+                    start, share, float(hours_per_day)
+                )
+                pieces.append((packing.topic + len(all_topics), packing.day, packing.hours, packing.part, packing.parts))
+            all_topics.extend(topics)
+            difficulties.extend(subject_difficulties)
+        
+        if pieces:
+            topic, day, hours, part, parts = (np.concatenate(column) for column in zip(*pieces))
+            order = np.lexsort((np.arange(len(day)), day))
+            topic, day, hours, part, parts = topic[order], day[order], hours[order], part[order], parts[order]
+        else:
+            topic = day = part = parts = np.zeros(0, dtype=np.int64)
+            hours = np.zeros(0)
+        
+        total_needed = float(needed.sum())
+        scale = min(1.0, float(hours.sum()) / total_needed) if total_needed else 1.0
+        packing = Packing(all_topics, difficulties, start, capacities, float(hours_per_day), scale, topic, day, hours, part, parts)
+        packing.subject_hours = [
+            {
+                'subject': subject.get('subject'),
+                'upload_id': subject.get('upload_id'),
+                'exam_date': packing.date(exam_day),
+                'topics': len(subject.get('topics') or []),
+                'needed_hours': round(float(subject_needed), 1),
+                'planned_hours': round(float(min(share.sum(), subject_needed)), 1)
+            }
+            for subject, exam_day, subject_needed, share in zip(subjects, exam_days, needed, allocated)
+        ]
+        return packing
+    
+    @staticmethod
+    def build_global_plan(
+        subjects: List[Dict],
+        start_date: str,
+        end_date: str,
+        hours_per_day: float = 2.0,
+        capacities=None
+    ) -> Dict:
+        """
+        One plan across all subjects, see pack_subjects
+        
+        Returns:
+            { days, weeks, scale, subjects: [{ subject, upload_id,
+            exam_date, topics, needed_hours, planned_hours }] }
+        """
+        packing = PlanGenerator.pack_subjects(subjects, start_date, end_date, hours_per_day, capacities)
+        return {
+            'days': PlanGenerator.daily_view(packing),
+            'weeks': PlanGenerator.weekly_view(packing),
+            'scale': round(packing.scale, 3),
+            'subjects': packing.subject_hours
+        }
+    
+    @staticmethod
+    def generate_daily_schedule(
+        topics: List[Dict],
+        start_date: str,
+        end_date: str,
+        hours_per_day: float = 2.0
+    ) -> List[Dict]:
+        """Day-by-day schedule, see pack and daily_view"""
+        return PlanGenerator.daily_view(PlanGenerator.pack(topics, start_date, end_date, hours_per_day))
+    
     @staticmethod
     def generate_study_plan(
         topics: List[Dict],
@@ -31,83 +519,126 @@ class PlanGenerator:
             daily_hours: Hours available per day
         
         Returns:
-            Dict with week-by-week breakdown
+            Dict with week-by-week breakdown, see weekly_view
+        
+        Raises:
+            ValueError: on an invalid date range or daily_hours
         """
-        try:
-            start = datetime.fromisoformat(start_date)
-            end = datetime.fromisoformat(end_date)
-            total_days = (end - start).days
-            
-            if total_days <= 0:
-                raise ValueError("End date must be after start date")
-            
-            # Calculate total hours needed
-            total_hours_needed = sum(
-                t.get('estimated_hours', 5) * PlanGenerator.calculate_difficulty_multiplier(t.get('difficulty_level', 'medium'))
-                for t in topics
-            )
-            
-            total_hours_available = total_days * daily_hours
-            
-            # Adjust if needed
-            if total_hours_needed > total_hours_available:
-                scale_factor = total_hours_available / total_hours_needed
-            else:
-                scale_factor = 1.0
-            
-            # Build week-by-week plan
-            plan = {}
-            current_date = start
-            week_num = 1
-            remaining_topics = topics.copy()
-            
-            while remaining_topics and current_date < end:
-                week_key = f"week_{week_num}"
-                week_end = min(current_date + timedelta(days=7), end)
-                week_hours_available = 7 * daily_hours
-                
-                week_topics = []
-                week_hours_used = 0
-                
-                # Fill week with topics
-                while remaining_topics and week_hours_used < week_hours_available:
-                    topic = remaining_topics[0]
-                    topic_hours = topic.get('estimated_hours', 5) * scale_factor
-                    topic_hours *= PlanGenerator.calculate_difficulty_multiplier(topic.get('difficulty_level', 'medium'))
-                    
-                    if week_hours_used + topic_hours <= week_hours_available * 1.2:  # Allow 20% overflow
-                        week_topics.append({
-                            'topic_id': topic.get('id'),
-                            'topic_name': topic.get('topic_name'),
-                            'hours': round(topic_hours, 1),
-                            'difficulty': topic.get('difficulty_level', 'medium'),
-                            'tasks': PlanGenerator._generate_tasks(topic)
-                        })
-                        week_hours_used += topic_hours
-                        remaining_topics.pop(0)
-                    else:
-                        break
-                
-                plan[week_key] = {
-                    'start_date': current_date.isoformat(),
-                    'end_date': week_end.isoformat(),
-                    'topics': week_topics,
-                    'total_hours': round(week_hours_used, 1)
-                }
-                
-                current_date = week_end
-                week_num += 1
-            
-            return {
-                'total_weeks': week_num - 1,
-                'total_hours': round(total_hours_needed * scale_factor, 1),
-                'daily_hours': daily_hours,
-                'weeks': plan
-            }
-            
-        except Exception as e:
-            print(f"Plan generation failed: {str(e)}")
-            return {}
+        return PlanGenerator.weekly_view(PlanGenerator.pack(topics, start_date, end_date, daily_hours))
+    
+    @staticmethod
+    def apply_revisions(schedule: List[Dict], revisions: List[Dict]) -> List[Dict]:
+        """
+        Current schedule of a plan: its base schedule with every
+        revision delta applied in order
+        
+        A revision sets `days` (replacing those dates) and drops
+        `removed_dates`; days before its from_date are never touched.
+        """
+        days = {day['date']: day for day in schedule or []}
+        for revision in revisions:
+            for date in revision.get('removed_dates') or []:
+                days.pop(date, None)
+            for day in revision.get('days') or []:
+                days[day['date']] = day
+        return [days[date] for date in sorted(days)]
+    
+    @staticmethod
+    def replan(
+        schedule: List[Dict],
+        base_schedule: List[Dict],
+        plan_start: str,
+        today: str,
+        end_date: str,
+        hours_per_day: float,
+        progress: List[Dict],
+        capacities=None
+    ) -> Dict:
+        """
+        Reschedule the unfinished remainder of a plan from today onward
+        
+        Days before today stay as they are. Every topic that is not
+        completed needs its hours in the original plan minus the hours
+        already spent (from the progress table); those are packed from
+        today to end_date in their current plan order, so overdue topics
+        come first. Only the future days that actually change are
+        returned, and replanning again with the same progress changes
+        nothing.
+        
+        Args:
+            schedule: Current (revised) daily schedule
+            base_schedule: Schedule the plan was created with
+            plan_start: ISO start date of the plan (for day numbers)
+            today: ISO date the remainder starts on
+            end_date: ISO last study day
+            hours_per_day: Study hours available per day
+            progress: Progress rows (topic_id, status, hours_spent)
+            capacities: Optional hours for each day from today to
+                end_date (see pack)
+        
+        Returns:
+            { days: changed or new days, removed_dates: future dates that
+            are now empty, schedule: full schedule after the change,
+            remaining_hours }
+        
+        Raises:
+            ValueError: if today is after end_date
+        """
+        if today > end_date:
+            raise ValueError('Plan has already ended; pass a later end_date')
+        
+        done = {p['topic_id']: p for p in progress if p.get('topic_id') is not None}
+        
+        # Hours each topic was given when the plan was created
+        planned: Dict = {}
+        for day in base_schedule:
+            for entry in day.get('topics') or []:
+                key = entry.get('id')
+                planned[key] = planned.get(key, 0.0) + float(entry.get('hours') or 0)
+        
+        # Current plan order (first appearance)
+        entries: Dict = {}
+        for day in schedule:
+            for entry in day.get('topics') or []:
+                entries.setdefault(entry.get('id'), entry)
+        
+        remainder = []
+        for key, entry in entries.items():
+            record = done.get(key) or {}
+            if record.get('status') == 'completed':
+                continue
+            left = planned.get(key, 0.0) - float(record.get('hours_spent') or 0)
+            if left > 0.05:
+                remainder.append({
+                    'id': key,
+                    'topic_name': entry.get('name'),
+                    'description': entry.get('description', ''),
+                    'estimated_hours': left,
+                    'difficulty_level': entry.get('difficulty') or 'medium',
+                    'subject': entry.get('subject')
+                })
+        
+        future = PlanGenerator.daily_view(
+            PlanGenerator.pack(remainder, today, end_date, hours_per_day, apply_difficulty=False, capacities=capacities)
+        ) if remainder else []
+        
+        # Day numbers count from the plan start, not from today
+        offset = (datetime.fromisoformat(today) - datetime.fromisoformat(plan_start)).days
+        for day in future:
+            day['day'] += offset
+        
+        current = {day['date']: day for day in schedule if day['date'] >= today}
+        changed = [day for day in future if current.get(day['date']) != day]
+        future_dates = {day['date'] for day in future}
+        removed = sorted(date for date in current if date not in future_dates)
+        
+        past = [day for day in schedule if day['date'] < today]
+        return {
+            'days': changed,
+            'removed_dates': removed,
+            'schedule': past + future,
+            'remaining_hours': round(sum(t['estimated_hours'] for t in remainder), 1)
+        }
     
     @staticmethod
     def _generate_tasks(topic: Dict) -> List[str]:
@@ -144,10 +675,15 @@ class PlanGenerator:
                 'total_hours': 0
             }
         
-        completed = sum(1 for p in progress_records if p.get('status') == 'completed')
-        in_progress = sum(1 for p in progress_records if p.get('status') == 'in_progress')
-        not_started = sum(1 for p in progress_records if p.get('status') == 'not_started')
-        total_hours = sum(float(p.get('hours_spent', 0)) for p in progress_records)
+        # One pass over the records
+        statuses = Counter()
+        total_hours = 0.0
+        for p in progress_records:
+            statuses[p.get('status')] += 1
+            total_hours += float(p.get('hours_spent') or 0)
+        completed = statuses['completed']
+        in_progress = statuses['in_progress']
+        not_started = statuses['not_started']
         
         return {
             'total_topics': total,
@@ -0,0 +1,147 @@
+import hashlib
+import random
+import re
+from typing import Dict, List, Optional, Set
+
+from services.item_stats import item_stats
+
+
+def content_hash(question: Dict) -> str:
+    """
+    Identity of a question's content
+
+    Case, punctuation, whitespace and option order are ignored, so the
+    same question generated twice (or with shuffled options) hashes the
+    same.
+    """
+    def norm(text) -> str:
+        return re.sub(r'\s+', ' ', re.sub(r'[^\w\s]', ' ', str(text or '').lower())).strip()
+
+    options = sorted(norm(o) for o in question.get('options') or [])
+    return hashlib.sha1('\x1f'.join([norm(question.get('question'))] + options).encode('utf-8')).hexdigest()
+
+
+def bank_ids(questions: List[Dict]) -> Optional[List[str]]:
+    """Bank ids of a quiz's questions, None when any is not banked (store the quiz inline)"""
+    if questions and all(q.get('id') for q in questions):
+        return [q['id'] for q in questions]
+    return None
+
+
+class Draw:
+    """Questions picked from one topic's bank for one user"""
+
+    def __init__(self, topic_id, unseen: List[Dict], seen: List[Dict], wanted: int, ability: Optional[float] = None):
+        self.topic_id = topic_id
+        self.unseen = unseen
+        self.seen = seen
+        self.wanted = wanted
+        self.ability = ability  # latest quiz score on the topic, None if never quizzed
+
+    @property
+    def short(self) -> bool:
+        """The bank lacks enough questions this user has not had yet"""
+        return len(self.unseen) < self.wanted
+
+
+class QuestionBank:
+    """
+    Per-topic bank of quiz questions, deduplicated by content hash.
+
+    Quizzes reference bank rows (quizzes.question_ids) instead of
+    storing their questions inline. A new quiz is picked from the
+    questions of the topic the user has not been given yet, matched to
+    the user's level by item statistics; the model is only asked for
+    more when there are too few of those, and whatever it returns is
+    added to the bank for everyone after.
+    """
+
+    @staticmethod
+    def _as_question(row: Dict) -> Dict:
+        return dict(row['question'], id=row['id'])
+
+    def draw(self, user_id, topic_ids: List, wanted: int) -> Dict[str, Draw]:
+        """Unseen and seen bank questions of each topic, two queries in all"""
+        from database import db
+        from services.review_scheduler import review_scheduler
+
+        bank: Dict[str, List[Dict]] = {str(t): [] for t in topic_ids}
+        for row in db.get_bank_questions(topic_ids):
+            bank.setdefault(str(row['topic_id']), []).append(row)
+        seen: Dict[str, Set[str]] = db.get_seen_question_ids(user_id, topic_ids)
+        scores = review_scheduler.topic_scores(user_id)
+
+        draws = {}
+        for topic_id in topic_ids:
+            rows = bank.get(str(topic_id), [])
+            had = seen.get(str(topic_id), set())
+            draws[str(topic_id)] = Draw(
+                topic_id,
+                [r for r in rows if str(r['id']) not in had],
+                [r for r in rows if str(r['id']) in had],
+                wanted,
+                scores.get(str(topic_id))
+            )
+        return draws
+
+    def add(self, topic_id, questions: List[Dict]) -> List[Dict]:
+        """
+        Store generated questions in a topic's bank
+
+        Returns:
+            Bank rows of the questions, in order and without duplicates
+            (a question already in the bank comes back as its existing
+            row), or None if the bank could not be written
+        """
+        from database import db
+
+        rows = self._rows(topic_id, questions)
+        if not rows:
+            return []
+        saved = db.save_bank_questions(list(rows.values()))
+        if not saved:
+            return None
+        saved = {r['content_hash']: r for r in saved}
+        return [saved[digest] for digest in rows if digest in saved]
+
+    @staticmethod
+    def _rows(topic_id, questions: List[Dict]) -> Dict[str, Dict]:
+        """Bank rows of well-formed questions by content hash, first copy of each"""
+        rows = {}
+        for question in questions:
+            if not question.get('question') or not question.get('options'):
+                continue
+            digest = content_hash(question)
+            if digest not in rows:
+                item = {k: question[k] for k in ('question', 'options', 'correct', 'explanation') if k in question}
+                rows[digest] = {'topic_id': topic_id, 'content_hash': digest, 'question': item}
+        return rows
+
+    def assemble(self, draw: Draw, generated: Optional[List[Dict]] = None, rng: random.Random = None) -> List[Dict]:
+        """
+        A quiz's questions: the unseen bank questions best matched to the
+        user's level (see ItemStatsEngine.choose), topped up with freshly
+        generated ones and, if still short, with questions the user has
+        seen before
+
+        Each question carries its bank id, except when the bank could not
+        be written: the generated questions are then used as they are
+        (see bank_ids), so a paid model call is never thrown away.
+        """
+        rng = rng or random
+        picked = item_stats.choose(draw.topic_id, draw.unseen, draw.wanted, draw.ability, rng)
+        if len(picked) < draw.wanted and generated:
+            added = self.add(draw.topic_id, generated)
+            if added is None:
+                unbanked = [row['question'] for row in self._rows(draw.topic_id, generated).values()]
+                return [self._as_question(r) for r in picked] + unbanked[:draw.wanted - len(picked)]
+            have = {str(r['id']) for r in picked} | {str(r['id']) for r in draw.seen}
+            fresh = [r for r in added if str(r['id']) not in have]
+            picked += fresh[:draw.wanted - len(picked)]
+        if len(picked) < draw.wanted and draw.seen:
+            picked += item_stats.choose(draw.topic_id, draw.seen, draw.wanted - len(picked), draw.ability, rng)
+        return [self._as_question(r) for r in picked]
+
+
+# Global instance
+question_bank = QuestionBank()
@@ -0,0 +1,312 @@
+import hashlib
+import random
+import re
+import threading
+import zlib
+from collections import Counter, OrderedDict
+from typing import List, Dict, Optional
+
+import numpy as np
+
+from utils import metrics
+
+STOPWORDS = {
+    'about', 'above', 'after', 'again', 'against', 'also', 'among', 'an', 'and', 'another', 'any',
+    'are', 'as', 'at', 'based', 'be', 'been', 'before', 'being', 'below', 'between', 'both', 'but',
+    'by', 'can', 'chapter', 'could', 'course', 'does', 'doing', 'down', 'during', 'each', 'either',
+    'etc', 'every', 'few', 'for', 'from', 'further', 'given', 'has', 'have', 'having', 'here', 'how',
+    'include', 'includes', 'including', 'into', 'introduction', 'its', 'itself', 'just', 'lesson',
+    'like', 'made', 'make', 'many', 'marks', 'may', 'might', 'module', 'more', 'most', 'much', 'must',
+    'need', 'not', 'now', 'of', 'off', 'once', 'only', 'other', 'otherwise', 'our', 'out', 'over',
+    'own', 'part', 'same', 'section', 'several', 'shall', 'should', 'since', 'some', 'such', 'than',
+    'that', 'the', 'their', 'them', 'then', 'there', 'these', 'they', 'this', 'those', 'through',
+    'topic', 'topics', 'under', 'unit', 'until', 'upon', 'used', 'uses', 'using', 'very', 'was',
+    'well', 'were', 'what', 'when', 'where', 'which', 'while', 'who', 'whom', 'whose', 'why', 'will',
+    'with', 'within', 'without', 'would', 'week', 'your',
+    # Short function words
+    'a', 'am', 'if', 'in', 'is', 'it', 'no', 'on', 'or', 'so', 'to', 'up', 'we', 'all', 'its',
+    # Generic verbs and fillers that make poor answers
+    'apply', 'around', 'arranged', 'basic', 'compute', 'computed', 'computes', 'connects',
+    'consists', 'define', 'defined', 'describe', 'describes', 'explain', 'explores', 'finds',
+    'following', 'important', 'measures', 'possible', 'reduces', 'relates', 'solve', 'study',
+    'understand', 'various', 'visits'
+}
+
+# Sentence pieces longer than this are cut into windows
+MAX_SENTENCE_WORDS = 40
+WINDOW_WORDS = 25
+# Key terms kept per text
+MAX_TERMS = 150
+SHAPE_DIM = 256
+
+WORD_RE = re.compile(r"[A-Za-z][A-Za-z\-]*")
+DEFINITION_RE = re.compile(
+    r"^(?P<term>[A-Za-z][\w\- ]{2,40}?)\s+(?P<verb>is defined as|refers to|means|is|are)\s+(?P<definition>.{15,})$"
+)
+
+
+class _TextIndex:
+    """Sentences, key terms and term similarity for one syllabus text"""
+
+    def __init__(self, text: str):
+        self.sentences = self._segment(text)
+        sentence_words = [
+            [w.lower() for w in WORD_RE.findall(s)]
+            for s in self.sentences
+        ]
+
+        # Candidate terms: content unigrams and bigrams
+        term_counts = Counter()
+        term_sentences: Dict[str, set] = {}
+        for sid, words in enumerate(sentence_words):
+            candidates = [
+                w for w in words
+                if len(w) >= 4 and w not in STOPWORDS and not w.endswith('ly')
+            ]
+            candidates += [
+                f"{a} {b}" for a, b in zip(words, words[1:])
+                if a not in STOPWORDS and b not in STOPWORDS and len(a) >= 3 and len(b) >= 3
+            ]
+            term_counts.update(candidates)
+            for term in candidates:
+                term_sentences.setdefault(term, set()).add(sid)
+
+        num_sentences = max(1, len(self.sentences))
+        # A bigram is only a term if the phrase repeats
+        terms = [t for t, c in term_counts.items() if c >= 2 or ' ' not in t]
+        if terms:
+            tf = np.fromiter((term_counts[t] for t in terms), dtype=np.float32, count=len(terms))
+            df = np.fromiter((len(term_sentences[t]) for t in terms), dtype=np.float32, count=len(terms))
+            is_bigram = np.fromiter((' ' in t for t in terms), dtype=bool, count=len(terms))
+            idf = np.log((1 + num_sentences) / (1 + df)) + 1.0
+            scores = np.log1p(tf) * idf * np.where(is_bigram, 1.5, 1.0)
+            # Terms seen once in a long text are usually noise
+            scores[(tf < 2) & (num_sentences > 20)] *= 0.5
+            top = np.argsort(-scores, kind='stable')[:MAX_TERMS]
+            self.terms = [terms[i] for i in top]
+            self.term_scores = scores[top]
+        else:
+            self.terms = []
+            self.term_scores = np.zeros(0, dtype=np.float32)
+
+        self.term_index = {t: i for i, t in enumerate(self.terms)}
+        self.sentence_terms: List[List[int]] = [[] for _ in self.sentences]
+        for i, term in enumerate(self.terms):
+            for sid in term_sentences[term]:
+                self.sentence_terms[sid].append(i)
+
+        self.similarity = self._similarity_matrix(term_sentences, num_sentences)
+
+    @staticmethod
+    def _segment(text: str) -> List[str]:
+        """Split into sentence-sized pieces"""
+        pieces = re.split(r'(?<=[.!?;])\s+|\s+(?=(?:Unit|Chapter|Module|Topic)\s+\d)', text or '')
+        sentences = []
+        for piece in pieces:
+            words = piece.strip().split()
+            if len(words) < 6:
+                continue
+            if len(words) <= MAX_SENTENCE_WORDS:
+                sentences.append(' '.join(words))
+                continue
+            for start in range(0, len(words) - 5, WINDOW_WORDS):
+                sentences.append(' '.join(words[start:start + WINDOW_WORDS]))
+        return sentences
+
+    def _similarity_matrix(self, term_sentences: Dict[str, set], num_sentences: int) -> np.ndarray:
+        """
+        Term x term similarity, blending shared context (sentences the
+        terms co-occur in) with surface shape (character trigrams).
+        """
+        k = len(self.terms)
+        if k == 0:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        context = np.zeros((k, num_sentences), dtype=np.float32)
+        shape = np.zeros((k, SHAPE_DIM), dtype=np.float32)
+        for i, term in enumerate(self.terms):
+            context[i, list(term_sentences[term])] = 1.0
+            padded = f" {term} "
+            for j in range(len(padded) - 2):
+                shape[i, zlib.crc32(padded[j:j + 3].encode()) % SHAPE_DIM] += 1.0
+
+        context /= np.linalg.norm(context, axis=1, keepdims=True) + 1e-9
+        shape /= np.linalg.norm(shape, axis=1, keepdims=True) + 1e-9
+        self.shape_similarity = shape @ shape.T
+        return 0.6 * (context @ context.T) + 0.4 * self.shape_similarity
+
+
+class QuizGenerator:
+    """
+    Offline quiz engine for free mode.
+
+    Builds cloze ("fill in the blank") and definition questions from a
+    syllabus text with no model call. Key terms are scored with TF-IDF
+    over sentences and distractors are the terms most similar to the
+    answer (shared context and spelling), so wrong options come from the
+    same syllabus. Text indexes are cached per text.
+    """
+
+    def __init__(self, cache_size: int = 32):
+        self._cache: "OrderedDict[str, _TextIndex]" = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def _index(self, text: str) -> _TextIndex:
+        key = hashlib.sha1(text.encode('utf-8', 'ignore')).hexdigest()
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                metrics.CACHE_LOOKUPS.labels('quiz_text_index', 'hit').inc()
+                return self._cache[key]
+
+        metrics.CACHE_LOOKUPS.labels('quiz_text_index', 'miss').inc()
+        index = _TextIndex(text)
+
+        with self._lock:
+            self._cache[key] = index
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return index
+
+    def generate(self, text: str, topic_name: str, num_questions: int = 10, seed: Optional[int] = None) -> List[Dict]:
+        """
+        Generate up to num_questions MCQs from text, focused on a topic
+
+        Args:
+            text: Syllabus / upload extracted_text
+            topic_name: Topic the quiz is for; sentences mentioning it come first
+            num_questions: Maximum questions to return
+            seed: Optional RNG seed for reproducible quizzes
+
+        Returns:
+            List of {question, options, correct, explanation}; may be
+            shorter than num_questions if the text is too thin
+        """
+        if not text or num_questions <= 0:
+            return []
+
+        index = self._index(text)
+        if len(index.terms) < 4:
+            return []
+
+        rng = random.Random(seed)
+        questions = []
+        used_terms = set()
+
+        for sid in self._rank_sentences(index, topic_name):
+            if len(questions) >= num_questions:
+                break
+            question = self._definition_question(index, sid, used_terms, rng) \
+                or self._cloze_question(index, sid, used_terms, rng)
+            if question:
+                questions.append(question)
+
+        return questions
+
+    @staticmethod
+    def _rank_sentences(index: _TextIndex, topic_name: str) -> List[int]:
+        """Sentence ids, topic-relevant and term-rich first"""
+        topic_words = {
+            w.lower() for w in WORD_RE.findall(topic_name or '')
+            if w.lower() not in STOPWORDS
+        }
+        ranked = []
+        for sid, term_ids in enumerate(index.sentence_terms):
+            if not term_ids:
+                continue
+            sentence = index.sentences[sid].lower()
+            overlap = sum(1 for w in topic_words if w in sentence)
+            richness = float(index.term_scores[term_ids].max())
+            ranked.append((-overlap, -richness, sid))
+        ranked.sort()
+        return [sid for _, _, sid in ranked]
+
+    def _distractors(self, index: _TextIndex, answer: int, exclude: List[int], rng: random.Random) -> List[str]:
+        """Three wrong options similar to the answer term"""
+        sim = index.similarity[answer].copy()
+        sim[answer] = -np.inf
+        sim[exclude] = -np.inf
+        # Near-spellings ("matrix" / "matrices") make ambiguous options
+        sim[index.shape_similarity[answer] > 0.75] = -np.inf
+        # Key terms make more convincing options than incidental words
+        sim += 0.3 * index.term_scores / (index.term_scores.max() + 1e-9)
+        answer_text = index.terms[answer]
+        answer_words = answer_text.count(' ')
+
+        candidates = [
+            int(j) for j in np.argsort(-sim)[:12]
+            if np.isfinite(sim[j])
+            and answer_text not in index.terms[j]
+            and index.terms[j] not in answer_text
+        ]
+        # Prefer the same number of words as the answer
+        candidates.sort(key=lambda j: index.terms[j].count(' ') != answer_words)
+        pool = candidates[:6]
+        if len(pool) < 3:
+            return []
+        return [index.terms[j] for j in rng.sample(pool, 3)]
+
+    def _build(self, question: str, answer: str, distractors: List[str], explanation: str, rng: random.Random) -> Dict:
+        options = [answer] + distractors
+        rng.shuffle(options)
+        return {
+            'question': question,
+            'options': options,
+            'correct': options.index(answer),
+            'explanation': explanation
+        }
+
+    def _cloze_question(self, index: _TextIndex, sid: int, used_terms: set, rng: random.Random) -> Optional[Dict]:
+        sentence = index.sentences[sid]
+        term_ids = sorted(index.sentence_terms[sid], key=lambda i: -index.term_scores[i])
+
+        for answer in term_ids:
+            if answer in used_terms:
+                continue
+            pattern = re.compile(r'\b' + re.escape(index.terms[answer]).replace(r'\ ', r'\s+') + r'\b', re.IGNORECASE)
+            if not pattern.search(sentence):
+                continue
+            distractors = self._distractors(index, answer, term_ids, rng)
+            if not distractors:
+                continue
+
+            used_terms.add(answer)
+            blanked = pattern.sub('_____', sentence)
+            return self._build(
+                f'Fill in the blank: {blanked}',
+                index.terms[answer],
+                distractors,
+                f'The syllabus states: "{sentence}"',
+                rng
+            )
+        return None
+
+    def _definition_question(self, index: _TextIndex, sid: int, used_terms: set, rng: random.Random) -> Optional[Dict]:
+        sentence = index.sentences[sid].rstrip('.;')
+        match = DEFINITION_RE.match(sentence)
+        if not match:
+            return None
+
+        term = re.sub(r'^(?:a|an|the)\s+', '', match.group('term').strip(), flags=re.IGNORECASE)
+        answer = index.term_index.get(term.lower())
+        if answer is None or answer in used_terms:
+            return None
+        distractors = self._distractors(index, answer, index.sentence_terms[sid], rng)
+        if not distractors:
+            return None
+
+        used_terms.add(answer)
+        definition = match.group('definition')
+        verb = 'is' if match.group('verb') == 'are' else match.group('verb')
+        return self._build(
+            f'Which term {verb} {definition}?',
+            index.terms[answer],
+            distractors,
+            f'{match.group("term").strip()} {match.group("verb")} {definition}.',
+            rng
+        )
+
+
+# Global instance
+quiz_generator = QuizGenerator()
@@ -0,0 +1,218 @@
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from utils import metrics
+
+# SM-2 defaults
+INITIAL_EASE = 2.5
+MIN_EASE = 1.3
+
+# Per-worker queues are reloaded after this many seconds, so a submit
+# handled by another gunicorn worker shows up here too
+QUEUE_TTL_SECONDS = 60
+
+
+def parse_time(value) -> datetime:
+    """Timestamp from the database (ISO string) as an aware datetime"""
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def next_state(state: Optional[Dict], score: int, total: int, now: datetime) -> Dict:
+    """
+    SM-2 update of one topic's review state from a quiz result
+
+    The score fraction maps to SM-2 quality 0-5. Quality below 3 resets
+    the topic to a one-day interval; otherwise the interval grows
+    1 -> 6 -> interval x ease days, and ease moves with the quality.
+    """
+    state = state or {}
+    quality = round(5 * score / total) if total else 0
+    ease = float(state.get('ease') or INITIAL_EASE)
+    repetitions = int(state.get('repetitions') or 0)
+    interval = float(state.get('interval_days') or 0)
+
+    if quality < 3:
+        repetitions = 0
+        interval = 1.0
+    else:
+        repetitions += 1
+        if repetitions == 1:
+            interval = 1.0
+        elif repetitions == 2:
+            interval = 6.0
+        else:
+            interval = round(interval * ease, 1)
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+
+    return {
+        'ease': round(ease, 3),
+        'repetitions': repetitions,
+        'interval_days': interval,
+        'due_at': (now + timedelta(days=interval)).isoformat(),
+        'last_score': round(score / total, 3) if total else 0,
+        'last_reviewed_at': now.isoformat(),
+        'reviews': int(state.get('reviews') or 0) + 1
+    }
+
+
+class _ReviewQueue:
+    """
+    One user's topics in a min-heap keyed by due time.
+
+    Updates push a new entry and leave the old one in place; stale
+    entries are recognised by their due time and dropped when popped,
+    so every update is O(log n).
+    """
+
+    def __init__(self, states: List[Dict]):
+        self.loaded_at = time.monotonic()
+        self.states = {s['topic_id']: dict(s, due_ts=parse_time(s['due_at']).timestamp()) for s in states}
+        self.heap = [(s['due_ts'], topic_id) for topic_id, s in self.states.items()]
+        heapq.heapify(self.heap)
+
+    def update(self, topic_id, state: Dict):
+        state = dict(state, topic_id=topic_id, due_ts=parse_time(state['due_at']).timestamp())
+        self.states[topic_id] = state
+        heapq.heappush(self.heap, (state['due_ts'], topic_id))
+        # Keep stale entries from piling up
+        if len(self.heap) > 2 * len(self.states) + 16:
+            self.heap = [(s['due_ts'], t) for t, s in self.states.items()]
+            heapq.heapify(self.heap)
+
+    def due(self, now_ts: float, limit: int) -> List[Dict]:
+        """Up to `limit` topics due by now_ts, most overdue first"""
+        taken = []
+        while self.heap and len(taken) < limit and self.heap[0][0] <= now_ts:
+            entry = heapq.heappop(self.heap)
+            state = self.states.get(entry[1])
+            if state is None or state['due_ts'] != entry[0]:
+                continue  # stale
+            taken.append(entry)
+        # Still due until reviewed again
+        for entry in taken:
+            heapq.heappush(self.heap, entry)
+        return [self.states[topic_id] for _, topic_id in taken]
+
+    def next_due(self) -> Optional[Dict]:
+        while self.heap:
+            due_ts, topic_id = self.heap[0]
+            state = self.states.get(topic_id)
+            if state is not None and state['due_ts'] == due_ts:
+                return state
+            heapq.heappop(self.heap)
+        return None
+
+
+class ReviewScheduler:
+    """
+    Spaced-repetition review scheduling from quiz results.
+
+    review_state rows (one per user and topic) are the source of truth
+    and are updated on every quiz submit. Each worker keeps recently
+    used users' queues in memory (LRU), so "what should I review now"
+    is a heap lookup instead of a scan of the user's attempt history.
+    """
+
+    def __init__(self, max_users: int = 1000):
+        self._queues: "OrderedDict[str, _ReviewQueue]" = OrderedDict()
+        self._max_users = max_users
+        self._lock = threading.Lock()
+
+    def _queue(self, user_id) -> _ReviewQueue:
+        with self._lock:
+            queue = self._queues.get(user_id)
+            if queue and time.monotonic() - queue.loaded_at < QUEUE_TTL_SECONDS:
+                self._queues.move_to_end(user_id)
+                metrics.CACHE_LOOKUPS.labels('review_queue', 'hit').inc()
+                return queue
+
+        metrics.CACHE_LOOKUPS.labels('review_queue', 'miss').inc()
+        from database import db
+        states = db.get_review_states(user_id)
+        if not states:
+            states = self._backfill(user_id)
+        queue = _ReviewQueue(states)
+
+        with self._lock:
+            self._queues[user_id] = queue
+            self._queues.move_to_end(user_id)
+            while len(self._queues) > self._max_users:
+                self._queues.popitem(last=False)
+        return queue
+
+    @staticmethod
+    def _backfill(user_id) -> List[Dict]:
+        """One-time replay of attempt history for users from before review_state"""
+        from database import db
+        attempts = db.get_attempt_history(user_id)
+        states: Dict = {}
+        for attempt in attempts:
+            topic_id = (attempt.get('quizzes') or {}).get('topic_id')
+            if not topic_id:
+                continue
+            states[topic_id] = next_state(
+                states.get(topic_id),
+                attempt.get('score') or 0,
+                attempt.get('total_questions') or 0,
+                parse_time(attempt['completed_at'])
+            )
+        rows = [dict(state, user_id=user_id, topic_id=topic_id) for topic_id, state in states.items()]
+        if rows:
+            db.upsert_review_states(rows)
+        return rows
+
+    def record_result(self, user_id, topic_id, score: int, total: int, now: Optional[datetime] = None) -> Optional[Dict]:
+        """Update a topic's review state after a quiz submit"""
+        from database import db
+        now = now or datetime.now(timezone.utc)
+
+        # Always from the database: the cached queue may predate a submit
+        # handled by another worker, and writing on top of it would lose it
+        current = db.get_review_state(user_id, topic_id)
+
+        state = next_state(current, score, total, now)
+        saved = db.upsert_review_states([dict(state, user_id=user_id, topic_id=topic_id)])
+        if not saved:
+            return None
+
+        with self._lock:
+            queue = self._queues.get(user_id)
+            if queue:
+                queue.update(topic_id, state)
+        return state
+
+    def topic_scores(self, user_id) -> Dict[str, float]:
+        """Latest quiz score (0-1) of every topic the user has been quizzed on"""
+        queue = self._queue(user_id)
+        return {str(topic_id): float(s.get('last_score') or 0) for topic_id, s in queue.states.items()}
+
+    def due_reviews(self, user_id, limit: int = 10, now: Optional[datetime] = None) -> Dict:
+        """
+        Topics due for review now
+
+        Returns:
+            { due: [state...], next_due_at } where next_due_at is the
+            earliest due time overall (may be in the future)
+        """
+        queue = self._queue(user_id)
+        now_ts = (now or datetime.now(timezone.utc)).timestamp()
+        with self._lock:
+            due = queue.due(now_ts, limit)
+            upcoming = queue.next_due()
+        return {
+            'due': [{k: v for k, v in state.items() if k != 'due_ts'} for state in due],
+            'next_due_at': upcoming['due_at'] if upcoming else None,
+            'tracked_topics': len(queue.states)
+        }
+
+
+# Global instance
+review_scheduler = ReviewScheduler()
@@ -0,0 +1,149 @@
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+
+def _day(value) -> str:
+    """Date part of a timestamp from the database"""
+    return str(value)[:10]
+
+
+class RollupService:
+    """
+    Per-user, per-day analytics rollups (daily_rollups table).
+
+    Writes keep the rollups current (see SupabaseDB.bump_daily_rollup:
+    every quiz attempt and progress change adds to the day's row), so
+    charts read one small row per day instead of raw history. backfill
+    and compact rebuild rows from the source tables for history that
+    predates the rollups or drifted.
+    """
+
+    @staticmethod
+    def series(rows: List[Dict], from_date: date, to_date: date) -> Dict:
+        """
+        A zero-filled daily series from rollup rows
+
+        Returns:
+            { days: [{ date, quizzes, avg_score, hours, topics_completed }],
+            totals: { quizzes, avg_score, hours, topics_completed } }
+        """
+        by_day = {_day(row['day']): row for row in rows}
+        days = []
+        quizzes = topics_completed = 0
+        score_sum = hours = 0.0
+        current = from_date
+        while current <= to_date:
+            row = by_day.get(current.isoformat(), {})
+            taken = int(row.get('quizzes_taken') or 0)
+            day_score = float(row.get('score_sum') or 0)
+            day_hours = float(row.get('hours_logged') or 0)
+            completed = int(row.get('topics_completed') or 0)
+            days.append({
+                'date': current.isoformat(),
+                'quizzes': taken,
+                'avg_score': round(day_score / taken, 1) if taken else None,
+                'hours': round(day_hours, 2),
+                'topics_completed': completed
+            })
+            quizzes += taken
+            score_sum += day_score
+            hours += day_hours
+            topics_completed += completed
+            current += timedelta(days=1)
+        return {
+            'days': days,
+            'totals': {
+                'quizzes': quizzes,
+                'avg_score': round(score_sum / quizzes, 1) if quizzes else None,
+                'hours': round(hours, 2),
+                'topics_completed': topics_completed
+            }
+        }
+
+    @staticmethod
+    def _quiz_days(attempts: List[Dict], since: Optional[str]) -> Dict[str, Dict]:
+        """quizzes_taken and score_sum per day from attempt rows"""
+        days: Dict[str, Dict] = {}
+        for attempt in attempts:
+            day = _day(attempt.get('completed_at'))
+            if not attempt.get('total_questions') or (since and day < since):
+                continue
+            row = days.setdefault(day, {'quizzes_taken': 0, 'score_sum': 0.0})
+            row['quizzes_taken'] += 1
+            row['score_sum'] += round(attempt['score'] * 100 / attempt['total_questions'], 2)
+        return days
+
+    def backfill(self, user_id, since: Optional[str] = None) -> int:
+        """
+        Rebuild a user's rollups from quiz_attempts and progress
+
+        Quiz columns are exact. Progress only keeps running totals, so
+        each topic's hours (and its completion) are credited to the day
+        it was last updated. Rows from `since` on are replaced.
+
+        Returns:
+            Number of days written
+        """
+        from database import db
+        from database.supabase_client import _today
+
+        days = {
+            day: dict(row, hours_logged=0.0, topics_completed=0)
+            for day, row in self._quiz_days(db.get_attempt_history(user_id), since).items()
+        }
+        for record in db.get_progress_by_user(user_id):
+            day = _day(record.get('last_updated') or _today())
+            if since and day < since:
+                continue
+            row = days.setdefault(day, {'quizzes_taken': 0, 'score_sum': 0.0, 'hours_logged': 0.0, 'topics_completed': 0})
+            row['hours_logged'] += float(record.get('hours_spent') or 0)
+            row['topics_completed'] += int(record.get('status') == 'completed')
+
+        existing = db.get_daily_rollups(user_id, since or '1970-01-01', '9999-12-31')
+        db.delete_daily_rollups(user_id, [_day(r['day']) for r in existing if _day(r['day']) not in days])
+        db.save_daily_rollups([dict(row, user_id=user_id, day=day) for day, row in days.items()])
+        return len(days)
+
+    def compact(self, user_id, days: int = 35) -> int:
+        """
+        Re-derive the last `days` days' quiz columns from quiz_attempts
+        and drop rows that are all zero
+
+        Logged hours come only from incremental updates and are kept.
+
+        Returns:
+            Number of rows rewritten or removed
+        """
+        from database import db
+        from database.supabase_client import _today
+
+        # UTC days, like the rows bump_daily_rollup writes
+        since = (date.fromisoformat(_today()) - timedelta(days=days)).isoformat()
+        quiz_days = self._quiz_days(db.get_attempt_history(user_id), since)
+        stored = {_day(r['day']): r for r in db.get_daily_rollups(user_id, since, '9999-12-31')}
+
+        rewrite, empty = [], []
+        for day in sorted(set(stored) | set(quiz_days)):
+            row = stored.get(day, {})
+            quiz = quiz_days.get(day, {'quizzes_taken': 0, 'score_sum': 0.0})
+            merged = {
+                'user_id': user_id,
+                'day': day,
+                'quizzes_taken': quiz['quizzes_taken'],
+                'score_sum': round(quiz['score_sum'], 2),
+                'hours_logged': float(row.get('hours_logged') or 0),
+                'topics_completed': int(row.get('topics_completed') or 0)
+            }
+            if not (merged['quizzes_taken'] or merged['hours_logged'] or merged['topics_completed']):
+                if day in stored:
+                    empty.append(day)
+            elif (int(row.get('quizzes_taken') or 0), round(float(row.get('score_sum') or 0), 2)) != (merged['quizzes_taken'], merged['score_sum']):
+                rewrite.append(merged)
+
+        db.save_daily_rollups(rewrite)
+        db.delete_daily_rollups(user_id, empty)
+        return len(rewrite) + len(empty)
+
+
+# Global instance
+rollups = RollupService()
@@ -0,0 +1,240 @@
+import re
+import zlib
+from typing import List, Dict, Optional
+
+import numpy as np
+
+# Leading "Unit 3:", "Chapter IV -", "2.1" etc. carry no topic meaning
+PREFIX_RE = re.compile(
+    r'^\s*(?:(?:topic|unit|chapter|module|lesson|section|part|week)\b\s*(?:[\divxlc]+\b\s*[:\-.)]*|[:\-.)]+)\s*|[\divx]+(?:\.\d+)*[.)]\s+)+',
+    re.IGNORECASE
+)
+
+# Numbers and roman numerals (i-xxxix): "Calculus I" and "Calculus II"
+# differ only in one, so they must match exactly
+NUMERAL_RE = re.compile(r'^(?:\d+|(?=[ivx])x{0,3}(?:ix|iv|v?i{0,3}))$')
+
+# Smallest prime above 2^32, so crc32 values stay distinct under the hash
+HASH_PRIME = 4294967311
+
+
+class TopicDeduplicator:
+    """
+    Near-duplicate topic detection with MinHash + LSH.
+
+    Names are normalized (numbering prefixes, case and punctuation
+    removed) and turned into character 3-gram shingles. Each name gets a
+    MinHash signature; LSH banding only compares names that share a
+    band, so merging n names costs roughly O(n) instead of O(n^2).
+    Candidate pairs are confirmed with the exact shingle Jaccard, and
+    only merged when they agree on their numerals, their last word and
+    (if both have one) their numbering prefix, none of which 3-gram
+    overlap can tell apart.
+    """
+
+    def __init__(self, num_perm: int = 60, bands: int = 20, threshold: float = 0.8, seed: int = 1):
+        assert num_perm % bands == 0
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+
+        rng = np.random.default_rng(seed)
+        # a < 2^31 and h < 2^32 keep a * h + b inside uint64
+        self._a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    @staticmethod
+    def normalize(name: str) -> str:
+        """
+        Canonical form used for comparison
+
+        A numbering keyword is only dropped when a number or separator
+        follows it, never from the start of an ordinary word:
+
+        >>> TopicDeduplicator.normalize('Unit 3: Limits')
+        'limits'
+        >>> TopicDeduplicator.normalize('Chapter IV - Integrals')
+        'integrals'
+        >>> TopicDeduplicator.normalize('2.1) Vector Spaces')
+        'vector spaces'
+        >>> TopicDeduplicator.normalize('Partial Derivatives')
+        'partial derivatives'
+        >>> TopicDeduplicator.normalize('Unitary Matrices')
+        'unitary matrices'
+        >>> TopicDeduplicator.normalize('Topics in Graph Theory')
+        'topics in graph theory'
+        >>> TopicDeduplicator.normalize('Weekly Review')
+        'weekly review'
+        >>> TopicDeduplicator.normalize('Unit vectors')
+        'unit vectors'
+        """
+        name = PREFIX_RE.sub('', name or '')
+        name = re.sub(r'[^\w\s]', ' ', name.lower())
+        return re.sub(r'\s+', ' ', name).strip()
+
+    @staticmethod
+    def _words(text: str) -> List[str]:
+        return re.sub(r'[^\w\s]', ' ', text.lower()).split()
+
+    @staticmethod
+    def _stem(word: str) -> str:
+        return word[:-1] if len(word) > 3 and word.endswith('s') else word
+
+    def features(self, name: str) -> tuple:
+        """
+        Parts of a name that must agree for it to duplicate another:
+        numbering prefix numerals, numerals in the name itself, the
+        name without them (spaces dropped) and its last word
+        """
+        prefix = PREFIX_RE.match(name or '')
+        label = tuple(w for w in self._words(prefix.group(0)) if NUMERAL_RE.match(w)) if prefix else ()
+        words = self.normalize(name).split()
+        numerals = tuple(w for w in words if NUMERAL_RE.match(w))
+        rest = [w for w in words if not NUMERAL_RE.match(w)]
+        return label, numerals, self._stem(''.join(rest)), self._stem(rest[-1]) if rest else ''
+
+    @staticmethod
+    def agree(a: tuple, b: tuple) -> bool:
+        """Whether two names' features (see features) allow a merge"""
+        label_a, numerals_a, joined_a, tail_a = a
+        label_b, numerals_b, joined_b, tail_b = b
+        if label_a and label_b and label_a != label_b:
+            return False
+        # "Eigen values" ends like "Eigenvalues"; "Data Structures Lab"
+        # does not end like "Data Structures"
+        return numerals_a == numerals_b and (joined_a.endswith(tail_b) or joined_b.endswith(tail_a))
+
+    @staticmethod
+    def shingles(normalized: str, k: int = 3) -> set:
+        # Spaces dropped so "Eigen values" matches "Eigenvalues"
+        padded = f" {normalized.replace(' ', '')} "
+        if len(padded) <= k:
+            return {padded}
+        return {padded[i:i + k] for i in range(len(padded) - k + 1)}
+
+    def signature(self, shingle_set: set) -> np.ndarray:
+        """MinHash signature of a shingle set"""
+        hashes = np.fromiter((zlib.crc32(s.encode()) for s in shingle_set), dtype=np.uint64, count=len(shingle_set))
+        # (a * h + b) mod p for every permutation at once
+        permuted = (np.outer(self._a, hashes) + self._b[:, None]) % HASH_PRIME
+        return permuted.min(axis=1)
+
+    def clusters(self, names: List[str]) -> List[int]:
+        """
+        Cluster near-duplicate names
+
+        Returns:
+            For each name, the index of the first name in its cluster
+
+        Names differing only in a numeral, a trailing word or their
+        numbering stay apart:
+
+        >>> dedup = TopicDeduplicator()
+        >>> dedup.clusters(['Calculus I', 'Calculus II'])
+        [0, 1]
+        >>> dedup.clusters(['Organic Chemistry I', 'Organic Chemistry II'])
+        [0, 1]
+        >>> dedup.clusters(['Data Structures', 'Data Structures Lab'])
+        [0, 1]
+        >>> dedup.clusters(['Thermodynamics Part 1', 'Thermodynamics Part 2'])
+        [0, 1]
+        >>> dedup.clusters(['Unit 1: Introduction', 'Unit 2: Introduction'])
+        [0, 1]
+        >>> dedup.clusters(['Unit 3: Limits', 'Limits', 'Eigen values', 'Eigenvalues'])
+        [0, 0, 2, 2]
+        """
+        normalized = [self.normalize(n) for n in names]
+        shingle_sets = [self.shingles(n) for n in normalized]
+        features = [self.features(n) for n in names]
+        parent = list(range(len(names)))
+        # Numbering prefixes seen in each cluster, so "Unit 1: X" and
+        # "Unit 2: X" are not joined through a plain "X"
+        labels = [{f[0]} if f[0] else set() for f in features]
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        def union(i, j):
+            ri, rj = find(i), find(j)
+            if ri == rj or len(labels[ri] | labels[rj]) > 1:
+                return
+            # Keep the earliest name as the representative
+            low, high = min(ri, rj), max(ri, rj)
+            parent[high] = low
+            labels[low] |= labels[high]
+
+        buckets: Dict[tuple, List[int]] = {}
+        exact: Dict[tuple, int] = {}
+        for i, (norm, shingle_set) in enumerate(zip(normalized, shingle_sets)):
+            if not norm:
+                continue
+            if (norm, features[i][0]) in exact:
+                union(exact[(norm, features[i][0])], i)
+                continue
+            exact[(norm, features[i][0])] = i
+
+            sig = self.signature(shingle_set)
+            candidates = set()
+            for band in range(self.bands):
+                key = (band, sig[band * self.rows:(band + 1) * self.rows].tobytes())
+                members = buckets.setdefault(key, [])
+                candidates.update(members)
+                members.append(i)
+
+            for j in candidates:
+                if find(j) == find(i) or not self.agree(features[i], features[j]):
+                    continue
+                other = shingle_sets[j]
+                jaccard = len(shingle_set & other) / len(shingle_set | other)
+                if jaccard >= self.threshold:
+                    union(j, i)
+
+        return [find(i) for i in range(len(names))]
+
+    def dedupe(self, names: List[str]) -> List[str]:
+        """Drop near-duplicate names, keeping the first of each cluster"""
+        roots = self.clusters(names)
+        return [name for i, name in enumerate(names) if roots[i] == i]
+
+    def dedupe_topics(self, topics: List[Dict], key: str = 'name') -> List[Dict]:
+        """
+        Merge near-duplicate topic dicts (e.g. from separate extraction chunks)
+
+        The first topic of each cluster is kept; it takes the longest
+        description and the largest hours estimate of its duplicates.
+        """
+        roots = self.clusters([t.get(key, '') for t in topics])
+        merged: Dict[int, Dict] = {}
+        for i, topic in enumerate(topics):
+            root = roots[i]
+            if root not in merged:
+                merged[root] = dict(topic)
+                continue
+            kept = merged[root]
+            if len(topic.get('description') or '') > len(kept.get('description') or ''):
+                kept['description'] = topic['description']
+            if 'hours' in topic:
+                kept['hours'] = max(float(kept.get('hours') or 0), float(topic['hours']))
+        return [merged[root] for root in sorted(merged)]
+
+    def match_existing(self, new_names: List[str], existing_names: List[str]) -> Dict[int, Optional[int]]:
+        """
+        Map each new name to the existing name it duplicates
+
+        Returns:
+            {new index: existing index or None}
+        """
+        roots = self.clusters(existing_names + new_names)
+        offset = len(existing_names)
+        return {
+            i: roots[offset + i] if roots[offset + i] < offset else None
+            for i in range(len(new_names))
+        }
+
+
+# Global instance
+topic_dedup = TopicDeduplicator()
@@ -0,0 +1,148 @@
+import re
+from typing import List, Dict
+
+import numpy as np
+
+# Words that signal derivations, proofs or quantitative work
+FORMULA_WORDS = {
+    'algorithm', 'algorithms', 'calculate', 'calculation', 'calculus', 'complexity', 'derivation',
+    'derivative', 'derive', 'differential', 'eigenvalue', 'eigenvalues', 'equation', 'equations',
+    'formula', 'formulae', 'formulas', 'function', 'functions', 'integral', 'integration', 'lemma',
+    'matrix', 'matrices', 'numerical', 'probability', 'proof', 'proofs', 'prove', 'theorem',
+    'theorems', 'transform', 'vector', 'vectors'
+}
+HARD_WORDS = ('advanced', 'complex', 'deep')
+EASY_WORDS = ('introduction', 'basics', 'overview', 'fundamentals')
+
+TOKEN_RE = re.compile(r"[A-Za-z0-9]+|[,;:]|[=+^/*<>]")
+
+# Feature weights: span length, subtopics, technical density, formula markers
+FEATURE_WEIGHTS = np.array([0.35, 0.2, 0.25, 0.2])
+DIFFICULTY_MULTIPLIER = {'easy': 0.8, 'medium': 1.0, 'hard': 1.3}
+
+
+class TopicEstimator:
+    """
+    Estimate difficulty and study hours for rule-based topics from the
+    syllabus text itself.
+
+    Each topic's span runs from where its name appears to where the next
+    topic starts. The text is tokenized once into per-token feature flags
+    and prefix sums, so the features of every span (length, subtopic
+    separators, technical-term density, formula markers) are read off in
+    one vectorized pass.
+    """
+
+    @staticmethod
+    def _locate(text_lower: str, names: List[str]) -> np.ndarray:
+        """Character offset of each topic name, -1 if not found"""
+        positions = np.full(len(names), -1, dtype=np.int64)
+        cursor = 0
+        for i, name in enumerate(names):
+            words = re.findall(r'\w+', name.lower())
+            if not words:
+                continue
+            pattern = re.compile(r'\W+'.join(re.escape(w) for w in words))
+            # Topics usually appear in order; search forward first
+            match = pattern.search(text_lower, cursor) or pattern.search(text_lower)
+            if match:
+                positions[i] = match.start()
+                cursor = max(cursor, match.end())
+        return positions
+
+    def features(self, text: str, names: List[str]) -> np.ndarray:
+        """
+        Feature matrix (topics x 4): words, subtopic separators,
+        technical-term density, formula markers per 100 words
+        """
+        n = len(names)
+        if n == 0 or not text:
+            return np.zeros((n, 4))
+
+        matches = list(TOKEN_RE.finditer(text))
+        tokens = [m.group() for m in matches]
+        starts = np.fromiter((m.start() for m in matches), dtype=np.int64, count=len(tokens))
+        is_word = np.fromiter((t[0].isalnum() for t in tokens), dtype=bool, count=len(tokens))
+        is_sep = np.fromiter((t in ',;:' for t in tokens), dtype=bool, count=len(tokens))
+        is_tech = np.fromiter((
+            len(t) >= 10 or (t.isupper() and len(t) >= 2 and t.isalpha())
+            or (any(c.isdigit() for c in t) and any(c.isalpha() for c in t))
+            for t in tokens
+        ), dtype=bool, count=len(tokens))
+        is_formula = np.fromiter((t in '=+^/*<>' or t.lower() in FORMULA_WORDS for t in tokens), dtype=bool, count=len(tokens))
+
+        # Prefix sums so any span is two lookups
+        flags = np.stack([is_word, is_sep, is_tech & is_word, is_formula]).astype(np.int64)
+        prefix = np.concatenate([np.zeros((4, 1), dtype=np.int64), np.cumsum(flags, axis=1)], axis=1)
+
+        positions = self._locate(text.lower(), names)
+        found = positions >= 0
+
+        # Span end = next found topic start (in text order), else end of text
+        order = np.argsort(np.where(found, positions, np.iinfo(np.int64).max), kind='stable')
+        sorted_pos = positions[order]
+        ends_sorted = np.append(sorted_pos[1:], len(text))
+        ends_sorted = np.where((ends_sorted < 0) | (ends_sorted < sorted_pos), len(text), ends_sorted)
+        ends = np.empty_like(ends_sorted)
+        ends[order] = ends_sorted
+
+        lo = np.searchsorted(starts, np.where(found, positions, 0))
+        hi = np.searchsorted(starts, np.where(found, ends, 0))
+        counts = (prefix[:, hi] - prefix[:, lo]).T.astype(float)
+
+        words = counts[:, 0]
+        per_100 = 100.0 / np.maximum(words, 1.0)
+        feats = np.column_stack([
+            words,
+            counts[:, 1],
+            counts[:, 2] * per_100,
+            counts[:, 3] * per_100
+        ])
+
+        # Topics we could not locate get the typical (median) topic
+        if found.any() and not found.all():
+            feats[~found] = np.median(feats[found], axis=0)
+        return feats
+
+    def estimate(self, text: str, names: List[str]) -> List[Dict]:
+        """
+        Estimate difficulty and hours for every topic
+
+        Args:
+            text: Syllabus text the names were extracted from
+            names: Topic names in syllabus order
+
+        Returns:
+            One {'difficulty', 'hours'} dict per name
+        """
+        if not names:
+            return []
+
+        feats = self.features(text, names)
+        logged = np.log1p(feats)
+        std = logged.std(axis=0)
+        z = np.where(std > 0, (logged - logged.mean(axis=0)) / np.where(std > 0, std, 1.0), 0.0)
+        score = z @ FEATURE_WEIGHTS
+
+        # Explicit wording in the name still counts
+        lowered = [name.lower() for name in names]
+        score += np.fromiter((any(w in l for w in HARD_WORDS) for l in lowered), dtype=float, count=len(names))
+        score -= np.fromiter((any(w in l for w in EASY_WORDS) for l in lowered), dtype=float, count=len(names))
+
+        difficulty = np.where(score > 0.5, 'hard', np.where(score < -0.5, 'easy', 'medium'))
+        multiplier = np.vectorize(DIFFICULTY_MULTIPLIER.get)(difficulty)
+
+        # ~1h per 150 words of syllabus plus time per subtopic, scaled by difficulty
+        hours = (2.0 + feats[:, 0] / 150.0 + 0.5 * np.minimum(feats[:, 1], 10)) * multiplier
+        hours = np.clip(np.round(hours * 2) / 2, 1.0, 15.0)
+        # No span at all (name not in text): keep the old flat default
+        hours = np.where(feats[:, 0] > 0, hours, 5.0)
+
+        return [
+            {'difficulty': str(d), 'hours': float(h)}
+            for d, h in zip(difficulty, hours)
+        ]
+
+
+# Global instance
+topic_estimator = TopicEstimator()
@@ -1,3 +1,4 @@
 from .validators import validators
+from .async_loop import background_loop
 
-__all__ = ['validators']  
\ No newline at end of file
+__all__ = ['validators', 'background_loop']
\ No newline at end of file
@@ -0,0 +1,53 @@
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Coroutine, Optional
+
+
+class BackgroundLoop:
+    """
+    Shared asyncio event loop running in a daemon thread.
+
+    Flask routes are synchronous, so coroutines are submitted here with
+    run() and the calling worker thread blocks until the result is ready.
+    The loop is started lazily so every gunicorn worker gets its own
+    thread after fork.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """Get the running loop, starting its thread on first use"""
+        with self._lock:
+            if self._loop is None or not self._thread.is_alive():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._run_forever,
+                    args=(self._loop,),
+                    name='studywise-asyncio',
+                    daemon=True
+                )
+                self._thread.start()
+            return self._loop
+
+    @staticmethod
+    def _run_forever(loop: asyncio.AbstractEventLoop):
+        asyncio.set_event_loop(loop)
+        loop.run_forever()
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the shared loop and wait for its result"""
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+
+# Global instance
+background_loop = BackgroundLoop()
@@ -0,0 +1,79 @@
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a stage is skipped because the request is out of time"""
+
+
+class Deadline:
+    """
+    Time budget for one request, shared by every stage it passes through.
+
+    Routes create it once; PDF extraction, model calls and database
+    writes size their own timeouts from what is left instead of using
+    fixed ones, and skip expensive work when too little remains.
+    """
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """Seconds left, never negative"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def allows(self, seconds: float) -> bool:
+        """True if at least `seconds` are left"""
+        return self.remaining() >= seconds
+
+    def timeout(self, cap: float) -> float:
+        """A stage timeout: its usual cap, shortened to the time left"""
+        return max(0.01, min(cap, self.remaining()))
+
+    def reserve(self, seconds: float) -> 'Deadline':
+        """A deadline ending `seconds` earlier, keeping time for later stages"""
+        child = Deadline(0)
+        child.expires_at = self.expires_at - seconds
+        return child
+
+    def __repr__(self):
+        return f"Deadline(remaining={self.remaining():.2f}s)"
+
+
+def budget(deadline: Optional[Deadline], cap: float) -> float:
+    """Timeout for a stage whose default is `cap`; deadline may be None"""
+    return deadline.timeout(cap) if deadline else cap
+
+
+def out_of_time(deadline: Optional[Deadline], needed: float = 0.0) -> bool:
+    """True if a deadline is set and fewer than `needed` seconds are left"""
+    return deadline is not None and not deadline.allows(max(needed, 1e-9))
+
+
+# Deadline of the request being handled in this thread, for stages that
+# are not handed one explicitly (every Supabase query, see SupabaseDB)
+_current: ContextVar[Optional[Deadline]] = ContextVar('request_deadline', default=None)
+
+
+def bind(deadline: Deadline) -> Deadline:
+    """Make `deadline` the current request's deadline"""
+    _current.set(deadline)
+    return deadline
+
+
+def current() -> Optional[Deadline]:
+    """The current request's deadline, None if the route set none"""
+    return _current.get()
+
+
+def init_app(app):
+    """Forget a request's deadline when it ends (gunicorn threads are reused)"""
+
+    @app.teardown_request
+    def _unbind_deadline(exc):
+        _current.set(None)
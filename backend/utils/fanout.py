@@ -0,0 +1,42 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from config import Config
+
+
+class QueryPool:
+    """
+    Shared thread pool for running independent database queries at once.
+
+    Supabase calls are blocking HTTP requests, so a route that needs
+    several unrelated datasets submits them together with fan_out() and
+    waits roughly as long as the slowest one. The pool is created
+    lazily so every gunicorn worker gets its own threads after fork.
+    """
+
+    def __init__(self, max_workers: int):
+        self._max_workers = max_workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='studywise-query')
+            return self._pool
+
+    def fan_out(self, calls: Dict[str, Callable[[], Any]], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Run every call concurrently and return their results by name
+
+        An exception from any call is re-raised here once all calls
+        have been submitted.
+        """
+        futures = {name: self.pool.submit(call) for name, call in calls.items()}
+        return {name: future.result(timeout) for name, future in futures.items()}
+
+
+# Global instance
+query_pool = QueryPool(Config.DB_FANOUT_WORKERS)
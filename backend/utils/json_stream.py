@@ -0,0 +1,211 @@
+import json
+import threading
+from typing import Callable, Dict, List, Optional
+
+from utils import metrics
+
+
+class JSONArrayStream:
+    """
+    Incremental parser for a JSON array of objects in model output.
+
+    Text is fed in chunks as it arrives. Each top-level object is
+    decoded as soon as its closing brace is seen and passed through
+    `validate`, which returns the cleaned object or None to reject it.
+    A malformed or truncated object only loses itself: every valid
+    object before (and after) it is kept. Brackets are matched by type,
+    so an object whose brackets do not pair up (e.g. `[1, 2}`) is
+    dropped where the mismatch is seen, and scanning resumes at the
+    next object that follows a comma.
+
+    Any prose before the first '[' and after the closing ']' is ignored.
+    """
+
+    def __init__(self, validate: Optional[Callable[[Dict], Optional[Dict]]] = None):
+        self.validate = validate
+        self.items: List[Dict] = []
+        self.rejected = 0
+        self.closed = False
+
+        self._buffer = ''
+        self._pos = 0
+        self._started = False
+        # State of the object currently being scanned
+        self._obj_start = -1
+        self._closers: List[str] = []  # expected closing brackets, innermost last
+        self._in_string = False
+        self._escape = False
+        # After a bracket mismatch: skipping the rest of the broken object
+        self._resync = False
+        self._last = ''
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """Consume a chunk and return the objects it completed"""
+        if self.closed or not chunk:
+            return []
+
+        self._buffer += chunk
+        completed = []
+
+        buf = self._buffer
+        i = self._pos
+        n = len(buf)
+
+        while i < n:
+            ch = buf[i]
+
+            if not self._started:
+                # Skip prose until the array opens
+                self._started = ch == '['
+                i += 1
+                continue
+
+            if self._obj_start == -1 and self._resync:
+                # Only a '{' right after a comma starts the next object
+                if ch == '{' and self._last == ',':
+                    self._resync = False
+                    self._obj_start = i
+                    self._closers = ['}']
+                elif not ch.isspace():
+                    self._last = ch
+                i += 1
+                continue
+
+            if self._obj_start == -1:
+                # Between objects: skip separators, stop at the closing bracket
+                if ch == '{':
+                    self._obj_start = i
+                    self._closers = ['}']
+                elif ch == ']':
+                    i += 1
+                    if not (self.items or completed or self.rejected):
+                        # A bracket in the prose, not the real array
+                        self._started = False
+                        continue
+                    self.closed = True
+                    break
+                i += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                self._closers.append('}' if ch == '{' else ']')
+            elif ch in '}]':
+                if ch != self._closers.pop():
+                    # Mismatched bracket: drop this object and resync
+                    self.rejected += 1
+                    self._obj_start = -1
+                    self._closers = []
+                    self._resync = True
+                    self._last = ''
+                elif not self._closers:
+                    item = self._decode(buf[self._obj_start:i + 1])
+                    if item is not None:
+                        completed.append(item)
+                    self._obj_start = -1
+            i += 1
+
+        # Drop consumed text so the buffer only holds the open object
+        keep_from = self._obj_start if self._obj_start != -1 else i
+        self._buffer = buf[keep_from:]
+        if self._obj_start != -1:
+            self._obj_start = 0
+        self._pos = i - keep_from
+
+        self.items.extend(completed)
+        return completed
+
+    def _decode(self, text: str) -> Optional[Dict]:
+        try:
+            obj = json.loads(text)
+        except json.JSONDecodeError:
+            self.rejected += 1
+            return None
+
+        if self.validate:
+            obj = self.validate(obj)
+        if obj is None:
+            self.rejected += 1
+        return obj
+
+    def close(self):
+        """Stop consuming; the rest of the output is not needed"""
+        self.closed = True
+
+    @property
+    def truncated(self) -> bool:
+        """True if the output ended inside the array"""
+        return not self.closed
+
+
+class ParseStats:
+    """Thread-safe per-backend counters of model output parsing"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def record(self, backend: str, stream: JSONArrayStream):
+        """Record one model call's parse outcome"""
+        with self._lock:
+            stats = self._stats.setdefault(backend, {
+                'calls': 0,
+                'failed': 0,
+                'salvaged': 0,
+                'items': 0,
+                'rejected': 0
+            })
+            stats['calls'] += 1
+            stats['items'] += len(stream.items)
+            stats['rejected'] += stream.rejected
+            if not stream.items:
+                stats['failed'] += 1
+                outcome = 'failed'
+            elif stream.rejected or stream.truncated:
+                stats['salvaged'] += 1
+                outcome = 'salvaged'
+            else:
+                outcome = 'ok'
+        metrics.AI_PARSE.labels(backend, outcome).inc()
+        if stream.rejected:
+            metrics.AI_PARSE_REJECTED.labels(backend).inc(stream.rejected)
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {backend: dict(stats) for backend, stats in self._stats.items()}
+
+
+def parse_model_output(
+    content: str,
+    validate: Callable[[Dict], Optional[Dict]],
+    backend: str,
+    limit: Optional[int] = None
+) -> List[Dict]:
+    """
+    Parse a complete model response, keeping every valid object.
+
+    Args:
+        content: Raw model output
+        validate: Per-object validator returning the cleaned object or None
+        backend: Backend name for parse_stats ('cloud', 'ollama', ...)
+        limit: Keep at most this many objects
+
+    Returns:
+        Validated objects in output order (possibly empty)
+    """
+    stream = JSONArrayStream(validate)
+    stream.feed(content)
+    parse_stats.record(backend, stream)
+    return stream.items[:limit] if limit else stream.items
+
+
+# Global instance
+parse_stats = ParseStats()
@@ -0,0 +1,162 @@
+import os
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import Response, g, request
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+        generate_latest, multiprocess
+    )
+    METRICS_ENABLED = True
+except ImportError:
+    METRICS_ENABLED = False
+
+# Model calls take seconds, not milliseconds
+AI_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+
+
+class _NoopMetric:
+    """Stand-in when prometheus_client is not installed"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+def _counter(name, documentation, labelnames=()):
+    return Counter(name, documentation, labelnames) if METRICS_ENABLED else _NoopMetric()
+
+
+def _histogram(name, documentation, labelnames=(), buckets=None):
+    if not METRICS_ENABLED:
+        return _NoopMetric()
+    if buckets:
+        return Histogram(name, documentation, labelnames, buckets=buckets)
+    return Histogram(name, documentation, labelnames)
+
+
+# Routes
+HTTP_REQUESTS = _counter('studywise_http_requests_total', 'HTTP requests', ['method', 'endpoint', 'status'])
+HTTP_LATENCY = _histogram('studywise_http_request_seconds', 'HTTP request latency', ['endpoint'])
+
+# Database
+DB_LATENCY = _histogram('studywise_db_call_seconds', 'SupabaseDB method latency', ['method'])
+DB_EXCEPTIONS = _counter('studywise_db_exceptions_total', 'SupabaseDB calls that failed, whether the method caught the error or raised it', ['method'])
+
+# PDF extraction
+PDF_SECONDS = _histogram('studywise_pdf_extract_seconds', 'PDF text extraction time')
+PDF_PAGES = _counter('studywise_pdf_pages_total', 'PDF pages extracted')
+PDF_BYTES = _counter('studywise_pdf_bytes_total', 'PDF bytes read')
+PDF_FAILURES = _counter('studywise_pdf_failures_total', 'PDF extractions that failed')
+
+# AI backends (backend: cloud / ollama / free, kind: topics / questions)
+AI_CALLS = _counter('studywise_ai_calls_total', 'Model backend calls', ['backend', 'kind'])
+AI_FAILURES = _counter('studywise_ai_failures_total', 'Model backend calls that raised', ['backend', 'kind'])
+AI_FALLBACKS = _counter('studywise_ai_fallbacks_total', 'Times a backend was given up on for the next one', ['backend', 'kind'])
+AI_LATENCY = _histogram('studywise_ai_call_seconds', 'Model backend call latency', ['backend', 'kind'], buckets=AI_BUCKETS)
+AI_TOKENS = _counter('studywise_ai_tokens_total', 'Model tokens', ['backend', 'direction'])
+AI_PARSE = _counter('studywise_ai_parse_total', 'Model output parse outcomes', ['backend', 'outcome'])
+AI_PARSE_REJECTED = _counter('studywise_ai_parse_rejected_items_total', 'Model output objects that failed validation', ['backend'])
+AI_HEDGE_WINS = _counter('studywise_ai_hedge_wins_total', 'Hedged generations by winning backend', ['winner'])
+
+# In-process caches
+CACHE_LOOKUPS = _counter('studywise_cache_lookups_total', 'In-process cache lookups', ['cache', 'result'])
+
+
+@contextmanager
+def ai_call(backend: str, kind: str):
+    """Count and time one model backend call; failures are re-raised"""
+    started = time.perf_counter()
+    AI_CALLS.labels(backend, kind).inc()
+    try:
+        yield
+    except Exception:
+        # Cancelled hedge losers are not failures
+        AI_FAILURES.labels(backend, kind).inc()
+        raise
+    finally:
+        AI_LATENCY.labels(backend, kind).observe(time.perf_counter() - started)
+
+
+def record_tokens(backend: str, prompt_tokens=None, completion_tokens=None):
+    """Record token usage reported by a backend (missing counts are skipped)"""
+    if prompt_tokens:
+        AI_TOKENS.labels(backend, 'prompt').inc(prompt_tokens)
+    if completion_tokens:
+        AI_TOKENS.labels(backend, 'completion').inc(completion_tokens)
+
+
+def instrument_methods(histogram, exceptions=None):
+    """
+    Class decorator timing every public method
+
+    Each method is labelled with its own name. Properties and
+    underscore methods are left alone.
+    """
+    def decorate(cls):
+        for name, attr in list(vars(cls).items()):
+            if name.startswith('_') or not callable(attr):
+                continue
+            setattr(cls, name, _timed(attr, histogram.labels(name), exceptions.labels(name) if exceptions else None))
+        return cls
+    return decorate
+
+
+def _timed(func, observer, failures):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            if failures:
+                failures.inc()
+            raise
+        finally:
+            observer.observe(time.perf_counter() - started)
+    return wrapper
+
+
+def render() -> tuple[bytes, str]:
+    """Exposition text for every worker (multiprocess) or this process"""
+    if not METRICS_ENABLED:
+        return b'# prometheus_client is not installed\n', 'text/plain; charset=utf-8'
+
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def init_app(app):
+    """Time every request and serve GET /api/metrics"""
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            # The route pattern keeps label cardinality bounded
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            HTTP_LATENCY.labels(endpoint).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(request.method, endpoint, str(response.status_code)).inc()
+        return response
+
+    @app.route('/api/metrics', methods=['GET'])
+    def metrics():
+        """Prometheus scrape endpoint"""
+        body, content_type = render()
+        return Response(body, content_type=content_type)
@@ -0,0 +1,184 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from typing import Optional
+
+from flask import Response, copy_current_request_context, make_response, request
+
+from config import Config
+from utils import metrics
+
+
+class _Entry:
+    __slots__ = ('body', 'status', 'content_type', 'stored_at')
+
+    def __init__(self, response: Response, stored_at: float):
+        self.body = response.get_data()
+        self.status = response.status_code
+        self.content_type = response.content_type
+        self.stored_at = stored_at
+
+    def response(self, cache_state: str) -> Response:
+        response = Response(self.body, status=self.status, content_type=self.content_type)
+        response.headers['X-Cache'] = cache_state
+        response.headers['Age'] = str(int(time.time() - self.stored_at))
+        return response
+
+
+class ResponseCache:
+    """
+    Stale-while-revalidate cache for per-user GET responses.
+
+    Entries are keyed by path and query string. Within the soft TTL a
+    cached response is served as is; after it, the cached response is
+    still served at once while one background request refreshes it. Past
+    the hard TTL the view runs in the request, but if it fails (5xx,
+    e.g. Supabase timing out) the old response is served instead.
+
+    Any successful write carrying a user's email (JSON, form or query
+    `email`) invalidates that user's entries; routes that resolve the
+    user some other way (e.g. a default email) call invalidate
+    themselves. Invalidation touches a
+    per-user marker file so every gunicorn worker on the host sees it;
+    entries older than the marker are treated as missing.
+    """
+
+    def __init__(self, max_entries: int, soft_ttl: float, hard_ttl: float, marker_dir: str):
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._max_entries = max_entries
+        self._soft_ttl = soft_ttl
+        self._hard_ttl = hard_ttl
+        self._marker_dir = marker_dir
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._refresher: Optional[ThreadPoolExecutor] = None
+
+    def _marker(self, email: str) -> str:
+        return os.path.join(self._marker_dir, hashlib.sha1(email.lower().encode('utf-8')).hexdigest())
+
+    def _invalidated_at(self, email: str) -> float:
+        try:
+            return os.stat(self._marker(email)).st_mtime
+        except OSError:
+            return 0.0
+
+    def invalidate(self, email: Optional[str]):
+        """Drop every cached response of a user, in all workers"""
+        if not email:
+            return
+        try:
+            os.makedirs(self._marker_dir, exist_ok=True)
+            with open(self._marker(email), 'a'):
+                pass
+            os.utime(self._marker(email))
+        except OSError as e:
+            print(f"Cache invalidation marker failed: {str(e)}")
+        prefix = f"{email.lower()}|"
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+    def _store(self, key: str, response: Response, started: float):
+        # Stamped with the time the view started, so a write that lands
+        # while it runs still invalidates what it returns
+        if response.status_code != 200 or response.is_streamed:
+            return
+        with self._lock:
+            self._entries[key] = _Entry(response, started)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def _refresh(self, key: str, view, args, kwargs):
+        """Re-run a view in the background and store its response"""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            if self._refresher is None:
+                self._refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix='studywise-revalidate')
+
+        @copy_current_request_context
+        def run():
+            try:
+                started = time.time()
+                self._store(key, make_response(view(*args, **kwargs)), started)
+                metrics.CACHE_LOOKUPS.labels('response', 'revalidated').inc()
+            except Exception as e:
+                print(f"Cache revalidation failed: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self._refresher.submit(run)
+
+    def cached(self, view):
+        """Cache a GET view whose URL has a <user_email> parameter"""
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            email = (kwargs.get('user_email') or request.args.get('email') or '').lower()
+            if not Config.RESPONSE_CACHE_ENABLED or not email:
+                return view(*args, **kwargs)
+
+            key = f"{email}|{request.full_path}"
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry:
+                    self._entries.move_to_end(key)
+            if entry and entry.stored_at <= self._invalidated_at(email):
+                entry = None
+
+            age = time.time() - entry.stored_at if entry else None
+            if entry and age < self._soft_ttl:
+                metrics.CACHE_LOOKUPS.labels('response', 'hit').inc()
+                return entry.response('HIT')
+            if entry and age < self._hard_ttl:
+                metrics.CACHE_LOOKUPS.labels('response', 'stale').inc()
+                self._refresh(key, view, args, kwargs)
+                return entry.response('STALE')
+
+            metrics.CACHE_LOOKUPS.labels('response', 'miss').inc()
+            started = time.time()
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception:
+                if entry is None:
+                    raise
+                response = None
+            if (response is None or response.status_code >= 500) and entry:
+                # Backend failing: an old answer beats an error
+                metrics.CACHE_LOOKUPS.labels('response', 'stale_error').inc()
+                return entry.response('STALE-ERROR')
+
+            self._store(key, response, started)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+
+        return wrapper
+
+    def init_app(self, app):
+        """Invalidate a user's cached responses after each successful write"""
+
+        @app.after_request
+        def _invalidate_on_write(response):
+            if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+                body = request.get_json(silent=True) if request.is_json else None
+                email = request.args.get('email') or request.form.get('email') or (body or {}).get('email')
+                if isinstance(email, str):
+                    self.invalidate(email)
+            return response
+
+
+# Global instance
+response_cache = ResponseCache(
+    Config.RESPONSE_CACHE_MAX_ENTRIES,
+    Config.RESPONSE_CACHE_SOFT_TTL,
+    Config.RESPONSE_CACHE_HARD_TTL,
+    os.path.join(tempfile.gettempdir(), 'studywise-cache-markers')
+)
@@ -40,5 +40,12 @@ class Validators:
         size = file.tell()
         file.seek(0)
         return size <= 30 * 1024 * 1024  # 30MB
+    
+    @staticmethod
+    def parse_flag(value):
+        """JSON or form boolean: True only for true / "true", None if absent"""
+        if value is None:
+            return None
+        return value is True or str(value).lower() == 'true'
 
 validators = Validators()
\ No newline at end of file
@@ -219,6 +219,24 @@ class StudyWiseAPI {
         });
     }
 
+    /**
+     * Generate quizzes for many topics in one request
+     * @param {object} source - One of { topic_ids: [...] }, { upload_id }, { plan_week }
+     * @param {number} numQuestions - Number of questions per quiz
+     * Returns: { success, generated, failed, results: [...] }
+     */
+    async generateQuizBatch(source, numQuestions) {
+        return this.request('/quiz/generate-batch', {
+            method: 'POST',
+            body: JSON.stringify({
+                ...source,
+                num_questions: numQuestions,
+                email: this.userEmail,
+                ai_mode: AIMode.current
+            }),
+        });
+    }
+
     /**
      * Submit quiz answers
      * @param {string} quizId - Quiz UUID
@@ -282,6 +300,14 @@ class StudyWiseAPI {
         return this.request(`/plan/${encodeURIComponent(this.userEmail)}`);
     }
 
+    /**
+     * Get dashboard stats and overview in one request
+     * Returns: { stats: {...}, overview: {...} }
+     */
+    async getDashboard() {
+        return this.request(`/dashboard/${encodeURIComponent(this.userEmail)}`);
+    }
+
     /**
      * Get dashboard statistics
      * Returns: { stats: { total_uploads, total_topics, ... } }
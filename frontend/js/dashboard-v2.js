@@ -34,14 +34,15 @@ document.addEventListener('DOMContentLoaded', async () => {
     setText('userName', email.split('@')[0] || 'Student');
     setText('userAvatar', (email[0] || 'S').toUpperCase());
 
-    // Load dashboard data
-    await loadDashboardStats();
-    await loadRecentActivity();
+    // Load dashboard data in one request
+    const dashboard = window.api.getDashboard();
+    await loadDashboardStats(dashboard);
+    await loadRecentActivity(dashboard);
 });
 
-async function loadDashboardStats() {
+async function loadDashboardStats(dashboard) {
     try {
-        const data = await window.api.getDashboardStats();
+        const data = await dashboard;
         const stats = data.stats || {};
 
         // Update stats with fallbacks
@@ -71,12 +72,12 @@ async function loadDashboardStats() {
     }
 }
 
-async function loadRecentActivity() {
+async function loadRecentActivity(dashboard) {
     const container = document.getElementById('recentOverview');
     if (!container) return;
 
     try {
-        const data = await window.api.getDashboardOverview();
+        const data = await dashboard;
         const overview = data.overview || {};
         const recentUploads = overview.recent_uploads || [];
         const recentQuizzes = overview.recent_quizzes || [];
@@ -4,19 +4,20 @@ document.addEventListener('DOMContentLoaded', async () => {
     // Display user email
     document.getElementById('userEmailDisplay').textContent = api.userEmail;
 
-    // Load all dashboard data
+    // Load all dashboard data in one request
+    const dashboard = api.getDashboard();
     await Promise.all([
-        loadStats(),
-        loadOverview()
+        loadStats(dashboard),
+        loadOverview(dashboard)
     ]);
 });
 
-async function loadStats() {
+async function loadStats(dashboard) {
     const statsGrid = document.getElementById('statsGrid');
     showLoading('statsGrid');
 
     try {
-        const { stats } = await api.getDashboardStats();
+        const { stats } = await dashboard;
 
         statsGrid.innerHTML = `
             <div class="stat-item">
@@ -83,9 +84,9 @@ async function loadStats() {
     }
 }
 
-async function loadOverview() {
+async function loadOverview(dashboard) {
     try {
-        const { overview } = await api.getDashboardOverview();
+        const { overview } = await dashboard;
 
         // Load recent uploads
         loadRecentUploads(overview.recent_uploads);